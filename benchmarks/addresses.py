@@ -0,0 +1,70 @@
+"""Per-address cost of formatting EGRUL-style addresses with the chevron
+based `AddressFormatter` and with the compiled `common.addresses` templates,
+in process and in batches on a process pool."""
+
+import time
+import click
+import random
+from typing import Callable, Dict, List, Optional
+from concurrent.futures import ProcessPoolExecutor
+from addressformatting import AddressFormatter
+
+from benchmarks.generators import RU_WORDS
+from common.addresses import AddressTemplate, format_addresses
+
+Components = Dict[str, Optional[str]]
+
+
+def sample_addresses(count: int, distinct: int) -> List[Components]:
+    rnd = random.Random(42)
+    addresses: List[Components] = []
+    for _ in range(distinct):
+        address: Components = {
+            "postcode": str(rnd.randint(100000, 999999)),
+            "house": "ДОМ %d" % rnd.randint(1, 99),
+            "house_number": str(rnd.randint(1, 9)),
+            "city": rnd.choice(["МОСКВА", "САНКТ-ПЕТЕРБУРГ", "КАЗАНЬ"]),
+            "road": rnd.choice(RU_WORDS),
+        }
+        if rnd.random() < 0.3:
+            address["state"] = rnd.choice(RU_WORDS)
+        addresses.append(address)
+    return [rnd.choice(addresses) for _ in range(count)]
+
+
+def run_pool(addresses: List[Components], batch: int = 5000) -> List[str]:
+    batches = [addresses[i : i + batch] for i in range(0, len(addresses), batch)]
+    with ProcessPoolExecutor() as executor:
+        results = executor.map(format_addresses, batches, ["ru"] * len(batches))
+        return [line for lines in results for line in lines]
+
+
+@click.command()
+@click.option("-n", "--count", type=int, default=200_000)
+@click.option("-d", "--distinct", type=int, default=50_000)
+def main(count: int, distinct: int):
+    addresses = sample_addresses(count, distinct)
+    formatter = AddressFormatter()
+    template = AddressTemplate("ru")
+    runs: Dict[str, Callable[[], List[str]]] = {
+        "chevron": lambda: [formatter.one_line(dict(a), "ru") for a in addresses],
+        "compiled": lambda: [template.render(a) for a in addresses],
+        "compiled+cache": lambda: [template.one_line(a) for a in addresses],
+        "process pool": lambda: run_pool(addresses),
+    }
+    expected: Optional[List[str]] = None
+    for label, func in runs.items():
+        template.cache.clear()
+        start = time.perf_counter()
+        lines = func()
+        took = time.perf_counter() - start
+        expected = expected or lines
+        assert lines == expected, "%s output differs" % label
+        print(
+            "%-16s %7.2f µs/address %9.0f addresses/s"
+            % (label, took * 1e6 / len(addresses), len(addresses) / took)
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+"""Run parsers on synthetic source files and aggregate their fragments through
+the sorted path of the Makefiles (fragment file, `sort` and a separate
+`sorted-aggregate` process) and in memory
+(`common.sinks.AggregatingSink`), also with a limit that makes the in-memory
+run spill, and check that all three write the same export. The order of the
+values of a property follows the hash order of statements, so it is ignored
+in the comparison."""
+
+import os
+import time
+import click
+import orjson
+import tempfile
+import subprocess
+import sys
+from pathlib import Path
+from typing import Any, List, Tuple
+
+from benchmarks.generators import GENERATORS
+from benchmarks.parsers import BENCHMARKS, DATASETS, load_module, metadata_path
+from common import settings
+from common.context import init_context
+
+EXPORT = "export/entities.ftm.json"
+# What `nk sorted-aggregate` runs, without the imports of the rest of its CLI:
+AGGREGATE = (
+    "import sys; from pathlib import Path; "
+    "from followthemoney.cli.aggregate import sorted_aggregate; "
+    "from nomenklatura.entity import CompositeEntity; "
+    "sorted_aggregate(Path(sys.argv[1]), Path(sys.argv[2]), CompositeEntity)"
+)
+
+
+def read_export(path: Path) -> List[Tuple[str, Any]]:
+    entities = []
+    for line in path.read_bytes().splitlines():
+        data = orjson.loads(line)
+        props = {p: sorted(v) for p, v in data.pop("properties").items()}
+        entities.append((data["id"], sorted(data.items()), sorted(props.items())))
+    return entities
+
+
+def run(
+    name: str, source_path: Path, data_path: Path, limit: int
+) -> Tuple[float, float]:
+    dataset, _, runner = BENCHMARKS[name]
+    os.chdir(DATASETS / dataset)
+    parse = load_module(dataset)
+    settings.AGGREGATE_LIMIT = limit
+    start = time.perf_counter()
+    with init_context(metadata_path(dataset), data_path=data_path) as context:
+        runner(parse, context, source_path)
+        parsed = time.perf_counter()
+    fragments = data_path / "fragments.json"
+    if fragments.exists():
+        sorted_path = data_path / "sorted.json"
+        env = dict(os.environ, LC_ALL="C")
+        cmd = ["sort", "-o", str(sorted_path), str(fragments)]
+        subprocess.run(cmd, check=True, env=env)
+        (data_path / EXPORT).parent.mkdir(parents=True, exist_ok=True)
+        cmd = [
+            sys.executable,
+            "-c",
+            AGGREGATE,
+            str(sorted_path),
+            str(data_path / EXPORT),
+        ]
+        subprocess.run(cmd, check=True)
+    end = time.perf_counter()
+    return parsed - start, end - parsed
+
+
+@click.command()
+@click.argument("names", nargs=-1, type=click.Choice(sorted(BENCHMARKS)))
+@click.option("-n", "--count", type=int, default=20_000)
+def main(names: List[str], count: int):
+    cwd = os.getcwd()
+    for name in names or ["md_companies", "gleif_lei"]:
+        with tempfile.TemporaryDirectory(prefix=f"bench-aggregate-{name}-") as tmp:
+            source_path = Path(tmp) / "source"
+            source_path.mkdir()
+            for generator, file_name in BENCHMARKS[name][1]:
+                GENERATORS[generator](source_path / file_name, count)
+            runs = [("sorted", 0), ("in memory", 10_000_000), ("spilled", 1000)]
+            expected = None
+            for label, limit in runs:
+                data_path = Path(tmp) / label
+                parse, aggregate = run(name, source_path, data_path, limit)
+                os.chdir(cwd)
+                export = read_export(data_path / EXPORT)
+                expected = expected or export
+                assert export == expected, "%s: %s export differs" % (name, label)
+                spilled = (data_path / "fragments.json").exists()
+                print(
+                    "%-12s %-10s parse %6.2f s  aggregate %6.2f s  total %6.2f s%s"
+                    % (
+                        name,
+                        label,
+                        parse,
+                        aggregate,
+                        parse + aggregate,
+                        "  (fragment file)" if spilled else "",
+                    )
+                )
+    settings.AGGREGATE_LIMIT = 0
+
+
+if __name__ == "__main__":
+    main()
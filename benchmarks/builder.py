@@ -0,0 +1,86 @@
+"""Compare building Companies House base data fragments with `CompositeEntity`
+against the slotted `common.builder.Fragment`, including serialisation, and
+check that both produce the same fragments."""
+
+import time
+import click
+import tempfile
+from pathlib import Path
+from typing import Any, Dict, List
+from nomenklatura.dataset import Dataset
+from nomenklatura.entity import CompositeEntity
+from followthemoney import model
+
+from benchmarks.generators import GENERATORS
+from benchmarks.parsers import load_module
+from common.builder import FragmentType
+from common.sinks import serialize_entity
+
+DATASET = Dataset.make({"name": "gb_coh_psc", "title": "Companies House"})
+
+
+def normalize(data: Dict[str, Any]) -> Dict[str, Any]:
+    # Property values are sets, so their order depends on string hashing:
+    props = {p: sorted(vs) for p, vs in data["properties"].items()}
+    return dict(data, properties=props)
+
+
+def build_proxies(parse: Any, rows: List[Dict[str, str]]) -> List[bytes]:
+    out = []
+    for row in rows:
+        row = dict(row)
+        company_nr = row.pop("CompanyNumber")
+        entity = CompositeEntity(model, {"schema": "Company"}, default_dataset=DATASET)
+        entity.id = parse.company_id(None, company_nr)
+        entity.add("jurisdiction", "gb")
+        parse.add_base_data(entity, company_nr, row)
+        out.append(serialize_entity(entity))
+    return out
+
+
+def build_fragments(parse: Any, rows: List[Dict[str, str]]) -> List[bytes]:
+    companies = FragmentType("Company", DATASET, jurisdiction="gb")
+    out = []
+    for row in rows:
+        row = dict(row)
+        company_nr = row.pop("CompanyNumber")
+        entity = companies.make(parse.company_id(None, company_nr))
+        parse.add_base_data(entity, company_nr, row)
+        out.append(serialize_entity(entity))
+    return out
+
+
+@click.command()
+@click.option("-n", "--count", type=int, default=50_000)
+@click.option("-r", "--repeat", type=int, default=3)
+def main(count: int, repeat: int):
+    import orjson
+
+    parse = load_module("gb_coh_psc")
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(tmp) / "base_data.zip"
+        GENERATORS["ch_base"](path, count)
+        rows = list(parse.read_base_data_csv(path))
+
+    results = {}
+    for label, build in (("proxy", build_proxies), ("fragment", build_fragments)):
+        build(parse, rows[:1000])  # warm up the caches
+        times = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            results[label] = build(parse, rows)
+            times.append(time.perf_counter() - start)
+        best = min(times)
+        print(
+            "%-9s %7.2f µs/row %9.0f rows/s"
+            % (label, best * 1e6 / len(rows), len(rows) / best)
+        )
+
+    for proxy, fragment in zip(results["proxy"], results["fragment"]):
+        expected = normalize(orjson.loads(proxy))
+        assert normalize(orjson.loads(fragment)) == expected, (proxy, fragment)
+    print("%d fragments identical" % len(rows))
+
+
+if __name__ == "__main__":
+    main()
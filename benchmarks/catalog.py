@@ -0,0 +1,91 @@
+import io
+import json
+import time
+import click
+import orjson
+import tracemalloc
+from typing import Any, Callable, Dict, List, Tuple
+
+from nomenklatura.dataset import DataCatalog
+from zavod.dataset import ZavodDataset
+
+from common.catalog import write_catalog
+
+
+def make_dataset_data(idx: int, resources: int) -> Dict[str, Any]:
+    name = f"synthetic_{idx:05d}"
+    return {
+        "name": name,
+        "title": f"Synthetic dataset {idx}",
+        "summary": "Generated dataset used to benchmark catalog generation.",
+        "updated_at": "2023-01-01T00:00:00",
+        "resources": [
+            {
+                "name": f"part-{ridx:04d}.ftm.json",
+                "url": f"https://data.opensanctions.org/graph/{name}/part-{ridx:04d}.ftm.json",
+                "mime_type": "application/json+ftm",
+                "size": ridx * 1024,
+            }
+            for ridx in range(resources)
+        ],
+        "publisher": {
+            "name": "Synthetic Publisher",
+            "url": "https://www.opensanctions.org",
+        },
+    }
+
+
+def build_synthetic(datasets: int, resources: int) -> DataCatalog:
+    catalog = DataCatalog(ZavodDataset, {})
+    catalog.updated_at = "2023-01-01T00:00:00"
+    names: List[str] = []
+    for idx in range(datasets):
+        ds = catalog.make_dataset(make_dataset_data(idx, resources))
+        names.append(ds.name)
+    collection = {"name": "graph", "title": "Synthetic Graph", "children": names}
+    catalog.make_dataset(collection)
+    return catalog
+
+
+def write_stdlib(catalog: DataCatalog) -> bytes:
+    fh = io.StringIO()
+    json.dump(catalog.to_dict(), fh)
+    return fh.getvalue().encode("utf-8")
+
+
+def write_streaming(catalog: DataCatalog) -> bytes:
+    fh = io.BytesIO()
+    write_catalog(catalog, fh)
+    return fh.getvalue()
+
+
+def measure(func: Callable[[], Any]) -> Tuple[Any, float, int]:
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = func()
+    duration = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, duration, peak
+
+
+@click.command()
+@click.option("-d", "--datasets", type=int, default=2000)
+@click.option("-r", "--resources", type=int, default=20)
+def main(datasets: int, resources: int):
+    catalog, duration, peak = measure(lambda: build_synthetic(datasets, resources))
+    print("build: %.3fs, peak %.1f MB" % (duration, peak / 1024**2))
+
+    stdlib, duration, peak = measure(lambda: write_stdlib(catalog))
+    print("json.dump: %.3fs, peak %.1f MB" % (duration, peak / 1024**2))
+
+    streamed, duration, peak = measure(lambda: write_streaming(catalog))
+    print("write_catalog: %.3fs, peak %.1f MB" % (duration, peak / 1024**2))
+
+    if orjson.loads(streamed) != json.loads(stdlib):
+        raise RuntimeError("Streaming catalog output differs from json.dump!")
+    print("Validated: %d datasets, %d bytes" % (len(catalog.datasets), len(streamed)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,65 @@
+"""Per-value cost of cleaning country values through the followthemoney
+registry and through the precomputed table in `common.countries`."""
+
+import time
+import click
+import random
+import countrynames
+from typing import Callable, List, Optional
+from countrynames.data import DATA
+from followthemoney.types import registry
+
+from common import countries
+
+
+def sample_values(count: int) -> List[str]:
+    """Country values as they show up in source data: names, codes and
+    aliases with varying case and padding, repeated as in real rows."""
+    names = [n for ns in DATA.values() for n in ns]
+    names.extend(registry.country.names.keys())
+    names.extend(["England", "Scotland", "UNITED KINGDOM", "Россия", "n/a"])
+    rnd = random.Random(42)
+    variants = [str.upper, str.lower, str.title, lambda n: f" {n} ", lambda n: n]
+    common = rnd.sample(names, 200)
+    values: List[str] = []
+    for _ in range(count):
+        name = rnd.choice(common) if rnd.random() < 0.95 else rnd.choice(names)
+        values.append(rnd.choice(variants)(name))
+    return values
+
+
+def run(clean: Callable[[str], Optional[str]], values: List[str]) -> float:
+    countrynames.to_code.cache_clear()
+    countries._cache.clear()
+    countries._raw_cache.clear()
+    start = time.perf_counter()
+    for value in values:
+        clean(value)
+    return time.perf_counter() - start
+
+
+@click.command()
+@click.option("-n", "--count", type=int, default=500_000)
+@click.option("-r", "--repeat", type=int, default=3)
+def main(count: int, repeat: int):
+    values = sample_values(count)
+    cleaners = {
+        "registry clean": countries._clean,
+        "registry clean_text": countries._clean_text,
+        "table clean": countries.clean_country,
+        "table clean_text": countries.clean_country_text,
+    }
+    for value in values[:10_000]:
+        expected = countries._clean(value)
+        assert countries.clean_country(value) == expected, value
+        assert countries.clean_country_text(value.strip()) == expected, value
+    for label, clean in cleaners.items():
+        best = min(run(clean, values) for _ in range(repeat))
+        print(
+            "%-20s %6.3f µs/value %11.0f values/s"
+            % (label, best * 1e6 / len(values), len(values) / best)
+        )
+
+
+if __name__ == "__main__":
+    main()
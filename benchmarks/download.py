@@ -0,0 +1,143 @@
+"""Check and time `common.download` against a local HTTP server which serves
+range requests at a fixed rate per connection, and can drop connections
+part-way through a response to simulate a flaky upstream."""
+
+import os
+import time
+import click
+import hashlib
+import tempfile
+import threading
+from pathlib import Path
+from typing import Any, Dict, Optional
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from requests import Session
+
+from common import settings
+from common.download import DownloadError, download
+
+
+class RangeHandler(BaseHTTPRequestHandler):
+    files: Dict[str, bytes] = {}
+    rate = 4 * 1024 * 1024
+    ranges = True
+    # Drop this many responses after `fail_after` bytes:
+    failures = 0
+    fail_after = 0
+    served = 0
+    lock = threading.Lock()
+
+    def do_GET(self) -> None:
+        data = self.files.get(self.path)
+        if data is None:
+            self.send_error(404)
+            return
+        etag = '"%s"' % hashlib.md5(data).hexdigest()
+        start, end = 0, len(data) - 1
+        range_ = self.headers.get("Range")
+        if_range = self.headers.get("If-Range")
+        partial = self.ranges and range_ is not None
+        if partial and if_range is not None and if_range != etag:
+            partial = False
+        if partial:
+            first, _, last = range_.replace("bytes=", "").partition("-")
+            start = int(first)
+            end = min(int(last), end) if last else end
+            self.send_response(206)
+            self.send_header("Content-Range", f"bytes {start}-{end}/{len(data)}")
+        else:
+            self.send_response(200)
+        if self.ranges:
+            self.send_header("Accept-Ranges", "bytes")
+        self.send_header("ETag", etag)
+        self.send_header("Content-Length", str(end - start + 1))
+        self.end_headers()
+        with self.lock:
+            fail = RangeHandler.failures > 0 and end - start > self.fail_after
+            if fail:
+                RangeHandler.failures -= 1
+        body = memoryview(data)[start : end + 1]
+        limit = self.fail_after if fail else len(body)
+        chunk = 64 * 1024
+        for pos in range(0, limit, chunk):
+            part = body[pos : min(pos + chunk, limit)]
+            try:
+                self.wfile.write(part)
+            except (BrokenPipeError, ConnectionResetError):
+                return
+            with self.lock:
+                RangeHandler.served += len(part)
+            time.sleep(len(part) / self.rate)
+        if fail:
+            self.close_connection = True
+
+    def log_message(self, *args: Any) -> None:
+        pass
+
+
+def fetch(url: str, path: Path, segments: int, checksum: Optional[str] = None) -> float:
+    RangeHandler.served = 0
+    start = time.perf_counter()
+    download(Session(), url, path, checksum=checksum, segments=segments)
+    return time.perf_counter() - start
+
+
+@click.command()
+@click.option("-s", "--size", type=int, default=64, help="File size in MB")
+@click.option("-r", "--rate", type=float, default=16.0, help="MB/sec per connection")
+def main(size: int, rate: float):
+    settings.DOWNLOAD_SEGMENT_SIZE = 4 * 1024 * 1024
+    data = os.urandom(size * 1024 * 1024)
+    sha256 = "sha256:" + hashlib.sha256(data).hexdigest()
+    RangeHandler.files = {"/file.zip": data}
+    RangeHandler.rate = int(rate * 1024 * 1024)
+    server = ThreadingHTTPServer(("127.0.0.1", 0), RangeHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = "http://127.0.0.1:%d/file.zip" % server.server_address[1]
+    try:
+        with tempfile.TemporaryDirectory(prefix="bench-download-") as tmp:
+            runs = [
+                ("single", 1, True, 0),
+                ("4 segments", 4, True, 0),
+                ("no ranges", 4, False, 0),
+                ("flaky", 1, True, 3),
+                ("flaky, 4 seg", 4, True, 3),
+            ]
+            for idx, (label, segments, ranges, failures) in enumerate(runs):
+                RangeHandler.ranges = ranges
+                RangeHandler.failures = failures
+                RangeHandler.fail_after = len(data) // 10
+                path = Path(tmp) / f"{idx}.zip"
+                seconds = fetch(url, path, segments, checksum=sha256)
+                assert path.read_bytes() == data, "%s: file differs" % label
+                assert not path.with_name(path.name + ".part").exists()
+                print(
+                    "%-14s %6.2f s %7.1f MB/s %6.2fx bytes served"
+                    % (label, seconds, size / seconds, RangeHandler.served / len(data))
+                )
+            # A crawler that dies with the transfer resumes it on its next run:
+            RangeHandler.ranges = True
+            RangeHandler.failures = 1
+            RangeHandler.served = 0
+            path = Path(tmp) / "restart.zip"
+            try:
+                download(Session(), url, path, checksum=sha256, retries=0)
+                raise AssertionError("Failure not raised")
+            except DownloadError:
+                download(Session(), url, path, checksum=sha256, retries=0)
+            assert path.read_bytes() == data, "restart: file differs"
+            print(
+                "restarted run    %6.2fx bytes served"
+                % (RangeHandler.served / len(data))
+            )
+            try:
+                fetch(url, Path(tmp) / "bad.zip", 4, checksum="sha256:00")
+                raise AssertionError("Checksum mismatch not detected")
+            except DownloadError:
+                print("checksum mismatch detected")
+    finally:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,62 @@
+"""Per-emit overhead of the fragment sinks, separating the cost of
+serialising a fragment from that of writing it out."""
+
+import time
+import click
+import tempfile
+from pathlib import Path
+from typing import Callable, Dict, List
+from nomenklatura.entity import CompositeEntity
+from zavod.sinks.common import Sink
+from zavod.sinks.json_entity import JSONEntitySink
+
+from benchmarks.fragments import generate_fragments
+from common.instrument import InstrumentedSink
+from common.sinks import BatchedJSONEntitySink, serialize_entity
+
+
+class NullSink(Sink):
+    """Serialises the fragments without writing them."""
+
+    def emit(self, entity: CompositeEntity) -> None:
+        serialize_entity(entity)
+
+
+def run(sink: Sink, entities: List[CompositeEntity]) -> float:
+    start = time.perf_counter()
+    for entity in entities:
+        sink.emit(entity)
+    sink.close()
+    return time.perf_counter() - start
+
+
+@click.command()
+@click.option("-n", "--count", type=int, default=300_000)
+@click.option("-r", "--repeat", type=int, default=3)
+def main(count: int, repeat: int):
+    entities = list(generate_fragments(count))
+    sinks: Dict[str, Callable[[Path], Sink]] = {
+        "serialize only": lambda p: NullSink(p),
+        "zavod json": lambda p: JSONEntitySink(p),
+        "batched 64k": lambda p: BatchedJSONEntitySink(p, flush_size=64 * 1024),
+        "batched 1m": lambda p: BatchedJSONEntitySink(p, flush_size=1024 * 1024),
+        "batched 1m+instr": lambda p: InstrumentedSink(BatchedJSONEntitySink(p)),
+    }
+    run(NullSink("-"), entities)  # warm up
+    with tempfile.TemporaryDirectory() as tmp:
+        expected = None
+        for label, make_sink in sinks.items():
+            path = Path(tmp) / f"{label}.json"
+            best = min(run(make_sink(path), entities) for _ in range(repeat))
+            if path.exists():
+                data = path.read_bytes()
+                expected = expected or data
+                assert data == expected, "%s output differs" % label
+            print(
+                "%-18s %7.2f µs/emit %9.0f emits/s"
+                % (label, best * 1e6 / len(entities), len(entities) / best)
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+"""Extract owner names and share sizes from synthetic EDR founder and
+beneficiary texts with the `str.replace` loop that `ua_edr` used and with
+`parse_owner_text` (a single compiled pattern, cached), and check that both
+give the same results. Texts of state bodies and other common founders recur
+across companies, as in the published register."""
+
+import time
+import click
+import random
+from typing import Callable, List, Optional, Tuple
+
+from benchmarks.generators import ua_beneficiary, ua_founder
+from benchmarks.parsers import load_module
+
+Parsed = Optional[Tuple[str, Optional[str]]]
+
+
+def replace_loop(remove: List[str], text: str) -> Parsed:
+    if "причина відсутності:" in text:
+        return None
+    if text.startswith("релігійна громада в кількості"):
+        return None
+    for rem in remove:
+        text = text.replace(rem, "")
+    text = text.strip().strip("-")
+    shares = None
+    parts = text.rsplit(", розмір частки -", 1)
+    text = parts[0]
+    if len(parts) > 1:
+        shares = parts[1]
+    parts = text.split(",", 1)
+    name = parts[1] if len(parts) > 1 else text
+    name = name.strip()
+    if not len(name):
+        return None
+    return name, shares
+
+
+def timed(func: Callable[[str], Parsed], texts: List[str]) -> Tuple[float, list]:
+    start = time.perf_counter()
+    results = [func(text) for text in texts]
+    return time.perf_counter() - start, results
+
+
+@click.command()
+@click.option("-n", "--count", type=int, default=500_000)
+def main(count: int):
+    parse = load_module("ua_edr")
+    rnd = random.Random(23)
+    texts = [
+        ua_founder(rnd) if rnd.random() < 0.7 else ua_beneficiary(rnd)
+        for _ in range(count)
+    ]
+    unique = len(set(texts))
+    print("%d texts, %d distinct" % (count, unique))
+    remove = list(parse.REMOVE)
+    cached = parse.parse_owner_text
+    runs = [
+        ("replace loop", lambda text: replace_loop(remove, text)),
+        ("pattern", cached.__wrapped__),
+        ("pattern, cached", cached),
+    ]
+    expected = None
+    for label, func in runs:
+        cached.cache_clear()
+        seconds, results = timed(func, texts)
+        if expected is None:
+            expected = results
+        elif results != expected:
+            raise RuntimeError("Results differ: %s" % label)
+        print("%-16s %6.2f µs/text" % (label, seconds * 1e6 / count))
+
+
+if __name__ == "__main__":
+    main()
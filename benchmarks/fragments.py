@@ -0,0 +1,112 @@
+import time
+import click
+import random
+import tempfile
+from pathlib import Path
+from typing import Callable, Dict, Generator, List
+from followthemoney import model
+from nomenklatura.dataset import Dataset
+from nomenklatura.entity import CompositeEntity
+from zavod.sinks.common import Sink
+from zavod.sinks.json_entity import JSONEntitySink
+
+from common.fragments import iter_records, dict_path
+from common.sinks import MsgPackEntitySink, ZstdEntitySink
+
+WORDS = ["holding", "trading", "capital", "invest", "global", "nord", "baltic"]
+FORMS = ["Private limited company", "Public limited company", "LLP"]
+DATASET = Dataset.make({"name": "synthetic", "title": "Synthetic"})
+
+
+def make_entity(schema: str) -> CompositeEntity:
+    return CompositeEntity(model, {"schema": schema}, default_dataset=DATASET)
+
+
+def generate_fragments(
+    count: int, seed: int = 23
+) -> Generator[CompositeEntity, None, None]:
+    """Deterministic company, person and ownership fragments, roughly shaped
+    like the output of the company registry parsers."""
+    rnd = random.Random(seed)
+    for idx in range(count // 3):
+        company = make_entity("Company")
+        company.id = f"oc-companies-gb-{idx:08d}"
+        name = " ".join(rnd.choice(WORDS) for _ in range(3)).upper()
+        company.add("name", f"{name} LIMITED")
+        company.add("registrationNumber", f"{idx:08d}")
+        company.add("legalForm", rnd.choice(FORMS))
+        company.add("jurisdiction", "gb")
+        company.add("incorporationDate", f"{rnd.randint(1950, 2022)}-01-01")
+        company.add("address", f"{rnd.randint(1, 200)} High Street, London")
+        yield company
+
+        person = make_entity("Person")
+        person.id = f"gb-coh-psc-{idx:08d}-{rnd.getrandbits(32):08x}"
+        person.add("name", f"John {rnd.choice(WORDS).title()}")
+        person.add("nationality", rnd.choice(["gb", "de", "fr", "ru"]))
+        person.add("birthDate", f"{rnd.randint(1930, 2000)}-{rnd.randint(1, 12):02d}")
+        yield person
+
+        ownership = make_entity("Ownership")
+        ownership.id = f"gb-coh-psc-stmt-{idx:08d}"
+        ownership.add("owner", person.id)
+        ownership.add("asset", company.id)
+        ownership.add("role", "Ownership of shares 75 to 100 percent")
+        yield ownership
+
+
+def run(
+    make_sink: Callable[[Path], Sink], path: Path, entities: List[CompositeEntity]
+) -> Dict[str, float]:
+    sink = make_sink(path)
+    start = time.perf_counter()
+    for entity in entities:
+        sink.emit(entity)
+    sink.close()
+    write_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    records = sum(1 for _ in iter_records(path))
+    read_time = time.perf_counter() - start
+    assert records == len(entities), (records, len(entities))
+    size = path.stat().st_size
+    if dict_path(path).exists():
+        size += dict_path(path).stat().st_size
+    return {"write": write_time, "read": read_time, "size": size}
+
+
+@click.command()
+@click.option("-n", "--count", type=int, default=300_000)
+def main(count: int):
+    entities = list(generate_fragments(count))
+    formats = {
+        "json": (lambda p: JSONEntitySink(p), "fragments.json"),
+        "zstd": (lambda p: ZstdEntitySink(p, dict_size=0), "fragments.json.zst"),
+        "zstd+dict": (
+            lambda p: ZstdEntitySink(p, dict_size=110 * 1024),
+            "fragments.json.zst",
+        ),
+        "msgpack": (lambda p: MsgPackEntitySink(p), "fragments.msgpack"),
+        "msgpack+zstd": (lambda p: MsgPackEntitySink(p), "fragments.msgpack.zst"),
+    }
+    baseline = None
+    with tempfile.TemporaryDirectory() as tmp:
+        for label, (make_sink, name) in formats.items():
+            path = Path(tmp) / label / name
+            path.parent.mkdir()
+            res = run(make_sink, path, entities)
+            baseline = baseline or res["size"]
+            print(
+                "%-12s write %7.0f/s  parse %9.0f records/s  size %6.1f MB (%.1f%%)"
+                % (
+                    label,
+                    len(entities) / res["write"],
+                    len(entities) / res["read"],
+                    res["size"] / 1024**2,
+                    100 * res["size"] / baseline,
+                )
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,937 @@
+"""Deterministic synthetic source files for the parser benchmarks.
+
+Each generator writes `count` records shaped like the real source format to
+`path`, using a seeded RNG so that runs are comparable. The files are not
+meant to be valid beyond what the parsers in `datasets/` read from them."""
+
+import csv
+import json
+import click
+import random
+import tarfile
+import zipfile
+import openpyxl
+from io import BytesIO, StringIO
+from pathlib import Path
+from typing import Callable, Dict, List
+from xml.sax.saxutils import escape
+
+WORDS = ["holding", "trading", "capital", "invest", "global", "nord", "baltic"]
+FIRST_NAMES = ["John", "Mary", "Peter", "Anna", "David", "Olga", "Ivan", "Maria"]
+LAST_NAMES = ["Smith", "Brown", "Novak", "Tamm", "Petrov", "Popescu", "Jones"]
+RU_FIRST = ["ИВАН", "ПЕТР", "АННА", "ОЛЬГА", "СЕРГЕЙ", "МАРИЯ"]
+RU_LAST = ["ИВАНОВ", "ПЕТРОВ", "СИДОРОВА", "КУЗНЕЦОВ", "СМИРНОВА"]
+RU_PATRONYMIC = ["ИВАНОВИЧ", "ПЕТРОВНА", "СЕРГЕЕВИЧ", "АЛЕКСАНДРОВНА"]
+RU_WORDS = ["РОМАШКА", "ВЕКТОР", "СТРОЙ", "ТРАНС", "ИНВЕСТ", "АЛЬФА", "СЕВЕР"]
+CZ_FIRST = ["Jan", "Petr", "Jana", "Eva", "Tomáš", "Lucie"]
+CZ_LAST = ["Novák", "Svoboda", "Dvořák", "Černá", "Procházka"]
+UA_FIRST = ["ІВАН", "ПЕТРО", "ОЛЕНА", "ОКСАНА", "ТАРАС", "МАРІЯ"]
+UA_LAST = ["ШЕВЧЕНКО", "КОВАЛЕНКО", "БОНДАРЕНКО", "ТКАЧЕНКО", "МЕЛЬНИК"]
+UA_PATRONYMIC = ["ІВАНОВИЧ", "ПЕТРІВНА", "ТАРАСОВИЧ", "ОЛЕКСАНДРІВНА"]
+UA_WORDS = ["АГРО", "ПРОМ", "БУД", "ТРАНС", "ІНВЕСТ", "СВІТ", "ЗЕРНО"]
+COUNTRIES = ["GB", "DE", "FR", "NL", "LU", "CY", "US", "KY", "VG"]
+COUNTRY_NAMES = ["British Virgin Islands", "Panama", "Switzerland", "Cayman", "Malta"]
+STREETS = ["High Street", "Station Road", "Main Street", "Church Lane", "Park Road"]
+CITIES = ["London", "Manchester", "Leeds", "Bristol", "Cardiff", "Glasgow"]
+
+
+def rnd_name(rnd: random.Random, words: List[str] = WORDS, size: int = 2) -> str:
+    return " ".join(rnd.choice(words) for _ in range(size))
+
+
+def rnd_date(rnd: random.Random, fmt: str = "%Y-%m-%d") -> str:
+    year, month, day = rnd.randint(1950, 2022), rnd.randint(1, 12), rnd.randint(1, 28)
+    return (
+        fmt.replace("%Y", f"{year:04d}")
+        .replace("%m", f"{month:02d}")
+        .replace("%d", f"{day:02d}")
+    )
+
+
+def write_zip(path: Path, members: Dict[str, bytes]) -> None:
+    with zipfile.ZipFile(path, "w", zipfile.ZIP_DEFLATED) as zf:
+        for name, data in members.items():
+            zf.writestr(name, data)
+
+
+def write_csv(rows: List[Dict[str, str]], fields: List[str], **kwargs) -> bytes:
+    buf = StringIO()
+    writer = csv.DictWriter(buf, fieldnames=fields, **kwargs)
+    writer.writeheader()
+    writer.writerows(rows)
+    return buf.getvalue().encode("utf-8")
+
+
+def bods_jsonl(path: Path, count: int, seed: int = 23) -> None:
+    """BODS v0.2 statements: entity, person and ownership statements in turn."""
+    rnd = random.Random(seed)
+    publication = {
+        "publicationDate": "2023-01-31",
+        "bodsVersion": "0.2",
+        "publisher": {
+            "name": "OpenOwnership Register",
+            "url": "https://register.openownership.org",
+        },
+    }
+    source = {
+        "type": ["officialRegister"],
+        "description": "GB Persons Of Significant Control Register",
+        "url": "http://download.companieshouse.gov.uk/en_pscdata.html",
+        "retrievedAt": "2023-01-30T00:00:00Z",
+    }
+    with open(path, "wb") as fh:
+        for idx in range(count):
+            group = idx // 3
+            if idx % 3 == 0:
+                identifiers = [
+                    {
+                        "scheme": "GB-COH",
+                        "schemeName": "Companies House",
+                        "id": f"{group:08d}",
+                    },
+                    {
+                        "schemeName": "OpenOwnership Register",
+                        "uri": f"https://register.openownership.org/entities/{group:x}",
+                    },
+                ]
+                if group % 10 == 0:
+                    llp = {"schemeName": "GB-LLP Register", "id": f"OC{group:06d}"}
+                    identifiers.append(llp)
+                data = {
+                    "statementID": f"openownership-register-e{group:012d}",
+                    "statementType": "entityStatement",
+                    "isComponent": False,
+                    "entityType": "registeredEntity",
+                    "name": rnd_name(rnd, size=3).upper() + " LIMITED",
+                    "foundingDate": rnd_date(rnd),
+                    "incorporatedInJurisdiction": {
+                        "name": "United Kingdom",
+                        "code": "GB",
+                    },
+                    "identifiers": identifiers,
+                    "addresses": [
+                        {
+                            "type": "registered",
+                            "address": f"{rnd.randint(1, 200)} {rnd.choice(STREETS)}, {rnd.choice(CITIES)}",
+                            "country": "GB",
+                        }
+                    ],
+                }
+            elif idx % 3 == 1:
+                data = {
+                    "statementID": f"openownership-register-p{group:012d}",
+                    "statementType": "personStatement",
+                    "isComponent": False,
+                    "personType": "knownPerson",
+                    "names": [
+                        {
+                            "type": "individual",
+                            "fullName": f"{rnd.choice(FIRST_NAMES)} {rnd.choice(LAST_NAMES)}",
+                        }
+                    ],
+                    "nationalities": [{"name": "United Kingdom", "code": "GB"}],
+                    "birthDate": rnd_date(rnd)[:7],
+                    "placeOfResidence": {
+                        "address": rnd.choice(CITIES),
+                        "country": rnd.choice(COUNTRIES),
+                    },
+                }
+            else:
+                data = {
+                    "statementID": f"openownership-register-o{group:012d}",
+                    "statementType": "ownershipOrControlStatement",
+                    "isComponent": False,
+                    "statementDate": rnd_date(rnd),
+                    "subject": {
+                        "describedByEntityStatement": f"openownership-register-e{group:012d}"
+                    },
+                    "interestedParty": {
+                        "describedByPersonStatement": f"openownership-register-p{group:012d}"
+                    },
+                    "interests": [
+                        {
+                            "type": "shareholding",
+                            "details": "ownership-of-shares-75-to-100-percent",
+                            "startDate": rnd_date(rnd),
+                        },
+                        {
+                            "type": "voting-rights",
+                            "details": "voting-rights-75-to-100-percent",
+                            "startDate": rnd_date(rnd),
+                        },
+                    ],
+                }
+            data["publicationDetails"] = publication
+            data["source"] = source
+            fh.write(json.dumps(data, ensure_ascii=False).encode("utf-8"))
+            fh.write(b"\n")
+
+
+def lei_code(idx: int) -> str:
+    return f"529900{idx:012d}{idx % 97:02d}"
+
+
+def gleif_lei_xml(path: Path, count: int, seed: int = 23) -> None:
+    """A GLEIF LEI-CDF 2.1 concatenated file, zipped, plus the BIC, ISIN and
+    OpenCorporates mapping files the parser loads alongside it."""
+    rnd = random.Random(seed)
+    buf = StringIO()
+    buf.write('<?xml version="1.0" encoding="UTF-8"?>\n')
+    buf.write('<lei:LEIData xmlns:lei="http://www.gleif.org/data/schema/leidata/2016">')
+    buf.write(
+        f"<lei:LEIHeader><lei:RecordCount>{count}</lei:RecordCount></lei:LEIHeader>"
+    )
+    buf.write("<lei:LEIRecords>")
+    for idx in range(count):
+        country = rnd.choice(COUNTRIES)
+        address = (
+            f"<lei:FirstAddressLine>{rnd.randint(1, 200)} {rnd.choice(STREETS)}</lei:FirstAddressLine>"
+            f"<lei:City>{rnd.choice(CITIES)}</lei:City><lei:Region>{country}-XX</lei:Region>"
+            f"<lei:Country>{country}</lei:Country><lei:PostalCode>{rnd.randint(10000, 99999)}</lei:PostalCode>"
+        )
+        successor = ""
+        if idx > 0 and idx % 50 == 0:
+            successor = f"<lei:SuccessorEntity><lei:SuccessorLEI>{lei_code(idx - 1)}</lei:SuccessorLEI></lei:SuccessorEntity>"
+        buf.write(
+            "<lei:LEIRecord>"
+            f"<lei:LEI>{lei_code(idx)}</lei:LEI>"
+            "<lei:Entity>"
+            f"<lei:LegalName>{escape(rnd_name(rnd, size=3).title())} GmbH</lei:LegalName>"
+            f"<lei:LegalAddress>{address}</lei:LegalAddress>"
+            f"<lei:HeadquartersAddress>{address}</lei:HeadquartersAddress>"
+            "<lei:RegistrationAuthority><lei:RegistrationAuthorityID>RA000242</lei:RegistrationAuthorityID>"
+            f"<lei:RegistrationAuthorityEntityID>HRB {rnd.randint(1000, 999999)}</lei:RegistrationAuthorityEntityID></lei:RegistrationAuthority>"
+            f"<lei:LegalJurisdiction>{country}</lei:LegalJurisdiction>"
+            f"<lei:LegalForm><lei:EntityLegalFormCode>{rnd.choice(['2HBR', '6QQB', '8888'])}</lei:EntityLegalFormCode></lei:LegalForm>"
+            "<lei:EntityStatus>ACTIVE</lei:EntityStatus>"
+            f"<lei:EntityCreationDate>{rnd_date(rnd)}T00:00:00Z</lei:EntityCreationDate>"
+            "</lei:Entity>"
+            f"{successor}"
+            "<lei:Registration>"
+            f"<lei:InitialRegistrationDate>{rnd_date(rnd)}T00:00:00Z</lei:InitialRegistrationDate>"
+            f"<lei:LastUpdateDate>{rnd_date(rnd)}T00:00:00Z</lei:LastUpdateDate>"
+            "<lei:RegistrationStatus>ISSUED</lei:RegistrationStatus>"
+            "</lei:Registration>"
+            "</lei:LEIRecord>"
+        )
+    buf.write("</lei:LEIRecords></lei:LEIData>")
+    write_zip(
+        path,
+        {"20230101-gleif-concatenated-file-lei2.xml": buf.getvalue().encode("utf-8")},
+    )
+
+    codes = [lei_code(idx) for idx in range(0, count, 7)]
+    bics = [{"LEI": c, "BIC": f"BANK{c[-6:]}XXX"} for c in codes]
+    write_zip(
+        path.with_name("bic_lei.zip"), {"bic_lei.csv": write_csv(bics, ["LEI", "BIC"])}
+    )
+    isins = [{"LEI": c, "ISIN": f"DE000{c[-7:]}"} for c in codes]
+    write_zip(
+        path.with_name("isin_lei.zip"),
+        {"isin_lei.csv": write_csv(isins, ["LEI", "ISIN"])},
+    )
+    ocs = [{"LEI": c, "OpenCorporatesID": f"de/{c[-8:]}"} for c in codes]
+    write_zip(
+        path.with_name("oc_lei.zip"),
+        {"oc_lei.csv": write_csv(ocs, ["LEI", "OpenCorporatesID"])},
+    )
+
+
+def gleif_rr_xml(path: Path, count: int, seed: int = 23) -> None:
+    """A GLEIF RR-CDF 1.1 relationship records file, zipped."""
+    rnd = random.Random(seed)
+    types = [
+        "IS_DIRECTLY_CONSOLIDATED_BY",
+        "IS_ULTIMATELY_CONSOLIDATED_BY",
+        "IS_FUND-MANAGED_BY",
+    ]
+    buf = StringIO()
+    buf.write('<?xml version="1.0" encoding="UTF-8"?>\n')
+    buf.write(
+        '<rr:RelationshipData xmlns:rr="http://www.gleif.org/data/schema/rr/2016">'
+    )
+    buf.write(f"<rr:Header><rr:RecordCount>{count}</rr:RecordCount></rr:Header>")
+    buf.write("<rr:RelationshipRecords>")
+    for idx in range(count):
+        buf.write(
+            "<rr:RelationshipRecord><rr:Relationship>"
+            f"<rr:StartNode><rr:NodeID>{lei_code(idx)}</rr:NodeID><rr:NodeIDType>LEI</rr:NodeIDType></rr:StartNode>"
+            f"<rr:EndNode><rr:NodeID>{lei_code(rnd.randint(0, count))}</rr:NodeID><rr:NodeIDType>LEI</rr:NodeIDType></rr:EndNode>"
+            f"<rr:RelationshipType>{rnd.choice(types)}</rr:RelationshipType>"
+            "<rr:RelationshipPeriods><rr:RelationshipPeriod>"
+            f"<rr:StartDate>{rnd_date(rnd)}T00:00:00Z</rr:StartDate>"
+            "<rr:PeriodType>RELATIONSHIP_PERIOD</rr:PeriodType>"
+            "</rr:RelationshipPeriod></rr:RelationshipPeriods>"
+            "<rr:RelationshipStatus>ACTIVE</rr:RelationshipStatus>"
+            "<rr:RelationshipQuantifiers><rr:RelationshipQuantifier>"
+            "<rr:MeasurementMethod>ACCOUNTING_CONSOLIDATION</rr:MeasurementMethod>"
+            f"<rr:QuantifierAmount>{rnd.randint(1, 100)}.00</rr:QuantifierAmount>"
+            "<rr:QuantifierUnits>PERCENTAGE</rr:QuantifierUnits>"
+            "</rr:RelationshipQuantifier></rr:RelationshipQuantifiers>"
+            "</rr:Relationship>"
+            f"<rr:Registration><rr:LastUpdateDate>{rnd_date(rnd)}T00:00:00Z</rr:LastUpdateDate></rr:Registration>"
+            "</rr:RelationshipRecord>"
+        )
+    buf.write("</rr:RelationshipRecords></rr:RelationshipData>")
+    write_zip(
+        path,
+        {"20230101-gleif-concatenated-file-rr.xml": buf.getvalue().encode("utf-8")},
+    )
+
+
+def ru_person(rnd: random.Random) -> str:
+    return (
+        f'<СвФЛ Фамилия="{rnd.choice(RU_LAST)}" Имя="{rnd.choice(RU_FIRST)}" '
+        f'Отчество="{rnd.choice(RU_PATRONYMIC)}" ИННФЛ="{rnd.randint(10**11, 10**12 - 1)}"/>'
+    )
+
+
+def egrul_document(rnd: random.Random, idx: int) -> str:
+    if idx % 10 == 9:
+        return (
+            f'<Документ ИдДок="{idx:08x}"><СвИП ОГРНИП="3{idx:014d}" '
+            f'ИННФЛ="{rnd.randint(10**11, 10**12 - 1)}" НаимВидИП="Индивидуальный предприниматель"/></Документ>'
+        )
+    name = " ".join(rnd.choice(RU_WORDS) for _ in range(2))
+    grn = f'<ГРНДатаПерв ГРН="{rnd.randint(10**12, 10**13 - 1)}" ДатаЗаписи="{rnd_date(rnd)}"/>'
+    share = (
+        f'<ДоляУстКап НоминСтоим="{rnd.randint(1, 100) * 1000}">'
+        f"<РазмерДоли><Процент>{rnd.randint(1, 100)}</Процент></РазмерДоли></ДоляУстКап>"
+    )
+    founders = f"<УчрФЛ>{grn}{ru_person(rnd)}{share}</УчрФЛ>"
+    if idx % 3 == 0:
+        founders += (
+            f'<УчрЮЛРос>{grn}<НаимИННЮЛ ОГРН="1{rnd.randint(10**11, 10**12 - 1)}" '
+            f'ИНН="{rnd.randint(10**9, 10**10 - 1)}" НаимЮЛПолн="АО &quot;{rnd.choice(RU_WORDS)}&quot;"/>'
+            f"{share}</УчрЮЛРос>"
+        )
+    return (
+        f'<Документ ИдДок="{idx:08x}">'
+        f'<СвЮЛ ОГРН="1{idx:012d}" ДатаОГРН="{rnd_date(rnd)}" ИНН="{7700000000 + idx}" '
+        f'КПП="77{rnd.randint(1000000, 9999999)}" СпрОПФ="ОКОПФ" КодОПФ="12300" '
+        'ПолнНаимОПФ="Общество с ограниченной ответственностью">'
+        f'<СвНаимЮЛ НаимЮЛПолн="ОБЩЕСТВО С ОГРАНИЧЕННОЙ ОТВЕТСТВЕННОСТЬЮ &quot;{name}&quot;" '
+        f'НаимЮЛСокр="ООО &quot;{name}&quot;"/>'
+        f'<СвАдресЮЛ><АдресРФ Индекс="{rnd.randint(100000, 999999)}" КодРегион="77" '
+        f'Дом="ДОМ {rnd.randint(1, 99)}" Корпус="{rnd.randint(1, 9)}">'
+        '<Регион ТипРегион="ГОРОД" НаимРегион="МОСКВА"/>'
+        f'<Улица ТипУлица="УЛИЦА" НаимУлица="{rnd.choice(RU_WORDS)}"/>'
+        "</АдресРФ></СвАдресЮЛ>"
+        f'<СвАдрЭлПочты E-mail="info{idx}@example.ru"/>'
+        f"<СведДолжнФЛ>{grn}{ru_person(rnd)}"
+        '<СвДолжн ВидДолжн="02" НаимВидДолжн="Руководитель юридического лица" '
+        'НаимДолжн="ГЕНЕРАЛЬНЫЙ ДИРЕКТОР"/></СведДолжнФЛ>'
+        f"<СвУчредит>{founders}</СвУчредит>"
+        "</СвЮЛ></Документ>"
+    )
+
+
+def egrul_xml(path: Path, count: int, seed: int = 23, per_file: int = 1000) -> None:
+    """An EGRUL archive: a zip of XML files with up to `per_file` documents
+    each, mostly companies (СвЮЛ) and some sole traders (СвИП)."""
+    rnd = random.Random(seed)
+    members: Dict[str, bytes] = {}
+    for offset in range(0, count, per_file):
+        docs = [
+            egrul_document(rnd, idx)
+            for idx in range(offset, min(count, offset + per_file))
+        ]
+        header = (
+            '<?xml version="1.0" encoding="windows-1251"?>\n'
+            f'<Файл ИдФайл="EGRUL_{offset:08d}" ВерсФорм="4.06" ТипИнф="ЕГРЮЛ_ОТКР_СВЕД" КолДок="{len(docs)}">'
+        )
+        xml = "".join([header, *docs, "</Файл>"])
+        members[f"EGRUL_{offset:08d}.XML"] = xml.encode("windows-1251")
+    write_zip(path, members)
+
+
+ICIJ_ENTITY_FIELDS = [
+    "node_id",
+    "name",
+    "original_name",
+    "former_name",
+    "jurisdiction",
+    "jurisdiction_description",
+    "company_type",
+    "address",
+    "internal_id",
+    "incorporation_date",
+    "inactivation_date",
+    "struck_off_date",
+    "dorm_date",
+    "status",
+    "service_provider",
+    "ibcRUC",
+    "country_codes",
+    "countries",
+    "sourceID",
+    "valid_until",
+    "note",
+]
+ICIJ_OFFICER_FIELDS = [
+    "node_id",
+    "name",
+    "countries",
+    "country_codes",
+    "sourceID",
+    "valid_until",
+    "note",
+]
+ICIJ_ADDRESS_FIELDS = [
+    "node_id",
+    "address",
+    "name",
+    "countries",
+    "country_codes",
+    "sourceID",
+    "valid_until",
+    "note",
+]
+ICIJ_REL_FIELDS = [
+    "node_id_start",
+    "node_id_end",
+    "rel_type",
+    "link",
+    "status",
+    "start_date",
+    "end_date",
+    "sourceID",
+]
+ICIJ_LINKS = [
+    "shareholder of",
+    "director of",
+    "registered address",
+    "beneficiary of",
+    "secretary of",
+    "unknown link",
+]
+
+
+def icij_csv_zip(path: Path, count: int, seed: int = 23) -> None:
+    """The offshore leaks database CSV export: node files and relationships.
+    `count` is split between entities, officers, addresses and relationships."""
+    rnd = random.Random(seed)
+    quarter = max(1, count // 4)
+    source = "Panama Papers"
+    entities, officers, addresses, rels = [], [], [], []
+    for idx in range(quarter):
+        country = rnd.choice(COUNTRY_NAMES)
+        entities.append(
+            {
+                "node_id": str(10000000 + idx),
+                "name": rnd_name(rnd, size=3).upper() + " LTD.",
+                "original_name": "",
+                "former_name": "",
+                "jurisdiction": "BVI",
+                "jurisdiction_description": country,
+                "company_type": "Standard International Company",
+                "address": f"{rnd.randint(1, 99)} {rnd.choice(STREETS)}",
+                "internal_id": str(idx),
+                "incorporation_date": rnd_date(rnd, "%d.%m.%Y"),
+                "inactivation_date": "",
+                "struck_off_date": rnd.choice(["", rnd_date(rnd, "%d.%m.%Y")]),
+                "dorm_date": "",
+                "status": rnd.choice(
+                    ["Active", "Defaulted", "Struck / Defunct / Deregistered"]
+                ),
+                "service_provider": "Mossack Fonseca",
+                "ibcRUC": str(rnd.randint(100000, 999999)),
+                "country_codes": "VGB",
+                "countries": rnd.choice([country, f"{country};Switzerland"]),
+                "sourceID": source,
+                "valid_until": "The Panama Papers data is current through 2015",
+                "note": "",
+            }
+        )
+        officers.append(
+            {
+                "node_id": str(12000000 + idx),
+                "name": f"{rnd.choice(FIRST_NAMES)} {rnd.choice(LAST_NAMES)}",
+                "countries": rnd.choice(COUNTRY_NAMES),
+                "country_codes": "",
+                "sourceID": source,
+                "valid_until": "",
+                "note": "",
+            }
+        )
+        addresses.append(
+            {
+                "node_id": str(14000000 + idx),
+                "address": f"{rnd.randint(1, 99)} {rnd.choice(STREETS)}, {rnd.choice(CITIES)}",
+                "name": "",
+                "countries": rnd.choice(COUNTRY_NAMES),
+                "country_codes": "",
+                "sourceID": source,
+                "valid_until": "",
+                "note": "",
+            }
+        )
+        link = rnd.choice(ICIJ_LINKS)
+        end = (
+            14000000 + idx
+            if link == "registered address"
+            else 10000000 + rnd.randint(0, quarter - 1)
+        )
+        rels.append(
+            {
+                "node_id_start": str(12000000 + idx),
+                "node_id_end": str(end),
+                "rel_type": link.replace(" ", "_"),
+                "link": link,
+                "status": "",
+                "start_date": rnd_date(rnd, "%d-%m-%Y"),
+                "end_date": "",
+                "sourceID": source,
+            }
+        )
+    empty = write_csv([], ICIJ_OFFICER_FIELDS)
+    write_zip(
+        path,
+        {
+            "nodes-entities.csv": write_csv(entities, ICIJ_ENTITY_FIELDS),
+            "nodes-officers.csv": write_csv(officers, ICIJ_OFFICER_FIELDS),
+            "nodes-intermediaries.csv": empty,
+            "nodes-others.csv": empty,
+            "nodes-addresses.csv": write_csv(addresses, ICIJ_ADDRESS_FIELDS),
+            "relationships.csv": write_csv(rels, ICIJ_REL_FIELDS),
+        },
+    )
+
+
+def ares_tarball(path: Path, count: int, seed: int = 23) -> None:
+    """The ARES VREO dump: a gzipped tarball with one XML file per company."""
+    rnd = random.Random(seed)
+    with tarfile.open(path, "w:gz") as tf:
+        for idx in range(count):
+            ico = f"{10000000 + idx}"
+            members = []
+            for _ in range(rnd.randint(1, 3)):
+                members.append(
+                    "<D:Clen><D:funkce><D:nazev>jednatel</D:nazev></D:funkce>"
+                    f"<D:fosoba><D:jmeno>{rnd.choice(CZ_FIRST)}</D:jmeno><D:prijmeni>{rnd.choice(CZ_LAST)}</D:prijmeni>"
+                    f"<D:adresa><D:stat>Česká republika</D:stat><D:obec>Praha</D:obec>"
+                    f"<D:ulice>Národní</D:ulice><D:cisloTxt>{rnd.randint(1, 99)}</D:cisloTxt><D:psc>11000</D:psc></D:adresa>"
+                    "</D:fosoba></D:Clen>"
+                )
+            xml = (
+                '<?xml version="1.0" encoding="UTF-8"?>\n'
+                '<are:Ares_odpovedi xmlns:are="http://wwwinfo.mfcr.cz/ares/xml_doc/schemas/ares/ares_answer_vr/v_1.0.0" '
+                'xmlns:D="http://wwwinfo.mfcr.cz/ares/xml_doc/schemas/ares/ares_datatypes/v_1.0.3">'
+                "<are:Odpoved><D:Vypis_VR><D:Zakladni_udaje>"
+                f"<D:ICO>{ico}</D:ICO>"
+                f"<D:ObchodniFirma>{escape(rnd_name(rnd).title())} s.r.o.</D:ObchodniFirma>"
+                f"<D:DatumZapisu>{rnd_date(rnd)}</D:DatumZapisu>"
+                "<D:Sidlo><D:stat>Česká republika</D:stat><D:okres>Praha</D:okres><D:obec>Praha</D:obec>"
+                f"<D:ulice>Václavské náměstí</D:ulice><D:cisloTxt>{rnd.randint(1, 99)}</D:cisloTxt><D:psc>11000</D:psc></D:Sidlo>"
+                "</D:Zakladni_udaje>"
+                f"<D:Statutarni_organ>{''.join(members)}</D:Statutarni_organ>"
+                "</D:Vypis_VR></are:Odpoved></are:Ares_odpovedi>"
+            )
+            data = xml.encode("utf-8")
+            info = tarfile.TarInfo(name=f"VYSTUP/DATA/{ico}.xml")
+            info.size = len(data)
+            tf.addfile(info, BytesIO(data))
+
+
+EE_FILES = {
+    "general": "ettevotja_rekvisiidid__yldandmed.json",
+    "officers1": "ettevotja_rekvisiidid__kaardile_kantud_isikud.json",
+    "officers2": "ettevotja_rekvisiidid__kandevalised_isikud.json",
+    "bfo": "ettevotja_rekvisiidid__kasusaajad.json",
+}
+
+
+def ee_person(rnd: random.Random, owner: bool = False) -> Dict:
+    person = {
+        "isiku_tyyp": rnd.choice(["F", "F", "J"]),
+        "isikukood_registrikood": str(rnd.randint(30000000000, 69999999999)),
+        "eesnimi": rnd.choice(FIRST_NAMES),
+        "nimi_arinimi": rnd.choice(LAST_NAMES),
+        "aadress_riik": "EST",
+        "aadress_ads__ads_normaliseeritud_taisaadress": f"Harju maakond, Tallinn, {rnd.choice(STREETS)} {rnd.randint(1, 99)}",
+        "algus_kpv": rnd_date(rnd, "%d.%m.%Y"),
+        "lopp_kpv": None,
+    }
+    if owner:
+        person.update(
+            {
+                "isiku_roll": "O",
+                "isiku_roll_tekstina": "Osanik",
+                "osaluse_protsent": rnd.randint(1, 100),
+                "osaluse_suurus": 2500,
+                "osaluse_valuuta": "EUR",
+            }
+        )
+    else:
+        person.update({"isiku_roll": "JUHL", "isiku_roll_tekstina": "Juhatuse liige"})
+    return person
+
+
+def ariregister_json(path: Path, count: int, seed: int = 23) -> None:
+    """The Estonian business register JSON open data: `path` is a directory
+    which gets the four files, `count` records split between them."""
+    rnd = random.Random(seed)
+    path.mkdir(parents=True, exist_ok=True)
+    quarter = max(1, count // 4)
+    files: Dict[str, List[Dict]] = {k: [] for k in EE_FILES}
+    for idx in range(quarter):
+        code = 10000000 + idx
+        name = rnd_name(rnd).title() + " OÜ"
+        files["general"].append(
+            {
+                "ariregistri_kood": code,
+                "nimi": name,
+                "yldandmed": {
+                    "oiguslik_vorm_tekstina": rnd.choice(
+                        ["Osaühing", "Aktsiaselts", "Mittetulundusühing"]
+                    ),
+                    "staatused": [
+                        {"staatus": "R", "algus_kpv": rnd_date(rnd, "%d.%m.%Y")}
+                    ],
+                    "aadressid": [
+                        {
+                            "aadress_ads__ads_normaliseeritud_taisaadress": f"Tallinn, {rnd.choice(STREETS)} {rnd.randint(1, 99)}"
+                        }
+                    ],
+                    "staatus_tekstina": "Registrisse kantud",
+                    "sidevahendid": [
+                        {"liik": "EMAIL", "sisu": f"info{idx}@example.ee"},
+                        {"liik": "MOB", "sisu": f"+372 5{rnd.randint(100000, 999999)}"},
+                    ],
+                },
+            }
+        )
+        people = [ee_person(rnd), ee_person(rnd, owner=True)]
+        files["officers1"].append(
+            {"ariregistri_kood": code, "nimi": name, "kaardile_kantud_isikud": people}
+        )
+        files["officers2"].append(
+            {
+                "ariregistri_kood": code,
+                "nimi": name,
+                "kaardivalised_isikud": [ee_person(rnd)],
+            }
+        )
+        bfo = ee_person(rnd)
+        bfo["kontrolli_teostamise_viis_tekstina"] = "Otsene osalus"
+        files["bfo"].append(
+            {"ariregistri_kood": code, "nimi": name, "kasusaajad": [bfo]}
+        )
+    for key, name in EE_FILES.items():
+        with open(path.joinpath(name), "w", encoding="utf-8") as fh:
+            json.dump(files[key], fh, ensure_ascii=False)
+
+
+MD_HEADERS = [
+    "Nr.",
+    "Data înregistrării",
+    "Denumirea completă",
+    "Forma org./jurid. (forma organizatorico-juridică)",
+    "IDNO/ Cod fiscal",
+    "Adresa",
+    "Data lichidării",
+    "Lista conducătorilor",
+    "Lista fondatorilor",
+    "Lista beneficiarilor efectivi",
+]
+
+
+def md_xlsx(path: Path, count: int, seed: int = 23) -> None:
+    """The Moldovan company register spreadsheet, with a title row before
+    the header like the published file."""
+    rnd = random.Random(seed)
+    wb = openpyxl.Workbook(write_only=True)
+    ws = wb.create_sheet("Company")
+    ws.append(["Lista persoanelor juridice înregistrate"])
+    ws.append(MD_HEADERS)
+    for idx in range(count):
+        people = [
+            f"{rnd.choice(LAST_NAMES).upper()} {rnd.choice(FIRST_NAMES).upper()}"
+            for _ in range(3)
+        ]
+        ws.append(
+            [
+                idx + 1,
+                rnd_date(rnd),
+                f'Societatea cu Răspundere Limitată "{rnd_name(rnd).upper()}"',
+                "Societate cu Răspundere Limitată",
+                str(1000600000000 + idx),
+                f"MD-{rnd.randint(2000, 2099)}, mun. Chişinău, str. {rnd.choice(STREETS)} {rnd.randint(1, 99)}",
+                None,
+                f"{people[0]} [administrator], {people[1]} [director]",
+                f"{people[0]} (50%), {people[2]} (50%)",
+                f"{people[0]} (MD), {people[2]} (RO)",
+            ]
+        )
+    wb.save(path)
+
+
+def ua_person(rnd: random.Random) -> str:
+    return " ".join(
+        [rnd.choice(UA_LAST), rnd.choice(UA_FIRST), rnd.choice(UA_PATRONYMIC)]
+    )
+
+
+def ua_address(rnd: random.Random) -> str:
+    return (
+        f"{rnd.randint(1000, 99999):05d}, м.Київ, вул. {rnd.choice(UA_WORDS).title()}"
+        f"ська, буд. {rnd.randint(1, 99)}"
+    )
+
+
+# Founder texts that recur across many companies:
+UA_STATE_FOUNDERS = [
+    "ФОНД ДЕРЖАВНОГО МАЙНА УКРАЇНИ, код ЄДРПОУ 00032945",
+    "КИЇВСЬКА МІСЬКА РАДА, код ЄДРПОУ 22883141",
+    "МІНІСТЕРСТВО АГРАРНОЇ ПОЛІТИКИ ТА ПРОДОВОЛЬСТВА УКРАЇНИ",
+    "Члени трудового колективу",
+]
+
+
+def ua_founder(rnd: random.Random) -> str:
+    kind = rnd.random()
+    if kind < 0.2:
+        return rnd.choice(UA_STATE_FOUNDERS)
+    share = f", розмір частки - {rnd.randint(1, 500) * 100}.00"
+    if kind < 0.7:
+        return f"{ua_person(rnd)}, {ua_address(rnd)}{share}"
+    if kind < 0.85:
+        return (
+            f'ТОВАРИСТВО З ОБМЕЖЕНОЮ ВІДПОВІДАЛЬНІСТЮ "{rnd_name(rnd, UA_WORDS)}", '
+            f"код ЄДРПОУ {rnd.randint(10**7, 10**8 - 1)}{share}"
+        )
+    return "акціонери akcíoneri"
+
+
+def ua_beneficiary(rnd: random.Random) -> str:
+    if rnd.random() < 0.3:
+        return (
+            "КІНЦЕВИЙ БЕНЕФІЦІАРНИЙ ВЛАСНИК (КОНТРОЛЕР) У ЮРИДИЧНОЇ ОСОБИ ВІДСУТНІЙ, "
+            "причина відсутності: Засновники юридичної особи є фізичними особами"
+        )
+    return (
+        f"КІНЦЕВИЙ БЕНЕФІЦІАРНИЙ ВЛАСНИК(КОНТРОЛЕР) - {ua_person(rnd)}, "
+        f"Україна, {ua_address(rnd)}"
+    )
+
+
+def edr_record_uo(rnd: random.Random, idx: int) -> str:
+    name = rnd_name(rnd, UA_WORDS)
+    founders = "".join(
+        f"<FOUNDER>{escape(ua_founder(rnd))}</FOUNDER>"
+        for _ in range(rnd.randint(1, 3))
+    )
+    benes = "".join(
+        f"<BENEFICIARY>{escape(ua_beneficiary(rnd))}</BENEFICIARY>"
+        for _ in range(rnd.randint(0, 2))
+    )
+    return (
+        "<RECORD>"
+        f'<NAME>ТОВАРИСТВО З ОБМЕЖЕНОЮ ВІДПОВІДАЛЬНІСТЮ "{name}"</NAME>'
+        f'<SHORT_NAME>ТОВ "{name}"</SHORT_NAME>'
+        f"<EDRPOU>{30000000 + idx}</EDRPOU>"
+        f"<ADDRESS>{escape(ua_address(rnd))}</ADDRESS>"
+        f"<BOSS>{ua_person(rnd)}</BOSS>"
+        "<KVED>01.11 Вирощування зернових культур</KVED>"
+        f"<STAN>{rnd.choice(['зареєстровано', 'припинено'])}</STAN>"
+        f"<FOUNDERS>{founders}</FOUNDERS>"
+        f"<BENEFICIARIES>{benes}</BENEFICIARIES>"
+        "</RECORD>\n"
+    )
+
+
+def edr_record_fop(rnd: random.Random, idx: int) -> str:
+    return (
+        "<RECORD>"
+        f"<FIO>{ua_person(rnd)}</FIO>"
+        f"<ADDRESS>{escape(ua_address(rnd))}</ADDRESS>"
+        "<KVED>47.11 Роздрібна торгівля в неспеціалізованих магазинах</KVED>"
+        f"<STAN>{rnd.choice(['зареєстровано', 'припинено'])}</STAN>"
+        "</RECORD>\n"
+    )
+
+
+def edr_xml(path: Path, count: int, seed: int = 23) -> None:
+    """The Ukrainian EDR archive: zipped XML files of `count` legal entities
+    (UO) and `count` individual entrepreneurs (FOP)."""
+    rnd = random.Random(seed)
+    members: Dict[str, bytes] = {}
+    for kind, record in (("UO", edr_record_uo), ("FOP", edr_record_fop)):
+        header = '<?xml version="1.0" encoding="UTF-8"?>\n<DATA FORMAT_VERSION="1.0">\n'
+        records = [record(rnd, idx) for idx in range(count)]
+        xml = "".join([header, *records, "</DATA>\n"])
+        name = f"17.{len(members) + 1}-EX_XML_EDR_{kind}_FULL_23.02.2022.xml"
+        members[name] = xml.encode("utf-8")
+    write_zip(path, members)
+
+
+CH_BASE_FIELDS = [
+    "CompanyName",
+    " CompanyNumber",
+    "RegAddress.CareOf",
+    "RegAddress.POBox",
+    "RegAddress.AddressLine1",
+    " RegAddress.AddressLine2",
+    "RegAddress.PostTown",
+    "RegAddress.County",
+    "RegAddress.Country",
+    "RegAddress.PostCode",
+    "CompanyCategory",
+    "CompanyStatus",
+    "CountryOfOrigin",
+    "DissolutionDate",
+    "IncorporationDate",
+    "Accounts.AccountRefDay",
+    "Accounts.AccountRefMonth",
+    "Accounts.NextDueDate",
+    "Accounts.LastMadeUpDate",
+    "Accounts.AccountCategory",
+    "Returns.NextDueDate",
+    "Returns.LastMadeUpDate",
+    "Mortgages.NumMortCharges",
+    "Mortgages.NumMortOutstanding",
+    "Mortgages.NumMortPartSatisfied",
+    "Mortgages.NumMortSatisfied",
+    "SICCode.SicText_1",
+    "SICCode.SicText_2",
+    "SICCode.SicText_3",
+    "SICCode.SicText_4",
+    "LimitedPartnerships.NumGenPartners",
+    "LimitedPartnerships.NumLimPartners",
+    "URI",
+    *[
+        f" PreviousName_{i}.{f}"
+        for i in range(1, 11)
+        for f in ("CONDATE", "CompanyName")
+    ],
+    "ConfStmtNextDueDate",
+    " ConfStmtLastMadeUpDate",
+]
+SIC_CODES = [
+    "70100 - Activities of head offices",
+    "62020 - Information technology consultancy activities",
+    "68209 - Other letting and operating of own or leased real estate",
+    "99999 - Dormant Company",
+]
+
+
+def ch_base_csv(path: Path, count: int, seed: int = 23) -> None:
+    """Companies House `BasicCompanyDataAsOneFile`: a zipped CSV with the
+    odd leading spaces in some of the column names."""
+    rnd = random.Random(seed)
+    rows = []
+    for idx in range(count):
+        row = {f: "" for f in CH_BASE_FIELDS}
+        row.update(
+            {
+                "CompanyName": rnd_name(rnd, size=3).upper() + " LIMITED",
+                " CompanyNumber": f"{idx:08d}",
+                "RegAddress.AddressLine1": f"{rnd.randint(1, 200)} {rnd.choice(STREETS).upper()}",
+                "RegAddress.PostTown": rnd.choice(CITIES).upper(),
+                "RegAddress.Country": rnd.choice(
+                    ["ENGLAND", "UNITED KINGDOM", "WALES", "SCOTLAND", ""]
+                ),
+                "RegAddress.PostCode": f"EC{rnd.randint(1, 4)}A {rnd.randint(1, 9)}BB",
+                "CompanyCategory": "Private Limited Company",
+                "CompanyStatus": "Active",
+                "CountryOfOrigin": "United Kingdom",
+                "IncorporationDate": rnd_date(rnd, "%d/%m/%Y"),
+                "SICCode.SicText_1": rnd.choice(SIC_CODES),
+                "URI": f"http://business.data.gov.uk/id/company/{idx:08d}",
+            }
+        )
+        if idx % 5 == 0:
+            row[" PreviousName_1.CONDATE"] = rnd_date(rnd, "%d/%m/%Y")
+            row[" PreviousName_1.CompanyName"] = rnd_name(rnd, size=2).upper() + " LTD"
+        rows.append(row)
+    write_zip(path, {"BasicCompanyDataAsOneFile.csv": write_csv(rows, CH_BASE_FIELDS)})
+
+
+def ch_psc_jsonl(path: Path, count: int, seed: int = 23) -> None:
+    """Companies House PSC snapshot: a zip with one JSON object per line."""
+    rnd = random.Random(seed)
+    lines = []
+    for idx in range(count):
+        company_nr = f"{idx // 2:08d}"
+        psc_id = f"{rnd.getrandbits(96):024x}"
+        data = {
+            "address": {
+                "address_line_1": f"{rnd.randint(1, 200)} {rnd.choice(STREETS)}",
+                "locality": rnd.choice(CITIES),
+                "postal_code": f"EC{rnd.randint(1, 4)}A {rnd.randint(1, 9)}BB",
+                "country": rnd.choice(["England", "United Kingdom", "Wales"]),
+            },
+            "etag": f"{rnd.getrandbits(160):040x}",
+            "links": {
+                "self": f"/company/{company_nr}/persons-with-significant-control/individual/{psc_id}"
+            },
+            "notified_on": rnd_date(rnd),
+            "natures_of_control": [
+                "ownership-of-shares-75-to-100-percent",
+                "voting-rights-75-to-100-percent",
+            ],
+        }
+        if idx % 4 == 3:
+            data.update(
+                {
+                    "kind": "corporate-entity-person-with-significant-control",
+                    "name": rnd_name(rnd, size=3).upper() + " LIMITED",
+                    "identification": {
+                        "legal_form": "Private Limited Company",
+                        "legal_authority": "Companies Act 2006",
+                        "country_registered": "England",
+                        "registration_number": f"{rnd.randint(0, 99999999):08d}",
+                    },
+                }
+            )
+        else:
+            first, last = rnd.choice(FIRST_NAMES), rnd.choice(LAST_NAMES)
+            data.update(
+                {
+                    "kind": "individual-person-with-significant-control",
+                    "name": f"Mr {first} {last}",
+                    "name_elements": {
+                        "title": "Mr",
+                        "forename": first,
+                        "surname": last,
+                    },
+                    "nationality": rnd.choice(["British", "German", "French"]),
+                    "country_of_residence": "England",
+                    "date_of_birth": {
+                        "year": rnd.randint(1930, 2000),
+                        "month": rnd.randint(1, 12),
+                    },
+                }
+            )
+        lines.append(json.dumps({"company_number": company_nr, "data": data}))
+    payload = ("\n".join(lines) + "\n").encode("utf-8")
+    write_zip(path, {"persons-with-significant-control-snapshot.txt": payload})
+
+
+GENERATORS: Dict[str, Callable[..., None]] = {
+    "bods": bods_jsonl,
+    "gleif_lei": gleif_lei_xml,
+    "gleif_rr": gleif_rr_xml,
+    "egrul": egrul_xml,
+    "icij": icij_csv_zip,
+    "ares": ares_tarball,
+    "ariregister": ariregister_json,
+    "md_xlsx": md_xlsx,
+    "edr": edr_xml,
+    "ch_base": ch_base_csv,
+    "ch_psc": ch_psc_jsonl,
+}
+
+
+@click.command(help="Write a synthetic source file")
+@click.argument("fmt", type=click.Choice(sorted(GENERATORS)))
+@click.argument("path", type=click.Path(path_type=Path))
+@click.option("-n", "--count", type=int, default=10_000)
+@click.option("-s", "--seed", type=int, default=23)
+def main(fmt: str, path: Path, count: int, seed: int):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    GENERATORS[fmt](path, count, seed=seed)
+
+
+if __name__ == "__main__":
+    main()
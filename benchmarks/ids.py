@@ -0,0 +1,62 @@
+"""Time `context.make_id` and `common.ids.IdHasher` on the ID pattern of
+officer-heavy parsers: a few IDs per officer that start with the company ID.
+That both make the same IDs on random parts is checked in `tests/test_ids.py`."""
+
+import time
+import click
+import random
+from pathlib import Path
+from typing import List
+from nomenklatura.entity import CompositeEntity
+from zavod import Zavod, ZavodDataset
+
+from benchmarks.generators import FIRST_NAMES, LAST_NAMES
+from common.ids import id_hasher
+
+ROOT = Path(__file__).resolve().parent.parent
+
+
+def officers(count: int, seed: int = 23) -> List[List[str]]:
+    rnd = random.Random(seed)
+    companies = []
+    for idx in range(count):
+        names = [
+            f"{rnd.choice(FIRST_NAMES)} {rnd.choice(LAST_NAMES)} {idx}"
+            for _ in range(rnd.randint(1, 6))
+        ]
+        companies.append([f"oc-companies-md-{1000600000000 + idx}", *names])
+    return companies
+
+
+@click.command()
+@click.option("-n", "--count", type=int, default=20_000)
+def main(count: int):
+    dataset = ZavodDataset.from_path(ROOT / "datasets/md_companies/metadata.yml")
+    context = Zavod(dataset, CompositeEntity)
+    companies = officers(count)
+    start = time.perf_counter()
+    expected = []
+    for company_id, *names in companies:
+        for name in names:
+            expected.append(context.make_id(company_id, name))
+            expected.append(context.make_id("Directorship", company_id, name, "dir"))
+    seconds = time.perf_counter() - start
+    print("context.make_id     %6.2f µs/ID" % (seconds * 1e6 / len(expected)))
+
+    start = time.perf_counter()
+    made = []
+    hasher = id_hasher(context)
+    links = hasher.scope("Directorship")
+    for company_id, *names in companies:
+        person_ids = hasher.scope(company_id)
+        link_ids = links.scope(company_id)
+        for name in names:
+            made.append(person_ids.make_id(name))
+            made.append(link_ids.make_id(name, "dir"))
+    seconds = time.perf_counter() - start
+    assert made == expected, "IDs differ"
+    print("IdHasher (scoped)   %6.2f µs/ID" % (seconds * 1e6 / len(made)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,56 @@
+"""Parse a synthetic EDR archive (legal entities and individual entrepreneurs)
+serially and with the records split into chunks for worker processes
+(`common.parallel`), and check that every run writes the same export. Each
+run is a separate process, since the worker count is read from the
+environment (`GRAPH_PARSE_WORKERS`)."""
+
+import os
+import sys
+import click
+import tempfile
+import subprocess
+from pathlib import Path
+from typing import Optional, Tuple
+
+from benchmarks.aggregate import EXPORT, read_export, run
+from benchmarks.generators import edr_xml
+
+
+def parse(data_path: Path, count: int) -> None:
+    seconds, _ = run("ua_edr", data_path, data_path, 0)
+    rate = count * 2 / seconds
+    print("%8.2fs  %8.0f records/s" % (seconds, rate))
+
+
+@click.command()
+@click.option("-n", "--count", type=int, default=50_000)
+@click.option("-w", "--workers", type=int, multiple=True, default=[1, 2, 4])
+@click.option("-c", "--chunk-size", type=int, default=4 * 1024 * 1024)
+@click.option("--path", type=click.Path(path_type=Path), default=None)
+def main(count: int, workers: Tuple[int, ...], chunk_size: int, path: Optional[Path]):
+    if path is not None:
+        parse(path, count)
+        return
+    with tempfile.TemporaryDirectory(prefix="bench-parallel-") as tmp:
+        source = Path(tmp) / "source.zip"
+        edr_xml(source, count)
+        expected = None
+        for num in workers:
+            data_path = Path(tmp) / f"workers-{num}"
+            data_path.mkdir()
+            (data_path / "source.zip").symlink_to(source)
+            env = dict(os.environ, GRAPH_PARSE_WORKERS=str(num), GRAPH_EDR_FOP="1")
+            env["GRAPH_PARSE_CHUNK_SIZE"] = str(chunk_size)
+            print("workers=%d: " % num, end="", flush=True)
+            cmd = [sys.executable, "-m", "benchmarks.parallel", "-n", str(count)]
+            cmd.extend(["--path", str(data_path)])
+            subprocess.run(cmd, check=True, env=env, stderr=subprocess.DEVNULL)
+            entities = read_export(data_path / EXPORT)
+            if expected is None:
+                expected = entities
+            elif entities != expected:
+                raise RuntimeError("Export differs with %d workers" % num)
+
+
+if __name__ == "__main__":
+    main()
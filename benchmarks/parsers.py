@@ -0,0 +1,246 @@
+"""Offline throughput and memory benchmarks for the dataset parsers.
+
+Synthetic source files (see `benchmarks/generators.py`) are written to a temp
+directory, which then serves as the zavod data path for the parser, so the
+`fetch_resource` calls find their files and never hit the network. Each
+parser runs in its own process so that its peak RSS can be measured."""
+
+import os
+import sys
+import json
+import time
+import click
+import resource
+import tempfile
+import importlib.util
+import subprocess
+from pathlib import Path
+from types import ModuleType
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+ROOT = Path(__file__).resolve().parent.parent
+DATASETS = ROOT / "datasets"
+BASELINE = Path(__file__).resolve().parent / "baseline.json"
+
+Runner = Callable[[ModuleType, Any, Path], None]
+
+
+def load_module(dataset: str, name: str = "parse") -> ModuleType:
+    path = DATASETS / dataset / f"{name}.py"
+    spec = importlib.util.spec_from_file_location(f"{dataset}_{name}", path)
+    if spec is None or spec.loader is None:
+        raise RuntimeError("Cannot load: %s" % path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def run_bods(parse: ModuleType, context: Any, data_path: Path) -> None:
+    parse.parse_file(context, data_path / "source.json")
+
+
+def run_gleif_lei(parse: ModuleType, context: Any, data_path: Path) -> None:
+    bics = parse.load_bic_mapping(context, data_path / "bic_lei.zip")
+    ocurls = parse.load_oc_mapping(context, data_path / "oc_lei.zip")
+    isins = parse.load_isin_mapping(context, data_path / "isin_lei.zip")
+    with parse.read_zip_file(context, data_path / "lei.zip") as fh:
+        parse.parse_lei_file(context, fh, bics, ocurls, isins)
+
+
+def run_gleif_rr(parse: ModuleType, context: Any, data_path: Path) -> None:
+    with parse.read_zip_file(context, data_path / "rr.zip") as fh:
+        parse.parse_rr_file(context, fh)
+
+
+def run_egrul(parse: ModuleType, context: Any, data_path: Path) -> None:
+    with parse.Archive(data_path / "egrul.zip") as archive:
+        for name in archive.namelist():
+            with archive.open(name) as fh:
+                parse.parse_xml(context, fh)
+
+
+def run_icij(parse: ModuleType, context: Any, data_path: Path) -> None:
+    parse.parse(context, data_path / "data.zip")
+
+
+def run_parse(parse: ModuleType, context: Any, data_path: Path) -> None:
+    parse.parse(context)
+
+
+def run_md(parse: ModuleType, context: Any, data_path: Path) -> None:
+    book = parse.openpyxl.load_workbook(
+        data_path / "data.xlsx", read_only=True, data_only=True
+    )
+    parse.parse_companies(context, book)
+
+
+def run_edr(parse: ModuleType, context: Any, data_path: Path) -> None:
+    parse.crawl(context, parse.URL)
+
+
+def run_ch_base(parse: ModuleType, context: Any, data_path: Path) -> None:
+    parse.parse_base_data(context, data_path / "base_data.zip")
+
+
+def run_ch_psc(parse: ModuleType, context: Any, data_path: Path) -> None:
+    parse.parse_psc_data(context, data_path / "psc_data.zip")
+
+
+# name: (dataset folder, [(generator, file name in the data path)], runner)
+BENCHMARKS: Dict[str, Tuple[str, List[Tuple[str, str]], Runner]] = {
+    "gb_coh_psc_bods": ("gb_coh_psc_bods", [("bods", "source.json")], run_bods),
+    "gleif_lei": ("gleif", [("gleif_lei", "lei.zip")], run_gleif_lei),
+    "gleif_rr": ("gleif", [("gleif_rr", "rr.zip")], run_gleif_rr),
+    "ru_egrul": ("ru_egrul", [("egrul", "egrul.zip")], run_egrul),
+    "icij_offshoreleaks": ("icij_offshoreleaks", [("icij", "data.zip")], run_icij),
+    "cz_business_register": (
+        "cz_business_register",
+        [("ares", "data.tar.gz")],
+        run_parse,
+    ),
+    "ee_ariregister": ("ee_ariregister", [("ariregister", ".")], run_parse),
+    "md_companies": ("md_companies", [("md_xlsx", "data.xlsx")], run_md),
+    "ua_edr": ("ua_edr", [("edr", "source.zip")], run_edr),
+    "gb_coh_psc_base": ("gb_coh_psc", [("ch_base", "base_data.zip")], run_ch_base),
+    "gb_coh_psc_psc": ("gb_coh_psc", [("ch_psc", "psc_data.zip")], run_ch_psc),
+}
+
+
+def metadata_path(dataset: str) -> Path:
+    for name in ("metadata.yml", "manifest.yml"):
+        path = DATASETS / dataset / name
+        if path.exists():
+            return path
+    raise RuntimeError("No metadata for dataset: %s" % dataset)
+
+
+def peak_rss() -> int:
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+def measure_parser(name: str, data_path: Path, count: int) -> Dict[str, Any]:
+    """Run one parser on the fixtures in `data_path` (in this process)."""
+    from common.context import init_context
+    from common.instrument import RECORDER
+
+    dataset, _, runner = BENCHMARKS[name]
+    os.chdir(DATASETS / dataset)
+    parse = load_module(dataset)
+    with init_context(metadata_path(dataset), data_path=data_path) as context:
+        start = time.perf_counter()
+        runner(parse, context, data_path)
+        seconds = time.perf_counter() - start
+    return {
+        "records": count,
+        "fragments": RECORDER.stage("emit").items,
+        "seconds": round(seconds, 3),
+        "records_per_sec": round(count / seconds, 1),
+        "peak_rss": peak_rss(),
+    }
+
+
+def run_benchmark(name: str, count: int, verbose: bool) -> Dict[str, Any]:
+    from benchmarks.generators import GENERATORS
+
+    with tempfile.TemporaryDirectory(prefix=f"bench-{name}-") as tmp:
+        data_path = Path(tmp)
+        for generator, file_name in BENCHMARKS[name][1]:
+            GENERATORS[generator](data_path / file_name, count)
+        env = dict(os.environ, PYTHONPATH=str(ROOT))
+        cmd = [sys.executable, "-m", "benchmarks.parsers", "measure"]
+        cmd.extend([name, str(data_path), str(count)])
+        proc = subprocess.run(
+            cmd,
+            cwd=ROOT,
+            env=env,
+            stdout=subprocess.PIPE,
+            stderr=None if verbose else subprocess.PIPE,
+            text=True,
+        )
+        if proc.returncode != 0:
+            error = (proc.stderr or "").strip().splitlines()
+            return {"error": error[-1] if error else "exit %d" % proc.returncode}
+        return json.loads(proc.stdout.strip().splitlines()[-1])
+
+
+def compare(
+    result: Dict[str, Any], base: Optional[Dict[str, Any]], tolerance: float
+) -> Tuple[str, bool]:
+    if base is None or "error" in base or base.get("records") != result["records"]:
+        return "no baseline", False
+    rate = result["records_per_sec"] / base["records_per_sec"]
+    rss = result["peak_rss"] / base["peak_rss"]
+    notes = ["%+.0f%% rate" % ((rate - 1) * 100), "%+.0f%% rss" % ((rss - 1) * 100)]
+    failed = rate < 1 - tolerance or rss > 1 + tolerance
+    if result["fragments"] != base["fragments"]:
+        notes.append("fragments %d != %d" % (result["fragments"], base["fragments"]))
+        failed = True
+    if failed:
+        notes.append("REGRESSION")
+    return ", ".join(notes), failed
+
+
+@click.group(help="Benchmark dataset parsers on synthetic source files")
+def cli() -> None:
+    pass
+
+
+@cli.command("run", help="Benchmark parsers and compare against the baseline")
+@click.argument("names", nargs=-1, type=click.Choice(sorted(BENCHMARKS)))
+@click.option("-n", "--count", type=int, default=10_000, show_default=True)
+@click.option("-b", "--baseline", type=click.Path(path_type=Path), default=BASELINE)
+@click.option("-t", "--tolerance", type=float, default=0.3, show_default=True)
+@click.option("--save", is_flag=True, help="Store the results as the new baseline")
+@click.option("-v", "--verbose", is_flag=True, help="Show parser logs")
+def run(
+    names: List[str],
+    count: int,
+    baseline: Path,
+    tolerance: float,
+    save: bool,
+    verbose: bool,
+) -> None:
+    stored: Dict[str, Any] = {}
+    if baseline.exists():
+        with open(baseline, "r") as fh:
+            stored = json.load(fh)
+    results: Dict[str, Any] = {}
+    failures = 0
+    for name in names or sorted(BENCHMARKS):
+        result = results[name] = run_benchmark(name, count, verbose)
+        if "error" in result:
+            print("%-22s failed: %s" % (name, result["error"]))
+            continue
+        note, failed = compare(result, stored.get(name), tolerance)
+        failures += int(failed)
+        print(
+            "%-22s %9.0f records/s %8d fragments %7.1f MB peak  (%s)"
+            % (
+                name,
+                result["records_per_sec"],
+                result["fragments"],
+                result["peak_rss"] / 1024**2,
+                note,
+            )
+        )
+    if save:
+        stored.update(results)
+        with open(baseline, "w") as fh:
+            json.dump(stored, fh, indent=2, sort_keys=True)
+            fh.write("\n")
+    if failures and not save:
+        sys.exit(1)
+
+
+@cli.command("measure", hidden=True)
+@click.argument("name", type=click.Choice(sorted(BENCHMARKS)))
+@click.argument("data_path", type=click.Path(exists=True, path_type=Path))
+@click.argument("count", type=int)
+def measure(name: str, data_path: Path, count: int) -> None:
+    result = measure_parser(name, data_path, count)
+    print(json.dumps(result))
+
+
+if __name__ == "__main__":
+    cli()
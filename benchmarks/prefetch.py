@@ -0,0 +1,92 @@
+"""Crawl synthetic EGRUL archives from a local, bandwidth-limited HTTP server,
+once downloading and parsing each archive in turn and once through the
+`common.prefetch` pipeline, and compare the wall time of both."""
+
+import time
+import click
+import shutil
+import tempfile
+import threading
+from pathlib import Path
+from functools import partial
+from typing import Any, List, Tuple
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+
+from benchmarks.generators import GENERATORS
+from benchmarks.parsers import load_module, metadata_path
+from common.context import init_context
+from common.instrument import RECORDER
+from common.download import fetch_resource
+from common.prefetch import prefetch
+
+
+class ThrottledHandler(SimpleHTTPRequestHandler):
+    """Serve files from a directory at a fixed rate (bytes/sec)."""
+
+    rate = 10 * 1024 * 1024
+
+    def copyfile(self, source, outputfile) -> None:
+        chunk = 64 * 1024
+        while True:
+            data = source.read(chunk)
+            if not data:
+                break
+            outputfile.write(data)
+            time.sleep(len(data) / self.rate)
+
+    def log_message(self, *args: Any) -> None:
+        pass
+
+
+def crawl(
+    resources: List[Tuple[str, str]], data_path: Path, pipelined: bool, budget: int
+) -> Tuple[float, int]:
+    parse = load_module("ru_egrul")
+    emitted = RECORDER.stage("emit").items
+    with init_context(metadata_path("ru_egrul"), data_path=data_path) as context:
+        start = time.perf_counter()
+        if pipelined:
+            for _, path in prefetch(context, resources, budget=budget, delete=True):
+                parse.parse_archive(context, path)
+        else:
+            for name, url in resources:
+                path = fetch_resource(context, name, url)
+                parse.parse_archive(context, path)
+                path.unlink()
+        seconds = time.perf_counter() - start
+    return seconds, RECORDER.stage("emit").items - emitted
+
+
+@click.command()
+@click.option("-a", "--archives", type=int, default=6)
+@click.option("-n", "--count", type=int, default=3000, help="Companies per archive")
+@click.option("-r", "--rate", type=float, default=0.2, help="Server MB/sec")
+@click.option("-b", "--budget", type=int, default=1024**3)
+def main(archives: int, count: int, rate: float, budget: int):
+    with tempfile.TemporaryDirectory(prefix="bench-prefetch-") as tmp:
+        served = Path(tmp) / "served"
+        served.mkdir()
+        for idx in range(archives):
+            GENERATORS["egrul"](served / f"egrul_{idx}.zip", count)
+        size = sum(p.stat().st_size for p in served.iterdir())
+        ThrottledHandler.rate = int(rate * 1024 * 1024)
+        handler = partial(ThrottledHandler, directory=str(served))
+        server = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        base = "http://127.0.0.1:%d/" % server.server_address[1]
+        resources = [(p.name, base + p.name) for p in sorted(served.iterdir())]
+        print("%d archives, %.1f MB at %.1f MB/s" % (archives, size / 1e6, rate))
+        try:
+            for label, pipelined in (("sequential", False), ("prefetch", True)):
+                data_path = Path(tmp) / label
+                seconds, fragments = crawl(resources, data_path, pipelined, budget)
+                left = [p.name for p in data_path.glob("*.zip*")]
+                assert not len(left), "%s left files behind: %s" % (label, left)
+                print("%-12s %7.2f s %9d fragments" % (label, seconds, fragments))
+                shutil.rmtree(data_path)
+        finally:
+            server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
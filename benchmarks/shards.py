@@ -0,0 +1,62 @@
+"""Sort and aggregate synthetic fragments from a single file and from files
+sharded by entity ID (`common.sinks.ShardedSink`), and check that both give
+the same entities."""
+
+import time
+import click
+import tempfile
+from pathlib import Path
+from typing import Dict, List
+
+from benchmarks.fragments import generate_fragments
+from common.fragments import aggregate_shards, external_sort, iter_records
+from common.fragments import shard_paths, sorted_aggregate
+from common.sinks import make_sink
+
+
+def write(path: Path, count: int, shards: int) -> float:
+    # Emit every entity twice, as parsers do with repeated fragments:
+    entities = list(generate_fragments(count))
+    sink = make_sink(path, shards=shards)
+    start = time.perf_counter()
+    for entity in entities + entities:
+        sink.emit(entity)
+    sink.close()
+    return time.perf_counter() - start
+
+
+def read_entities(path: Path) -> Dict[str, List]:
+    return {r["id"]: sorted(r["properties"].items()) for r in iter_records(path)}
+
+
+@click.command()
+@click.option("-n", "--count", type=int, default=600_000)
+@click.option("-s", "--shards", type=int, default=8)
+@click.option("-f", "--format", "name", default="fragments.json.zst")
+def main(count: int, shards: int, name: str):
+    with tempfile.TemporaryDirectory(prefix="bench-shards-") as tmp:
+        single = Path(tmp) / "single" / name
+        emit = write(single, count, 1)
+        start = time.perf_counter()
+        sorted_path = single.with_name("sorted.msgpack")
+        external_sort(single, sorted_path)
+        sorted_aggregate(sorted_path, single.with_name("entities.ftm.json"))
+        took = time.perf_counter() - start
+        print("%-10s emit %6.2f s  sort+aggregate %6.2f s" % ("1 file", emit, took))
+
+        sharded = Path(tmp) / "sharded" / name
+        emit = write(sharded, count, shards)
+        start = time.perf_counter()
+        out_path = sharded.with_name("entities.ftm.json")
+        aggregate_shards(shard_paths(sharded), out_path, workers=shards)
+        took = time.perf_counter() - start
+        label = "%d shards" % shards
+        print("%-10s emit %6.2f s  sort+aggregate %6.2f s" % (label, emit, took))
+
+        expected = read_entities(single.with_name("entities.ftm.json"))
+        assert read_entities(out_path) == expected, "Sharded entities differ"
+        print("%d entities match" % len(expected))
+
+
+if __name__ == "__main__":
+    main()
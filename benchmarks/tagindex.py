@@ -0,0 +1,149 @@
+"""Per-record cost of the element lookups of the EGRUL and GLEIF parsers:
+string ElementPath `find` calls (as the parsers made them), precompiled
+`etree.XPath` objects and a single-pass `common.xmlstream.TagIndex`. Each
+variant extracts the same values, which are checked to match."""
+
+import time
+import click
+import tempfile
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+from lxml import etree
+from lxml.etree import _Element as Element
+
+from benchmarks.generators import GENERATORS
+from common.archive import Archive
+from common.xmlstream import Namespace, TagIndex, iter_records
+
+LEI = "http://www.gleif.org/data/schema/leidata/2016"
+L = Namespace(LEI)
+Values = List[Optional[str]]
+
+EGRUL_CHILDREN = ["СвАдрЭлПочты", "СвГражд", "СвНаимЮЛ", "СведДолжнФЛ"]
+EGRUL_FOUNDER = ["ГРНДатаПерв", "ДоляУстКап", "СвНедДанУчр", "НаимИННЮЛ", "СвРегИн"]
+LEI_ENTITY = ["LegalName", "LegalJurisdiction", "EntityStatus", "EntityCreationDate"]
+
+
+def egrul_paths(el: Element) -> Values:
+    values: Values = []
+    for tag in EGRUL_CHILDREN:
+        found = el.find("./" + tag)
+        values.append(found.tag if found is not None else None)
+    for founder in el.findall("./СвУчредит/*"):
+        for tag in EGRUL_FOUNDER:
+            found = founder.find("./" + tag)
+            values.append(found.tag if found is not None else None)
+    return values
+
+
+EGRUL_XPATH = {t: etree.XPath("./" + t) for t in EGRUL_CHILDREN + EGRUL_FOUNDER}
+EGRUL_FOUNDERS = etree.XPath("./СвУчредит/*")
+
+
+def egrul_xpath(el: Element) -> Values:
+    values: Values = []
+    for tag in EGRUL_CHILDREN:
+        found = EGRUL_XPATH[tag](el)
+        values.append(found[0].tag if len(found) else None)
+    for founder in EGRUL_FOUNDERS(el):
+        for tag in EGRUL_FOUNDER:
+            found = EGRUL_XPATH[tag](founder)
+            values.append(found[0].tag if len(found) else None)
+    return values
+
+
+def egrul_index(el: Element) -> Values:
+    values: Values = []
+    children = TagIndex.children(el)
+    for tag in EGRUL_CHILDREN:
+        found = children.find(tag)
+        values.append(found.tag if found is not None else None)
+    for founders in children.findall("СвУчредит"):
+        for founder in founders.iterchildren(etree.Element):
+            founder_children = TagIndex.children(founder)
+            for tag in EGRUL_FOUNDER:
+                found = founder_children.find(tag)
+                values.append(found.tag if found is not None else None)
+    return values
+
+
+def lei_paths(el: Element) -> Values:
+    values: Values = [el.findtext(L("LEI"))]
+    entity = el.find(L("Entity"))
+    values.extend(entity.findtext(L(tag)) for tag in LEI_ENTITY)
+    values.append(el.find(L("Registration")).findtext(L("LastUpdateDate")))
+    return values
+
+
+LEI_XPATH = {
+    t: etree.XPath("string(l:%s)" % t, namespaces={"l": LEI})
+    for t in ["LEI"] + LEI_ENTITY + ["LastUpdateDate"]
+}
+LEI_ENTITY_EL = etree.XPath("l:Entity", namespaces={"l": LEI})
+LEI_REGISTRATION = etree.XPath("l:Registration", namespaces={"l": LEI})
+
+
+def lei_xpath(el: Element) -> Values:
+    values: Values = [LEI_XPATH["LEI"](el)]
+    entity = LEI_ENTITY_EL(el)[0]
+    values.extend(LEI_XPATH[tag](entity) for tag in LEI_ENTITY)
+    values.append(LEI_XPATH["LastUpdateDate"](LEI_REGISTRATION(el)[0]))
+    return [str(v) for v in values]
+
+
+def lei_index(el: Element) -> Values:
+    record = TagIndex.children(el)
+    values: Values = [record.findtext(L("LEI"))]
+    entity = TagIndex.children(record.find(L("Entity")))
+    values.extend(entity.findtext(L(tag)) for tag in LEI_ENTITY)
+    registration = TagIndex.children(record.find(L("Registration")))
+    values.append(registration.findtext(L("LastUpdateDate")))
+    return values
+
+
+def load_records(tmp: Path, count: int) -> Dict[str, List[Element]]:
+    GENERATORS["egrul"](tmp / "egrul.zip", count)
+    GENERATORS["gleif_lei"](tmp / "lei.zip", count)
+    companies: List[Element] = []
+    with Archive(tmp / "egrul.zip") as archive:
+        for name in archive.namelist():
+            with archive.open(name) as fh:
+                companies.extend(etree.parse(fh).iter("СвЮЛ"))
+    leis: List[Element] = []
+    with Archive(tmp / "lei.zip") as archive:
+        for name in archive.namelist():
+            if name.endswith(".xml"):
+                with archive.open(name) as fh:
+                    # Keep the records: copies outlive the stream's cleanup.
+                    for el in iter_records(fh, "LEIRecord", LEI):
+                        leis.append(etree.fromstring(etree.tostring(el)))
+    return {"egrul": companies, "lei": leis}
+
+
+@click.command()
+@click.option("-n", "--count", type=int, default=5000)
+@click.option("-r", "--repeat", type=int, default=5)
+def main(count: int, repeat: int):
+    runs: Dict[str, Dict[str, Callable[[Element], Values]]] = {
+        "egrul": {"paths": egrul_paths, "xpath": egrul_xpath, "index": egrul_index},
+        "lei": {"paths": lei_paths, "xpath": lei_xpath, "index": lei_index},
+    }
+    with tempfile.TemporaryDirectory(prefix="bench-tagindex-") as tmp:
+        records = load_records(Path(tmp), count)
+    for dataset, funcs in runs.items():
+        elements = records[dataset]
+        expected = [funcs["paths"](el) for el in elements]
+        for label, func in funcs.items():
+            start = time.perf_counter()
+            for _ in range(repeat):
+                values = [func(el) for el in elements]
+            took = (time.perf_counter() - start) / repeat
+            assert values == expected, "%s %s: values differ" % (dataset, label)
+            print(
+                "%-6s %-6s %7.2f µs/record"
+                % (dataset, label, took * 1e6 / len(elements))
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+"""Memory use of streaming a large XML file of records with `iterparse` and
+`el.clear()` (as the parsers did) and with `common.xmlstream.iter_records`.
+Each mode runs in its own process on the same synthetic file of EDR-style
+`RECORD` elements; RSS is sampled as the records are read."""
+
+import sys
+import time
+import click
+import random
+import tempfile
+import subprocess
+from pathlib import Path
+from xml.sax.saxutils import escape
+from lxml import etree
+
+from benchmarks.generators import RU_WORDS, rnd_name
+from common.instrument import read_rss
+from common.xmlstream import iter_records
+
+SAMPLES = 20
+
+
+def write_records(path: Path, count: int, seed: int = 23) -> None:
+    rnd = random.Random(seed)
+    names = [escape(rnd_name(rnd, RU_WORDS, 3).upper()) for _ in range(1000)]
+    with open(path, "w", encoding="utf-8") as fh:
+        fh.write('<?xml version="1.0" encoding="UTF-8"?>\n<DATA>')
+        for idx in range(count):
+            name = names[idx % len(names)]
+            fh.write(
+                f"<RECORD><NAME>ТОВ {name}</NAME><SHORT_NAME>{name}</SHORT_NAME>"
+                f"<EDRPOU>{idx:08d}</EDRPOU><STAN>зареєстровано</STAN>"
+                f"<FOUNDERS><FOUNDER>{names[idx * 7 % len(names)]}</FOUNDER>"
+                "</FOUNDERS></RECORD>\n"
+            )
+        fh.write("</DATA>")
+
+
+def read(path: Path, mode: str, count: int) -> None:
+    every = max(1, count // SAMPLES)
+    start = time.perf_counter()
+    base = read_rss()
+    peak = base
+    samples = []
+    with open(path, "rb") as fh:
+        if mode == "clear":
+            records = (el for _, el in etree.iterparse(fh, tag="RECORD"))
+        else:
+            records = iter_records(fh, "RECORD")
+        idx = 0
+        for el in records:
+            el.findtext("EDRPOU")
+            if mode == "clear":
+                el.clear()
+            idx += 1
+            if idx % every == 0:
+                rss = read_rss()
+                peak = max(peak, rss)
+                samples.append((rss - base) / 1024**2)
+    seconds = time.perf_counter() - start
+    curve = " ".join("%.0f" % s for s in samples[:: max(1, len(samples) // 5)])
+    print(
+        "%-14s %8.0f records/s  peak +%7.1f MB  (MB over time: %s)"
+        % (mode, idx / seconds, (peak - base) / 1024**2, curve)
+    )
+
+
+@click.command()
+@click.option("-n", "--count", type=int, default=5_000_000)
+@click.option("--mode", type=click.Choice(["clear", "iter_records"]), default=None)
+@click.option("--path", type=click.Path(path_type=Path), default=None)
+def main(count: int, mode: str, path: Path):
+    if mode is not None:
+        read(path, mode, count)
+        return
+    with tempfile.TemporaryDirectory(prefix="bench-xmlstream-") as tmp:
+        path = Path(tmp) / "records.xml"
+        write_records(path, count)
+        print("%d records, %.1f MB" % (count, path.stat().st_size / 1024**2))
+        for mode in ("clear", "iter_records"):
+            cmd = [sys.executable, "-m", "benchmarks.xmlstream", "-n", str(count)]
+            cmd.extend(["--mode", mode, "--path", str(path)])
+            subprocess.run(cmd, check=True)
+
+
+if __name__ == "__main__":
+    main()
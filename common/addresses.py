@@ -0,0 +1,138 @@
+"""Compiled address templates for parsers that format many addresses.
+
+`AddressFormatter.one_line` renders the country's mustache template through
+`chevron` for every address, tokenising the template and the `first`
+sections again each time. An `AddressTemplate` parses the template once into
+literal text, field lookups and `first` alternatives, and renders an address
+by joining those. Formatted addresses are cached by their component tuple,
+since the same address shows up on many records of a register.
+
+`format_addresses` formats a batch of component dicts and only uses module
+state, so it can be handed to the workers of a process pool.
+"""
+
+import re
+from typing import Dict, Iterable, List, Optional, Tuple, Union
+from addressformatting import AddressFormatter
+from addressformatting.util import clean_address
+
+# Number of formatted addresses remembered per template:
+CACHE_SIZE = 100_000
+TOKENS = re.compile(r"\{\{#first\}\}(.*?)\{\{/first\}\}|\{\{\{(\w+)\}\}\}", re.S)
+Part = Union[str, Tuple[str, ...], List["Parts"]]
+Parts = List[Part]
+Components = Dict[str, Optional[str]]
+
+_formatter: Optional[AddressFormatter] = None
+_templates: Dict[str, Optional["AddressTemplate"]] = {}
+
+
+def get_formatter() -> AddressFormatter:
+    global _formatter
+    if _formatter is None:
+        _formatter = AddressFormatter()
+    return _formatter
+
+
+def _parse(template: str) -> Parts:
+    parts: Parts = []
+    pos = 0
+    for match in TOKENS.finditer(template):
+        parts.append(template[pos : match.start()])
+        section, field = match.groups()
+        if field is not None:
+            parts.append((field,))
+        else:
+            alternatives = [_parse(t.strip()) for t in section.split("||")]
+            parts.append(alternatives)
+        pos = match.end()
+    parts.append(template[pos:])
+    parts = [p for p in parts if p != ""]
+    for part in parts:
+        if isinstance(part, str) and ("{{" in part or "}}" in part):
+            raise ValueError("Unsupported address template: %r" % template)
+    return parts
+
+
+def _render(parts: Parts, address: Dict[str, str]) -> str:
+    out: List[str] = []
+    for part in parts:
+        if isinstance(part, str):
+            out.append(part)
+        elif isinstance(part, tuple):
+            out.append(address.get(part[0], ""))
+        else:
+            for alternative in part:
+                text = _render(alternative, address)
+                if text.strip() != "":
+                    out.append(text)
+                    break
+    return "".join(out)
+
+
+class AddressTemplate(object):
+    """The address template of a country, parsed once. `one_line` gives
+    the same result as `AddressFormatter.one_line`."""
+
+    def __init__(self, country: Optional[str] = None) -> None:
+        model = get_formatter().model
+        fmt = model.get(country.upper() if country is not None else "default")
+        fmt = fmt or model["default"]
+        # Some countries use the template of another one, with a fixed
+        # country name:
+        self.country_name: Optional[str] = None
+        while fmt.get("use_country") is not None:
+            self.country_name = fmt.get("change_country", self.country_name)
+            use_country = fmt["use_country"]
+            fmt = model.get(use_country.upper()) or model["default"]
+        self.country = country
+        self.parts = _parse(fmt["address_template"])
+        self.cache: Dict[Tuple[Tuple[str, Optional[str]], ...], str] = {}
+
+    def render(self, address: Components) -> str:
+        cleaned = {k: v for k, v in address.items() if v is not None}
+        if self.country_name is not None:
+            cleaned["country"] = self.country_name
+        line = ", ".join(clean_address(_render(self.parts, cleaned)).split("\n"))
+        return clean_address(line)
+
+    def one_line(self, address: Components) -> str:
+        # Parsers fill in the components in a fixed order, so the items are
+        # used as they are; a different order only costs a cache miss.
+        key = tuple(address.items())
+        line = self.cache.get(key)
+        if line is None:
+            line = self.render(address)
+            if len(self.cache) < CACHE_SIZE:
+                self.cache[key] = line
+        return line
+
+    def __repr__(self) -> str:
+        return "<AddressTemplate(%r)>" % self.country
+
+
+def get_template(country: Optional[str] = None) -> Optional[AddressTemplate]:
+    """The compiled template of a country, or `None` if its template uses
+    more of mustache than `AddressTemplate` supports."""
+    key = country or "default"
+    if key not in _templates:
+        try:
+            _templates[key] = AddressTemplate(country)
+        except ValueError:
+            _templates[key] = None
+    return _templates[key]
+
+
+def format_address(address: Components, country: Optional[str] = None) -> str:
+    """Format an address on one line, like `AddressFormatter.one_line`."""
+    template = get_template(country)
+    if template is None:
+        return get_formatter().one_line(dict(address), country=country)
+    return template.one_line(address)
+
+
+def format_addresses(
+    addresses: Iterable[Components], country: Optional[str] = None
+) -> List[str]:
+    """Format a batch of addresses, e.g. in the worker of a process pool."""
+    return [format_address(address, country=country) for address in addresses]
@@ -0,0 +1,211 @@
+"""Random access to the members of zip and (uncompressed) tar archives.
+
+The member list of an archive is read once, including the position of each
+member's data in the file. Every call to `Archive.open` then returns an
+independent reader, so several members (or the same member twice) can be read
+at the same time, e.g. from a thread pool. Stored (uncompressed) members are
+served straight from a memory map of the archive; compressed ones are read
+through `ZipFile.open`, whose readers keep their own position.
+"""
+
+import io
+import mmap
+import struct
+import tarfile
+import zipfile
+from pathlib import Path
+from threading import Lock
+from typing import BinaryIO, Dict, List, Optional, TextIO
+
+from zavod import PathLike
+
+# Local file header of a zip member (see section 4.3.7 of the zip format
+# specification, APPNOTE.TXT): the data follows the fixed part of the header,
+# the file name and the extra field.
+LOCAL_HEADER = b"PK\x03\x04"
+LOCAL_HEADER_SIZE = 30
+LOCAL_LENGTHS = struct.Struct("<HH")
+LOCAL_LENGTHS_OFFSET = 26
+
+
+class Member(object):
+    """An archive member and the location of its data in the archive file."""
+
+    def __init__(
+        self,
+        name: str,
+        offset: int,
+        size: int,
+        compress_size: int,
+        info: Optional[zipfile.ZipInfo] = None,
+    ) -> None:
+        self.name = name
+        self.offset = offset
+        self.size = size
+        self.compress_size = compress_size
+        self.info = info
+
+    @property
+    def stored(self) -> bool:
+        if self.info is None:
+            return True
+        return self.info.compress_type == zipfile.ZIP_STORED
+
+    def __repr__(self) -> str:
+        return "<Member(%r, %d)>" % (self.name, self.size)
+
+
+class _ViewReader(io.RawIOBase):
+    """Read from a slice of a memory map without copying it first."""
+
+    def __init__(self, view: memoryview) -> None:
+        self.view = view
+        self.pos = 0
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def readinto(self, buffer) -> int:
+        data = self.view[self.pos : self.pos + len(buffer)]
+        size = len(data)
+        buffer[:size] = data
+        self.pos += size
+        return size
+
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        if whence == io.SEEK_CUR:
+            offset += self.pos
+        elif whence == io.SEEK_END:
+            offset += len(self.view)
+        self.pos = max(0, min(offset, len(self.view)))
+        return self.pos
+
+    def tell(self) -> int:
+        return self.pos
+
+    def close(self) -> None:
+        if not self.closed:
+            self.view.release()
+        super().close()
+
+
+def _data_offset(fh: BinaryIO, info: zipfile.ZipInfo) -> int:
+    """Position of the data of a zip member, after its local header. The
+    lengths of the name and extra field can differ from those in the central
+    directory, so they are read from the local header."""
+    fh.seek(info.header_offset)
+    header = fh.read(LOCAL_HEADER_SIZE)
+    if len(header) != LOCAL_HEADER_SIZE or not header.startswith(LOCAL_HEADER):
+        raise zipfile.BadZipFile("Bad local header: %s" % info.filename)
+    name_length, extra_length = LOCAL_LENGTHS.unpack_from(header, LOCAL_LENGTHS_OFFSET)
+    return info.header_offset + LOCAL_HEADER_SIZE + name_length + extra_length
+
+
+def _index_zip(zip: zipfile.ZipFile, fh: BinaryIO) -> List[Member]:
+    members: List[Member] = []
+    for info in zip.infolist():
+        if info.is_dir():
+            continue
+        offset = _data_offset(fh, info)
+        member = Member(info.filename, offset, info.file_size, info.compress_size, info)
+        members.append(member)
+    return members
+
+
+def _index_tar(path: Path) -> List[Member]:
+    members: List[Member] = []
+    try:
+        with tarfile.open(path, "r:") as tar:
+            for info in tar:
+                if info.isfile():
+                    size = info.size
+                    members.append(Member(info.name, info.offset_data, size, size))
+    except tarfile.ReadError as exc:
+        msg = "Not a zip or uncompressed tar file (stream it instead): %s" % path
+        raise ValueError(msg) from exc
+    return members
+
+
+class Archive(object):
+    """Index of the members of a zip or tar file. Readers returned by `open`
+    are independent of each other and can be used concurrently."""
+
+    def __init__(self, path: PathLike) -> None:
+        self.path = Path(path)
+        self.lock = Lock()
+        self.fh: BinaryIO = open(self.path, "rb")
+        self._mmap: Optional[mmap.mmap] = None
+        self.zip: Optional[zipfile.ZipFile] = None
+        try:
+            if zipfile.is_zipfile(self.fh):
+                self.zip = zipfile.ZipFile(self.path, "r")
+                self.members = _index_zip(self.zip, self.fh)
+            else:
+                self.members = _index_tar(self.path)
+        except Exception:
+            self.close()
+            raise
+        self.index: Dict[str, Member] = {m.name: m for m in self.members}
+
+    def namelist(self) -> List[str]:
+        return [m.name for m in self.members]
+
+    def get(self, name: str) -> Member:
+        member = self.index.get(name)
+        if member is None:
+            raise KeyError("No such member in %s: %s" % (self.path, name))
+        return member
+
+    @property
+    def mmap(self) -> mmap.mmap:
+        with self.lock:
+            if self._mmap is None:
+                self._mmap = mmap.mmap(self.fh.fileno(), 0, access=mmap.ACCESS_READ)
+            return self._mmap
+
+    def view(self, name: str) -> memoryview:
+        """The data of a stored member, without copying it."""
+        member = self.get(name)
+        if not member.stored:
+            raise ValueError("Member is compressed: %s" % name)
+        if member.size == 0:
+            return memoryview(b"")
+        view = memoryview(self.mmap)
+        return view[member.offset : member.offset + member.size]
+
+    def open(self, name: str) -> BinaryIO:
+        """Open a member for reading, independently of other readers."""
+        member = self.get(name)
+        if member.stored:
+            return io.BufferedReader(_ViewReader(self.view(name)))
+        assert self.zip is not None and member.info is not None
+        return self.zip.open(member.info)  # type: ignore
+
+    def open_text(self, name: str, encoding: Optional[str] = None) -> TextIO:
+        return io.TextIOWrapper(self.open(name), encoding=encoding)
+
+    def close(self) -> None:
+        with self.lock:
+            if self._mmap is not None:
+                try:
+                    self._mmap.close()
+                except BufferError:
+                    # A reader still holds a view; the map is freed with it.
+                    pass
+                self._mmap = None
+        if self.zip is not None:
+            # Open member readers keep the file open until they are closed:
+            self.zip.close()
+        self.fh.close()
+
+    def __enter__(self) -> "Archive":
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
+
+    def __repr__(self) -> str:
+        return "<Archive(%r, %d members)>" % (str(self.path), len(self.members))
@@ -1,12 +1,26 @@
+import sys
 import gzip
+from weakref import WeakKeyDictionary
 from pathlib import Path
 from pprint import pprint
-from typing import Any, Dict
+from typing import Any, BinaryIO, Dict, Generator, List, Optional
 
 import orjson
 from zavod import Zavod
 from zavod.audit import audit_data
 
+from common import settings
+from common.instrument import track
+from common.ownership import OwnershipIndex
+
+# Fast mode reads statements in batches of roughly this many bytes:
+BATCH_SIZE = 4 * 1024 * 1024
+# ...and checks only every n-th statement for unhandled fields:
+AUDIT_SAMPLE = 1000
+
+# Ownership edges of all the files parsed in a context:
+_ownership: "WeakKeyDictionary[Zavod, OwnershipIndex]" = WeakKeyDictionary()
+
 AUDIT_IGNORE = [
     "isComponent",
     "type",
@@ -54,7 +68,17 @@ SCHEME_PROPS = {
 }
 
 
-def parse_statement(context: Zavod, data: Dict[str, Any]) -> None:
+def parse_statement(
+    context: Zavod,
+    data: Dict[str, Any],
+    audit: bool = True,
+    unknown_schemes: Optional[Dict[str, List[Any]]] = None,
+    ownership: Optional[OwnershipIndex] = None,
+) -> None:
+    """Turn a BODS statement into an entity. If `unknown_schemes` is given,
+    identifiers with an unknown scheme are counted in it (scheme name ->
+    [count, example value]) instead of logging a warning for each. Ownership
+    statements are added to the `ownership` index, if any."""
     statement_type = data.pop("statementType")
     statement_id = data.pop("statementID")
     countries = set()
@@ -134,10 +158,15 @@ def parse_statement(context: Zavod, data: Dict[str, Any]) -> None:
             proxy.add("country", country)
 
     for ident in data.pop("identifiers", []):
-        scheme = ident.pop("schemeName")
+        scheme = sys.intern(ident.pop("schemeName"))
         value = ident.pop("uri", ident.pop("id", None))
         if scheme not in SCHEME_PROPS:
-            context.log.warn("Unknown scheme", scheme=repr(scheme), value=value)
+            if unknown_schemes is None:
+                context.log.warn("Unknown scheme", scheme=repr(scheme), value=value)
+            elif scheme in unknown_schemes:
+                unknown_schemes[scheme][0] += 1
+            else:
+                unknown_schemes[scheme] = [1, value]
             continue
         if value is None:
             context.log.warn("Weird identifier", identifier=ident)
@@ -161,28 +190,76 @@ def parse_statement(context: Zavod, data: Dict[str, Any]) -> None:
     if statement_type in ("personStatement", "entityStatement"):
         proxy.add("country", countries)
 
-    audit_data(data, AUDIT_IGNORE)
+    if audit:
+        audit_data(data, AUDIT_IGNORE)
+
+    if ownership is not None and statement_type == "ownershipOrControlStatement":
+        for owner in proxy.get("owner"):
+            for asset in proxy.get("asset"):
+                ownership.add(owner, asset, statement_id)
 
     context.emit(proxy)
 
 
+def iter_statements(fh: BinaryIO) -> Generator[Dict[str, Any], None, None]:
+    while lines := fh.readlines(BATCH_SIZE):
+        yield from [orjson.loads(line) for line in lines]
+
+
+def ownership_index(context: Zavod) -> OwnershipIndex:
+    """The ownership index of `context`, shared by all the files it parses."""
+    index = _ownership.get(context)
+    if index is None:
+        path = context.get_resource_path(settings.OWNERSHIP_INDEX)
+        index = _ownership[context] = OwnershipIndex(path)
+    return index
+
+
+def parse_statements(
+    context: Zavod, fh: BinaryIO, fast: bool = settings.BODS_FAST
+) -> None:
+    """Parse a BODS JSON lines file. In fast mode, statements are decoded in
+    batches, only a sample of them is audited and unknown identifier schemes
+    are reported once at the end; the emitted entities are the same.
+
+    Ownership edges are collected into an index of the context, which is
+    written to `settings.OWNERSHIP_INDEX` (with the edges of the files parsed
+    before) when the file is done."""
+    ownership = ownership_index(context) if settings.OWNERSHIP_INDEX else None
+    if not fast:
+        for line in track(context, "Statements", fh, source=fh):
+            data = orjson.loads(line)
+            parse_statement(context, data, ownership=ownership)
+    else:
+        unknown_schemes: Dict[str, List[Any]] = {}
+        statements = track(context, "Statements", iter_statements(fh), source=fh)
+        for idx, data in enumerate(statements):
+            parse_statement(
+                context,
+                data,
+                audit=idx % AUDIT_SAMPLE == 0,
+                unknown_schemes=unknown_schemes,
+                ownership=ownership,
+            )
+        for scheme, (count, value) in unknown_schemes.items():
+            context.log.warn(
+                "Unknown scheme", scheme=repr(scheme), value=value, count=count
+            )
+
+    if ownership is not None:
+        ownership.write()
+        context.log.info(
+            "Ownership index: %s" % ownership.path,
+            nodes=ownership.nodes,
+            edges=ownership.edges,
+        )
+
+
 def parse_file_gz(context: Zavod, file_name: Path):
     with gzip.open(file_name) as fh:
-        index = 0
-        while line := fh.readline():
-            data = orjson.loads(line)
-            parse_statement(context, data)
-            index += 1
-            if index > 0 and index % 10000 == 0:
-                context.log.info("Statements: %d..." % index)
+        parse_statements(context, fh)
 
 
 def parse_file(context: Zavod, file_name: Path):
-    with open(file_name) as fh:
-        index = 0
-        while line := fh.readline():
-            data = orjson.loads(line)
-            parse_statement(context, data)
-            index += 1
-            if index > 0 and index % 10000 == 0:
-                context.log.info("Statements: %d..." % index)
+    with open(file_name, "rb") as fh:
+        parse_statements(context, fh)
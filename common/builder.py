@@ -0,0 +1,174 @@
+"""Lightweight entity fragments for hot parser loops.
+
+`CompositeEntity.add` cleans every value and wraps it in a `Statement`, even
+when the value is the same for every row of a dataset. A `FragmentType`
+resolves and cleans a schema's constant properties once, caches the property
+lookup for the dynamic ones, and makes `Fragment` records which only hold
+sets of cleaned values. Fragments can be passed to `context.emit` like
+entities: they serialise to the same fragment JSON as a `CompositeEntity`
+built from the same values.
+"""
+
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple, Union
+from followthemoney import model
+from followthemoney.schema import Schema
+from nomenklatura.dataset import Dataset
+from nomenklatura.publish.names import pick_name
+from nomenklatura.util import string_list
+from followthemoney.util import sanitize_text
+
+# Number of cleaned values remembered per property:
+CACHE_SIZE = 10_000
+Cleaner = Callable[..., Optional[str]]
+Resolved = Tuple[str, Cleaner, Dict[str, Optional[str]]]
+
+
+def _clean(clean_text: Cleaner, value: str) -> Optional[str]:
+    """Sanitise and clean a value, like `EntityProxy.add` does."""
+    text = sanitize_text(value)
+    return clean_text(text) if text is not None else None
+
+
+class FragmentType(object):
+    """A schema bound to a dataset, with pre-cleaned constant values."""
+
+    __slots__ = ("schema", "dataset", "is_thing", "constants", "_props")
+
+    def __init__(
+        self, schema: Union[str, Schema], dataset: Dataset, **constants: Any
+    ) -> None:
+        obj = model.get(schema)
+        if obj is None:
+            raise ValueError("Unknown schema: %s" % schema)
+        self.schema: Schema = obj
+        self.dataset = dataset
+        self.is_thing = obj.is_a("Thing")
+        self._props: Dict[str, Resolved] = {}
+        self.constants: Dict[str, Set[str]] = {}
+        for name, values in constants.items():
+            self.constants[name] = self.clean(name, values)
+
+    def prop(self, name: str) -> Resolved:
+        """Resolve a property name to its qualified name, cleaning function
+        and a cache of cleaned values."""
+        resolved = self._props.get(name)
+        if resolved is None:
+            prop = self.schema.get(name)
+            if prop is None or prop.stub:
+                raise ValueError("Invalid property (%s): %s" % (self.schema, name))
+            resolved = (prop.name, prop.type.clean_text, {})
+            self._props[name] = resolved
+        return resolved
+
+    def clean(self, name: str, values: Any) -> Set[str]:
+        _, clean_text, _ = self.prop(name)
+        cleaned: Set[str] = set()
+        for value in string_list(values):
+            text = _clean(clean_text, value)
+            if text is not None:
+                cleaned.add(text)
+        return cleaned
+
+    def make(self, entity_id: Optional[str] = None) -> "Fragment":
+        fragment = Fragment(self)
+        fragment.id = entity_id
+        return fragment
+
+    def __repr__(self) -> str:
+        return "<FragmentType(%r, %r)>" % (self.schema.name, self.dataset.name)
+
+
+class Fragment(object):
+    """An entity fragment which supports the parts of the `CompositeEntity`
+    interface used by parsers and sinks. Values are cleaned without a proxy,
+    so property types that clean values in the context of the entity (e.g.
+    phone numbers with a country) should not be added this way."""
+
+    __slots__ = ("type", "id", "values")
+
+    def __init__(self, type_: FragmentType) -> None:
+        self.type = type_
+        self.id: Optional[str] = None
+        self.values: Dict[str, Set[str]] = {}
+
+    @property
+    def schema(self) -> Schema:
+        return self.type.schema
+
+    def add(self, prop: str, values: Any) -> None:
+        if values is None:
+            return
+        name, clean_text, cache = self.type.prop(prop)
+        if isinstance(values, str):
+            if values in cache:
+                cleaned = [cache[values]]
+            else:
+                cleaned = [_clean(clean_text, values)]
+                if len(cache) < CACHE_SIZE:
+                    cache[values] = cleaned[0]
+        else:
+            cleaned = [_clean(clean_text, text) for text in string_list(values)]
+        for value in cleaned:
+            if value is not None:
+                existing = self.values.get(name)
+                if existing is None:
+                    existing = self.values[name] = set()
+                existing.add(value)
+
+    def get(self, prop: str, quiet: bool = False) -> List[str]:
+        prop_obj = self.type.schema.get(prop)
+        if prop_obj is None:
+            if quiet:
+                return []
+            raise ValueError("Invalid property (%s): %s" % (self.schema, prop))
+        values = self.values.get(prop_obj.name)
+        constants = self.type.constants.get(prop_obj.name)
+        if constants is not None:
+            values = constants if values is None else constants.union(values)
+        return list(values) if values is not None else []
+
+    @property
+    def properties(self) -> Dict[str, List[str]]:
+        properties = {p: list(v) for p, v in self.type.constants.items() if len(v)}
+        for name, values in self.values.items():
+            constants = self.type.constants.get(name)
+            if constants is not None:
+                values = constants.union(values)
+            properties[name] = list(values)
+        return properties
+
+    @property
+    def caption(self) -> str:
+        for prop in self.type.schema.caption:
+            values = self.get(prop)
+            if self.type.is_thing and len(values) > 1:
+                name = pick_name(values)
+                if name is not None:
+                    return name
+            for value in values:
+                return value
+        return self.type.schema.label
+
+    @property
+    def datasets(self) -> Set[str]:
+        if len(self.values) or any(len(v) for v in self.type.constants.values()):
+            return {self.type.dataset.name}
+        return set()
+
+    @property
+    def referents(self) -> Set[str]:
+        return set()
+
+    def to_dict(self) -> Dict[str, Any]:
+        properties = self.properties
+        return {
+            "id": self.id,
+            "caption": self.caption,
+            "schema": self.type.schema.name,
+            "properties": properties,
+            "referents": [],
+            "datasets": [self.type.dataset.name] if len(properties) else [],
+        }
+
+    def __repr__(self) -> str:
+        return "<Fragment(%r, %r)>" % (self.id, self.type.schema.name)
@@ -1,14 +1,28 @@
-import json
 import yaml
+import orjson
 import requests
-from typing import Optional
+from typing import BinaryIO, Optional
 from datetime import datetime
 from nomenklatura.dataset import DataCatalog
 from nomenklatura.util import PathLike, datetime_iso
 from zavod.dataset import ZavodDataset
 
 
-def build_catalog(catalog_in: PathLike):
+def write_catalog(catalog: DataCatalog, fh: BinaryIO) -> None:
+    """Write the catalog as JSON, serialising one dataset at a time instead of
+    building the full `to_dict()` tree in memory. The output is equivalent to
+    `json.dump(catalog.to_dict(), fh)`."""
+    fh.write(b'{"datasets":[')
+    for idx, dataset in enumerate(catalog.datasets):
+        if idx > 0:
+            fh.write(b",")
+        fh.write(orjson.dumps(dataset.to_dict()))
+    fh.write(b'],"updated_at":')
+    fh.write(orjson.dumps(catalog.updated_at))
+    fh.write(b"}")
+
+
+def build_catalog(catalog_in: PathLike, catalog_out: PathLike = "catalog.json"):
     with open(catalog_in, "r") as fh:
         catalog_in_data = yaml.safe_load(fh)
     catalog = DataCatalog(ZavodDataset, {})
@@ -25,8 +39,8 @@ def build_catalog(catalog_in: PathLike):
         ds = catalog.make_dataset(ds_data)
         print("Dataset: %r" % ds)
 
-    with open("catalog.json", "w") as fh:
-        json.dump(catalog.to_dict(), fh)
+    with open(catalog_out, "wb") as fh:
+        write_catalog(catalog, fh)
 
 
 if __name__ == "__main__":
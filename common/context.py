@@ -0,0 +1,71 @@
+from pathlib import Path
+from typing import Generator, Optional
+from contextlib import contextmanager
+from zavod import Zavod, ZavodDataset, PathLike
+from zavod import init_context as init_zavod_context
+from zavod import settings as zavod_settings
+from zavod.sinks.common import Sink
+
+from common import settings
+from common.sinks import AggregatingSink, make_sink
+from common.instrument import RECORDER, InstrumentedSink, profile
+from common.identifiers import IdentifierSink
+from common.countries import install as install_countries
+
+
+@contextmanager
+def init_context(
+    metadata_path: PathLike,
+    verbose: bool = False,
+    data_path: Path = zavod_settings.DATA_PATH,
+    out_file: PathLike = settings.FRAGMENTS,
+) -> Generator[Zavod, None, None]:
+    """Create a zavod context which writes fragments in the format configured
+    for the graph pipeline (see `common.settings.FRAGMENTS`). The run is
+    instrumented and its report is written to `common.settings.RUN_REPORT`.
+    Identifiers of the emitted entities are indexed for cross-dataset joins
+    (see `common.identifiers`), and country values are cleaned through the
+    precomputed table in `common.countries`. With `AGGREGATE_LIMIT`, small
+    runs write their export directly (see `common.sinks.AggregatingSink`).
+    A failed run writes neither the export nor the identifier index."""
+    if settings.COUNTRY_TABLE:
+        install_countries()
+    sink: Sink = make_sink(data_path.joinpath(out_file))
+    aggregator: Optional[AggregatingSink] = None
+    if settings.AGGREGATE_LIMIT > 0:
+        export_path = data_path.joinpath(settings.AGGREGATE_EXPORT)
+        dataset = ZavodDataset.from_path(metadata_path)
+        aggregator = AggregatingSink(
+            sink, export_path, settings.AGGREGATE_LIMIT, dataset
+        )
+        sink = aggregator
+    sink = InstrumentedSink(sink)
+    identifiers: Optional[IdentifierSink] = None
+    if settings.IDENTIFIER_INDEX:
+        index_path = data_path.joinpath(settings.IDENTIFIER_INDEX)
+        sink = identifiers = IdentifierSink(sink, index_path)
+    with init_zavod_context(
+        metadata_path,
+        verbose=verbose,
+        data_path=data_path,
+        sink=sink,
+    ) as context:
+        RECORDER.start(context.dataset.name)
+        try:
+            with profile(settings.PROFILE, data_path):
+                yield context
+        except BaseException:
+            # A partial run must not leave an export or index that looks
+            # complete:
+            if aggregator is not None:
+                aggregator.discard()
+            if identifiers is not None:
+                identifiers.discard()
+            raise
+        finally:
+            RECORDER.stop()
+            # Flush the fragments first so their size makes it into the report:
+            sink.close()
+            report = data_path.joinpath(settings.RUN_REPORT)
+            RECORDER.write(report)
+            context.log.info("Run report: %s" % report)
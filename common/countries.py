@@ -0,0 +1,136 @@
+"""Precomputed country table shared by all parsers.
+
+Cleaning a country value through the followthemoney registry sanitises the
+text, transliterates it and looks it up in `countrynames` for every value.
+The table in `countries.json` maps country names, codes and values observed
+in our sources to the code the registry returns for them (or `null` if it
+does not recognise them). It is loaded once as a read-only mapping and
+checked before the registry is asked; `install` puts that fast path in front
+of `registry.country.clean_text`, which `proxy.add` uses for the `country`,
+`jurisdiction` and `nationality` properties of every schema.
+
+Keys are upper-cased and stripped, which `countrynames` does first thing
+anyway, so the result does not depend on case or surrounding whitespace.
+"""
+
+import click
+import orjson
+from pathlib import Path
+from types import MappingProxyType
+from typing import Any, Callable, Dict, Iterable, Mapping, Optional
+from countrynames.data import DATA
+from followthemoney.types import registry
+from followthemoney.util import sanitize_text
+
+TABLE_PATH = Path(__file__).parent / "countries.json"
+# Number of distinct values whose result is remembered as they were given:
+CACHE_SIZE = 100_000
+MISSING = object()
+
+_clean_text: Callable[..., Optional[str]] = registry.country.clean_text
+_clean: Callable[..., Optional[str]] = registry.country.clean
+_cache: Dict[str, Optional[str]] = {}
+_raw_cache: Dict[str, Optional[str]] = {}
+
+
+def country_key(text: str) -> str:
+    return text.upper().strip()
+
+
+def load_table(path: Path = TABLE_PATH) -> Mapping[str, Optional[str]]:
+    if not path.exists():
+        return MappingProxyType({})
+    with open(path, "rb") as fh:
+        return MappingProxyType(orjson.loads(fh.read()))
+
+
+COUNTRIES = load_table()
+
+
+def clean_country_text(
+    text: str,
+    fuzzy: bool = False,
+    format: Optional[str] = None,
+    proxy: Any = None,
+) -> Optional[str]:
+    """Same result as `registry.country.clean_text`, from the table when the
+    value is in it."""
+    if fuzzy:
+        return _clean_text(text, fuzzy=fuzzy)
+    code = _cache.get(text, MISSING)
+    if code is MISSING:
+        key = country_key(text)
+        code = COUNTRIES.get(key, MISSING)
+        if code is MISSING:
+            code = _clean_text(key)
+        if len(_cache) < CACHE_SIZE:
+            _cache[text] = code  # type: ignore
+    return code  # type: ignore
+
+
+def clean_country(
+    raw: Any,
+    fuzzy: bool = False,
+    format: Optional[str] = None,
+    proxy: Any = None,
+) -> Optional[str]:
+    """Same result as `registry.country.clean`. Printable ASCII text is
+    left as it is by `sanitize_text`, so it goes to the table directly."""
+    if type(raw) is str:
+        if raw.isascii() and raw.isprintable():
+            return clean_country_text(raw, fuzzy=fuzzy)
+        if not fuzzy:
+            code = _raw_cache.get(raw, MISSING)
+            if code is MISSING:
+                text = sanitize_text(raw)
+                code = None if text is None else clean_country_text(text)
+                if len(_raw_cache) < CACHE_SIZE:
+                    _raw_cache[raw] = code  # type: ignore
+            return code  # type: ignore
+    text = sanitize_text(raw)
+    if text is None:
+        return None
+    return clean_country_text(text, fuzzy=fuzzy)
+
+
+def install() -> None:
+    """Check the table before the registry wherever country values are
+    cleaned, including in `proxy.add`."""
+    registry.country.clean_text = clean_country_text  # type: ignore
+    registry.country.clean = clean_country  # type: ignore
+
+
+def build_table(observed: Iterable[str] = ()) -> Dict[str, Optional[str]]:
+    """Resolve the names known to `countrynames`, the registry's labels and
+    codes, the values already in the table and any `observed` values through
+    the registry."""
+    values = set(observed)
+    values.update(COUNTRIES.keys())
+    for code, names in DATA.items():
+        values.add(code)
+        values.update(names)
+    for code, label in registry.country.names.items():
+        values.update((code, label))
+    table: Dict[str, Optional[str]] = {}
+    for value in values:
+        value = value.strip()
+        if len(value):
+            key = country_key(value)
+            table[key] = _clean_text(key)
+    return table
+
+
+@click.command(help="Rebuild the country table, adding observed values")
+@click.argument("observed", nargs=-1, type=click.File("r", encoding="utf-8"))
+@click.option("-o", "--outfile", type=click.Path(path_type=Path), default=TABLE_PATH)
+def build(observed, outfile: Path) -> None:
+    values = [line.rstrip("\n") for fh in observed for line in fh]
+    table = build_table(values)
+    with open(outfile, "wb") as fh:
+        fh.write(orjson.dumps(table, option=orjson.OPT_SORT_KEYS))
+    resolved = sum(1 for v in table.values() if v is not None)
+    print(f"{len(table)} values ({resolved} resolved): {outfile}")
+
+
+if __name__ == "__main__":
+    build()
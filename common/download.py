@@ -0,0 +1,303 @@
+"""Resumable, segmented downloads of large source files.
+
+A download is written to `<path>.part`, next to a `<path>.part.json` file
+which records the byte ranges that have been written. When the transfer
+fails, it is retried from where it stopped with an HTTP `Range` request
+(guarded by `If-Range`, so a file that changed upstream is fetched again
+from the start), and the same happens when a crawler is restarted after it
+was interrupted. Servers that accept ranges get large files in several
+segments over parallel connections. The finished file is checked against
+the expected size and, if given, a `sha256:…`/`md5:…` checksum before it is
+renamed into place. A download can be stopped from another thread through an
+`Event`; its partial file is kept, to be resumed later.
+"""
+
+import time
+import click
+import orjson
+import hashlib
+from pathlib import Path
+from threading import Event, Lock
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional
+from requests import RequestException, Session
+from zavod import Zavod
+from zavod.logs import configure_logging, get_logger
+
+from common import settings
+
+log = get_logger("download")
+CHUNK_SIZE = 1024 * 1024
+# Interval (in bytes) at which the progress of a segment is saved:
+SAVE_EVERY = 64 * 1024 * 1024
+
+
+class DownloadError(Exception):
+    pass
+
+
+class DownloadStopped(Exception):
+    """The download was stopped through its `stop` event."""
+
+
+class _RangeIgnored(Exception):
+    """The server answered a range request with the full file."""
+
+
+class _State(object):
+    """Byte ranges of a partial download, saved next to the `.part` file."""
+
+    def __init__(self, path: Path, url: str) -> None:
+        self.path = path.with_name(path.name + ".part.json")
+        self.url = url
+        self.size: Optional[int] = None
+        self.validator: Optional[str] = None
+        # [start, end, position] of each segment, `end` exclusive:
+        self.segments: List[List[int]] = []
+        self.lock = Lock()
+
+    def load(self) -> bool:
+        if not self.path.exists():
+            return False
+        data = orjson.loads(self.path.read_bytes())
+        if data.get("url") != self.url:
+            return False
+        self.size = data.get("size")
+        self.validator = data.get("validator")
+        self.segments = data.get("segments", [])
+        return True
+
+    def save(self) -> None:
+        data = {
+            "url": self.url,
+            "size": self.size,
+            "validator": self.validator,
+            "segments": self.segments,
+        }
+        with self.lock:
+            self.path.write_bytes(orjson.dumps(data))
+
+    @property
+    def done(self) -> int:
+        return sum(pos - start for start, _, pos in self.segments)
+
+
+def _probe(session: Session, url: str, headers: Dict[str, str]) -> Dict[str, Any]:
+    """Find the size of a file, whether ranges can be used to fetch it and
+    the validator (`ETag` or `Last-Modified`) to use them with."""
+    headers = dict(headers, Range="bytes=0-0")
+    with session.get(url, headers=headers, stream=True, timeout=60) as res:
+        res.raise_for_status()
+        validator = res.headers.get("ETag") or res.headers.get("Last-Modified")
+        if validator is not None and validator.startswith("W/"):
+            # Weak validators can't be used with `If-Range`:
+            validator = None
+        content_range = res.headers.get("Content-Range", "")
+        if res.status_code == 206 and "/" in content_range:
+            total = content_range.rsplit("/", 1)[-1]
+            if total.isdigit():
+                return {"size": int(total), "ranges": True, "validator": validator}
+        length = res.headers.get("Content-Length")
+        size = int(length) if length is not None and length.isdigit() else None
+        return {"size": size, "ranges": False, "validator": validator}
+
+
+def _plan(size: int, segments: int) -> List[List[int]]:
+    if size == 0:
+        return [[0, 0, 0]]
+    count = max(1, min(segments, size // settings.DOWNLOAD_SEGMENT_SIZE))
+    step = -(-size // count)
+    return [[s, min(s + step, size), s] for s in range(0, size, step)]
+
+
+def _check(stop: Optional[Event]) -> None:
+    if stop is not None and stop.is_set():
+        raise DownloadStopped()
+
+
+def _fetch_segment(
+    session: Session,
+    url: str,
+    part: Path,
+    state: _State,
+    segment: List[int],
+    headers: Dict[str, str],
+    stop: Optional[Event] = None,
+) -> None:
+    start, end, pos = segment
+    if pos >= end:
+        return
+    headers = dict(headers, Range=f"bytes={pos}-{end - 1}")
+    if state.validator is not None:
+        headers["If-Range"] = state.validator
+    with session.get(url, headers=headers, stream=True, timeout=60) as res:
+        res.raise_for_status()
+        if res.status_code != 206:
+            raise _RangeIgnored()
+        with open(part, "r+b") as fh:
+            fh.seek(pos)
+            saved = pos
+            for chunk in res.iter_content(chunk_size=CHUNK_SIZE):
+                _check(stop)
+                fh.write(chunk[: end - segment[2]])
+                segment[2] = min(segment[2] + len(chunk), end)
+                if segment[2] - saved >= SAVE_EVERY:
+                    fh.flush()
+                    state.save()
+                    saved = segment[2]
+    if segment[2] < end:
+        msg = "Segment ended early: %s (%d < %d)" % (url, segment[2], end)
+        raise DownloadError(msg)
+
+
+def _fetch_stream(
+    session: Session,
+    url: str,
+    part: Path,
+    state: _State,
+    headers: Dict[str, str],
+    stop: Optional[Event] = None,
+) -> None:
+    """Fetch a file from a server which does not support ranges."""
+    with session.get(url, headers=headers, stream=True, timeout=60) as res:
+        res.raise_for_status()
+        with open(part, "wb") as fh:
+            for chunk in res.iter_content(chunk_size=CHUNK_SIZE):
+                _check(stop)
+                fh.write(chunk)
+    size = part.stat().st_size
+    state.size = state.size or size
+    state.segments = [[0, size, size]]
+
+
+def verify(path: Path, checksum: Optional[str]) -> None:
+    if checksum is None:
+        return
+    algorithm, _, expected = checksum.partition(":")
+    hash = hashlib.new(algorithm)
+    with open(path, "rb") as fh:
+        while chunk := fh.read(CHUNK_SIZE):
+            hash.update(chunk)
+    digest = hash.hexdigest()
+    if digest.lower() != expected.lower():
+        msg = "Checksum mismatch: %s (%s != %s)" % (path, digest, expected)
+        raise DownloadError(msg)
+
+
+def download(
+    session: Session,
+    url: str,
+    path: Path,
+    checksum: Optional[str] = None,
+    segments: int = settings.DOWNLOAD_SEGMENTS,
+    retries: int = settings.DOWNLOAD_RETRIES,
+    headers: Optional[Dict[str, str]] = None,
+    stop: Optional[Event] = None,
+) -> Path:
+    """Download `url` to `path`, unless the file is already there. Raises
+    `DownloadStopped` soon after `stop` is set."""
+    if path.exists():
+        return path
+    path.parent.mkdir(parents=True, exist_ok=True)
+    part = path.with_name(path.name + ".part")
+    state = _State(path, url)
+    # Ranges refer to the bytes of the file, not of a compressed response:
+    headers = dict(headers or {}, **{"Accept-Encoding": "identity"})
+    for attempt in range(retries + 1):
+        _check(stop)
+        try:
+            if not part.exists() or not state.load() or state.size is None:
+                probe = _probe(session, url, headers)
+                state.size = probe["size"]
+                state.validator = probe["validator"]
+                state.segments = []
+                if probe["ranges"] and state.size is not None:
+                    state.segments = _plan(state.size, segments)
+                    with open(part, "wb") as fh:
+                        fh.truncate(state.size)
+                state.save()
+            if len(state.segments):
+                log.info(
+                    "Fetching file",
+                    url=url,
+                    done=state.done,
+                    size=state.size,
+                    segments=len(state.segments),
+                )
+                with ThreadPoolExecutor(max_workers=len(state.segments)) as pool:
+                    futures = [
+                        pool.submit(
+                            _fetch_segment, session, url, part, state, s, headers, stop
+                        )
+                        for s in state.segments
+                    ]
+                    for future in futures:
+                        future.result()
+            else:
+                log.info("Fetching file (no range support)", url=url)
+                _fetch_stream(session, url, part, state, headers, stop)
+            break
+        except _RangeIgnored:
+            log.warning("Server ignored the range request, restarting", url=url)
+            part.unlink(missing_ok=True)
+        except (RequestException, DownloadError) as exc:
+            if attempt == retries:
+                raise DownloadError("Download failed: %s (%s)" % (url, exc)) from exc
+            log.warning("Download interrupted, resuming", url=url, error=str(exc))
+            if stop is not None:
+                stop.wait(min(2**attempt, 60))
+            else:
+                time.sleep(min(2**attempt, 60))
+        finally:
+            if part.exists() and state.size is not None:
+                state.save()
+    else:
+        raise DownloadError("Download failed: %s" % url)
+    if state.size is not None and part.stat().st_size != state.size:
+        part.unlink()
+        state.path.unlink(missing_ok=True)
+        raise DownloadError("Size mismatch: %s" % url)
+    try:
+        verify(part, checksum)
+    except DownloadError:
+        part.unlink()
+        state.path.unlink(missing_ok=True)
+        raise
+    part.replace(path)
+    state.path.unlink(missing_ok=True)
+    return path
+
+
+def fetch_resource(
+    context: Zavod,
+    name: str,
+    url: str,
+    checksum: Optional[str] = None,
+    stop: Optional[Event] = None,
+) -> Path:
+    """Like `context.fetch_resource`, but resumable (see `download`)."""
+    path = context.get_resource_path(name)
+    return download(context.http, url, path, checksum=checksum, stop=stop)
+
+
+def resource_size(context: Zavod, name: str, url: str) -> Optional[int]:
+    """The size of a resource once it is downloaded: that of the file if it is
+    there, else the size reported by the server (`None` if unknown)."""
+    path = context.get_resource_path(name)
+    if path.exists():
+        return path.stat().st_size
+    return _probe(context.http, url, {"Accept-Encoding": "identity"})["size"]
+
+
+@click.command(help="Download a file, resuming a previous partial download")
+@click.argument("url")
+@click.argument("path", type=click.Path(path_type=Path))
+@click.option("-c", "--checksum", help="Expected digest, e.g. sha256:...")
+@click.option("-s", "--segments", type=int, default=settings.DOWNLOAD_SEGMENTS)
+def main(url: str, path: Path, checksum: Optional[str], segments: int) -> None:
+    configure_logging()
+    download(Session(), url, path, checksum=checksum, segments=segments)
+
+
+if __name__ == "__main__":
+    main()
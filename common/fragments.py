@@ -0,0 +1,288 @@
+import io
+import os
+import sys
+import zlib
+import click
+import heapq
+import orjson
+import msgpack
+import tempfile
+import zstandard
+from pathlib import Path
+from operator import itemgetter
+from contextlib import contextmanager, ExitStack
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, BinaryIO, Dict, Generator, Iterable, List, Optional, Tuple
+from followthemoney import model
+from followthemoney.cli.util import write_entity
+from nomenklatura.entity import CompositeEntity
+
+from common import settings
+
+
+def dict_path(path: Path) -> Path:
+    """Location of the zstd dictionary trained for a fragment file."""
+    return path.with_name(path.name + ".dict")
+
+
+def is_zstd(path: Path) -> bool:
+    return path.suffix == ".zst"
+
+
+def is_msgpack(path: Path) -> bool:
+    """Binary fragment files hold one msgpack record per fragment instead of
+    a JSON line, e.g. `fragments.msgpack` or `fragments.msgpack.zst`."""
+    return ".msgpack" in path.suffixes
+
+
+def shard_of(entity_id: str, shards: int) -> int:
+    """The shard of an entity, stable across processes and runs."""
+    return zlib.crc32(entity_id.encode("utf-8")) % shards
+
+
+def _split_name(path: Path) -> Tuple[str, str]:
+    name, dot, suffixes = path.name.partition(".")
+    return name, dot + suffixes
+
+
+# Shard numbers are written with two digits:
+MAX_SHARDS = 100
+
+
+def shard_path(path: Path, shard: int) -> Path:
+    """Location of one shard of a fragment file, e.g. `fragments-03.json.zst`
+    for `fragments.json.zst`."""
+    name, suffixes = _split_name(path)
+    return path.with_name(f"{name}-{shard:02d}{suffixes}")
+
+
+def shard_paths(path: Path) -> List[Path]:
+    """The shards written for a fragment file, in order."""
+    name, suffixes = _split_name(path)
+    return sorted(path.parent.glob(f"{name}-[0-9][0-9]{suffixes}"))
+
+
+def load_dict(path: Path) -> Optional[zstandard.ZstdCompressionDict]:
+    dpath = dict_path(path)
+    if not dpath.exists():
+        return None
+    return zstandard.ZstdCompressionDict(dpath.read_bytes())
+
+
+@contextmanager
+def open_reader(path: Path) -> Generator[BinaryIO, None, None]:
+    """Open a fragment file for binary reading, decompressing zstd files
+    (using the trained dictionary, if one was stored alongside)."""
+    if str(path) == "-":
+        yield sys.stdin.buffer
+        return
+    with open(path, "rb") as fh:
+        if not is_zstd(path):
+            yield fh
+            return
+        dctx = zstandard.ZstdDecompressor(dict_data=load_dict(path))
+        with dctx.stream_reader(fh, read_size=1024 * 1024) as reader:
+            yield reader
+
+
+@contextmanager
+def open_writer(path: Path) -> Generator[BinaryIO, None, None]:
+    if str(path) == "-":
+        yield sys.stdout.buffer
+        return
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, "wb") as fh:
+        if not is_zstd(path):
+            yield fh
+            return
+        cctx = zstandard.ZstdCompressor(level=settings.ZSTD_LEVEL, threads=-1)
+        with cctx.stream_writer(fh, closefd=False) as writer:
+            yield writer
+
+
+def iter_lines(path: Path) -> Generator[bytes, None, None]:
+    with open_reader(path) as fh:
+        if is_zstd(path):
+            # zstd stream readers do not support readline():
+            fh = io.BufferedReader(fh, buffer_size=1024 * 1024)  # type: ignore
+        yield from fh
+
+
+def pack_entity(entity: CompositeEntity) -> bytes:
+    record = [
+        entity.id,
+        entity.schema.name,
+        entity.properties,
+        list(entity.datasets),
+        list(entity.referents),
+    ]
+    return msgpack.packb(record)
+
+
+def write_record(fh: BinaryIO, record: Dict[str, Any], binary: bool) -> None:
+    if binary:
+        keys = ("id", "schema", "properties", "datasets", "referents")
+        fh.write(msgpack.packb([record.get(k) for k in keys]))
+    else:
+        fh.write(orjson.dumps(record, option=orjson.OPT_APPEND_NEWLINE))
+
+
+def iter_records(path: Path) -> Generator[Dict[str, Any], None, None]:
+    """Read fragments as plain dicts, in the shape of `CompositeEntity.to_dict`
+    (the caption is only present for JSON input)."""
+    if not is_msgpack(path):
+        for line in iter_lines(path):
+            yield orjson.loads(line)
+        return
+    with open_reader(path) as fh:
+        unpacker = msgpack.Unpacker(fh, raw=False, max_buffer_size=0)
+        for entity_id, schema, properties, datasets, referents in unpacker:
+            yield {
+                "id": entity_id,
+                "schema": schema,
+                "properties": properties,
+                "datasets": datasets,
+                "referents": referents,
+            }
+
+
+def iter_entities(path: Path) -> Generator[CompositeEntity, None, None]:
+    for data in iter_records(path):
+        yield CompositeEntity.from_dict(model, data)
+
+
+def _write_run(records: List[Dict[str, Any]], directory: str) -> Path:
+    records.sort(key=itemgetter("id"))
+    fh = tempfile.NamedTemporaryFile(dir=directory, suffix=".msgpack", delete=False)
+    with fh:
+        for record in records:
+            write_record(fh, record, True)  # type: ignore
+    return Path(fh.name)
+
+
+def external_sort(in_path: Path, out_path: Path, buffer: int = 1_000_000) -> None:
+    """Sort fragments by entity ID: sorted runs of `buffer` records are spilled
+    to msgpack temp files and then merged. Unlike `sort(1)` this does not
+    need a text format, so binary fragments never get converted to JSON."""
+    binary = is_msgpack(out_path)
+    out_path.parent.mkdir(parents=True, exist_ok=True)
+    with tempfile.TemporaryDirectory(dir=out_path.parent) as tmp:
+        runs: List[Path] = []
+        records: List[Dict[str, Any]] = []
+        for record in iter_records(in_path):
+            record.pop("caption", None)
+            records.append(record)
+            if len(records) >= buffer:
+                runs.append(_write_run(records, tmp))
+                records = []
+        records.sort(key=itemgetter("id"))
+        with ExitStack() as stack, open_writer(out_path) as outfh:
+            iters: List[Iterable[Dict[str, Any]]] = [records]
+            for run in runs:
+                iters.append(stack.enter_context(_closing(iter_records(run))))
+            for record in heapq.merge(*iters, key=itemgetter("id")):
+                write_record(outfh, record, binary)
+
+
+@contextmanager
+def _closing(gen: Generator[Any, None, None]) -> Generator[Any, None, None]:
+    try:
+        yield gen
+    finally:
+        gen.close()
+
+
+def sorted_aggregate(in_path: Path, out_path: Path) -> None:
+    """Merge fragments from a file sorted by entity ID, as `nk sorted-aggregate`
+    does, but reading and writing compressed fragment files as well."""
+    entity: Optional[CompositeEntity] = None
+    with open_writer(out_path) as outfh:
+        for next_entity in iter_entities(in_path):
+            if entity is None:
+                entity = next_entity
+                continue
+            if next_entity.id == entity.id:
+                entity = entity.merge(next_entity)
+                continue
+            write_entity(outfh, entity)
+            entity = next_entity
+
+        if entity is not None:
+            write_entity(outfh, entity)
+
+
+def _aggregate_shard(in_path: Path, out_path: Path) -> Path:
+    sorted_path = out_path.with_name(out_path.name + ".sorted.msgpack")
+    external_sort(in_path, sorted_path)
+    sorted_aggregate(sorted_path, out_path)
+    sorted_path.unlink()
+    return out_path
+
+
+def aggregate_shards(
+    in_paths: List[Path], out_path: Path, workers: Optional[int] = None
+) -> None:
+    """Sort and aggregate each shard of a fragment file in its own process,
+    then concatenate the entities. Shards never share an entity ID, so the
+    result holds the same entities as aggregating all fragments at once
+    (ordered by shard, then by ID)."""
+    out_path.parent.mkdir(parents=True, exist_ok=True)
+    with tempfile.TemporaryDirectory(dir=out_path.parent) as tmp:
+        parts = [Path(tmp) / f"part-{i:02d}.json" for i in range(len(in_paths))]
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            done = list(executor.map(_aggregate_shard, in_paths, parts))
+        with open_writer(out_path) as outfh:
+            for part in done:
+                with open(part, "rb") as fh:
+                    while chunk := fh.read(1024 * 1024):
+                        outfh.write(chunk)
+                part.unlink()
+
+
+@click.group(help="Read, write and aggregate entity fragment files")
+def cli() -> None:
+    pass
+
+
+@cli.command("cat", help="Write the (decompressed) fragments to stdout")
+@click.argument("path", type=click.Path(exists=True, path_type=Path))
+def cat(path: Path) -> None:
+    with open_reader(path) as fh:
+        while chunk := fh.read(1024 * 1024):
+            sys.stdout.buffer.write(chunk)
+
+
+@cli.command("write", help="Write fragments from stdin to a (compressed) file")
+@click.argument("path", type=click.Path(path_type=Path))
+def write(path: Path) -> None:
+    with open_writer(path) as fh:
+        while chunk := sys.stdin.buffer.read(1024 * 1024):
+            fh.write(chunk)
+
+
+@cli.command("sort", help="Sort fragments by entity ID")
+@click.option("-i", "--infile", type=click.Path(path_type=Path), required=True)
+@click.option("-o", "--outfile", type=click.Path(path_type=Path), required=True)
+@click.option("-b", "--buffer", type=int, default=1_000_000, show_default=True)
+def sort(infile: Path, outfile: Path, buffer: int) -> None:
+    external_sort(infile, outfile, buffer=buffer)
+
+
+@cli.command("aggregate", help="Merge sorted fragments into entities")
+@click.option("-i", "--infile", type=click.Path(path_type=Path), default="-")
+@click.option("-o", "--outfile", type=click.Path(path_type=Path), default="-")
+def aggregate(infile: Path, outfile: Path) -> None:
+    sorted_aggregate(infile, outfile)
+
+
+@cli.command("aggregate-shards", help="Sort and aggregate shards in parallel")
+@click.argument("path", type=click.Path(path_type=Path))
+@click.option("-o", "--outfile", type=click.Path(path_type=Path), required=True)
+@click.option("-j", "--jobs", type=int, default=os.cpu_count(), show_default=True)
+def aggregate_shards_(path: Path, outfile: Path, jobs: int) -> None:
+    in_paths = shard_paths(path) or [path]
+    aggregate_shards(in_paths, outfile, workers=jobs)
+
+
+if __name__ == "__main__":
+    cli()
@@ -0,0 +1,289 @@
+"""Index of registration numbers, LEIs, OpenCorporates URLs and INNs, for
+linking entities across datasets without an all-pairs matching run.
+
+Every parser run writes a sorted file of `key<TAB>entity_id` lines (see
+`common.settings.IDENTIFIER_INDEX`), where the key is a normalised
+identifier such as `lei:529900T8BM49AURSDO55`, `inn:7707083893`,
+`oc:gb/00102498` or `reg:cz:00177041`. Because the files are sorted, a
+single file can be searched in place through `mmap`, and the files of all
+datasets in the graph can be joined in one merge pass.
+"""
+
+import os
+import re
+import mmap
+import heapq
+import click
+import orjson
+import tempfile
+from pathlib import Path
+from contextlib import ExitStack
+from typing import BinaryIO, Generator, Iterable, List, Optional, Set, Tuple
+from nomenklatura.entity import CE
+from nomenklatura.judgement import Judgement
+from nomenklatura.resolver import Resolver
+from zavod.sinks.common import Sink
+
+# Number of identifier lines held in memory before a sorted run is spilled:
+BUFFER = 1_000_000
+OC_URL = re.compile(r"opencorporates\.com/companies/([a-z_]+)/([^/?#]+)", re.I)
+OC_ID = "oc-companies-"
+LEI_ID = "lei-"
+WS = re.compile(r"\s+")
+DIGITS = re.compile(r"\D+")
+# Keys that identify an entity on their own. Entities that share another key
+# (e.g. a registration number with only a country) are merge candidates:
+POSITIVE_KEYS = ("lei:", "oc:", "inn:")
+CANDIDATE_SCORE = 0.7
+
+
+def _norm(text: str) -> str:
+    return WS.sub("", text).casefold()
+
+
+def _oc_keys(jurisdiction: str, number: str) -> List[str]:
+    jurisdiction, number = _norm(jurisdiction), _norm(number)
+    if not len(jurisdiction) or not len(number):
+        return []
+    keys = [f"oc:{jurisdiction}/{number}"]
+    country = jurisdiction.split("_", 1)[0]
+    keys.append(f"reg:{country}:{number}")
+    return keys
+
+
+def identifier_keys(entity: CE) -> Set[str]:
+    """Normalised identifier keys of an entity. Registration numbers are only
+    used together with a jurisdiction (or a single country), since bare
+    numbers collide across registers."""
+    keys: Set[str] = set()
+    entity_id = entity.id or ""
+    if entity_id.startswith(OC_ID):
+        jurisdiction, _, number = entity_id[len(OC_ID) :].partition("-")
+        keys.update(_oc_keys(jurisdiction, number))
+    elif entity_id.startswith(LEI_ID) and len(entity_id) == len(LEI_ID) + 20:
+        keys.add(f"lei:{_norm(entity_id[len(LEI_ID):])}")
+    for url in entity.get("opencorporatesUrl", quiet=True):
+        match = OC_URL.search(url)
+        if match is not None:
+            keys.update(_oc_keys(match.group(1), match.group(2)))
+    for lei in entity.get("leiCode", quiet=True):
+        keys.add(f"lei:{_norm(lei)}")
+    for prop in ("innCode", "ogrnCode"):
+        for code in entity.get(prop, quiet=True):
+            digits = DIGITS.sub("", code)
+            if len(digits):
+                keys.add(f"{prop[:-4]}:{digits}")
+    reg_nrs = entity.get("registrationNumber", quiet=True)
+    if len(reg_nrs):
+        countries = entity.get("jurisdiction", quiet=True)
+        if not len(countries):
+            countries = entity.get("country", quiet=True)
+            countries = countries if len(countries) == 1 else []
+        for country in countries:
+            for reg_nr in reg_nrs:
+                reg_nr = _norm(reg_nr)
+                if len(reg_nr):
+                    keys.add(f"reg:{country}:{reg_nr}")
+    return keys
+
+
+def _write_run(lines: List[bytes], directory: str) -> Path:
+    lines.sort()
+    with tempfile.NamedTemporaryFile(dir=directory, delete=False) as fh:
+        fh.writelines(lines)
+    return Path(fh.name)
+
+
+def _unique(lines: Iterable[bytes]) -> Generator[bytes, None, None]:
+    prev: Optional[bytes] = None
+    for line in lines:
+        if line != prev:
+            yield line
+        prev = line
+
+
+class IdentifierSink(Sink[CE]):
+    """Wrap a sink to collect the identifier keys of all emitted entities.
+    The sorted index is written to `index_path` when the sink is closed,
+    unless the run was discarded."""
+
+    def __init__(self, sink: Sink[CE], index_path: Path, buffer: int = BUFFER):
+        super().__init__(sink.path)
+        self.sink = sink
+        self.index_path = index_path
+        self.buffer = buffer
+        self.lines: List[bytes] = []
+        self.runs: List[Path] = []
+        self.tmp: Optional[tempfile.TemporaryDirectory] = None
+        self.closed = False
+
+    def emit(self, entity: CE) -> None:
+        self.sink.emit(entity)
+        if entity.id is None:
+            return
+        for key in identifier_keys(entity):
+            self.lines.append(f"{key}\t{entity.id}\n".encode("utf-8"))
+        if len(self.lines) >= self.buffer:
+            if self.tmp is None:
+                self.index_path.parent.mkdir(parents=True, exist_ok=True)
+                self.tmp = tempfile.TemporaryDirectory(dir=self.index_path.parent)
+            self.runs.append(_write_run(self.lines, self.tmp.name))
+            self.lines = []
+
+    def close(self) -> None:
+        self.sink.close()
+        # zavod closes the sink again when the context exits:
+        if self.closed:
+            return
+        self.closed = True
+        self.lines.sort()
+        self.index_path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.index_path.with_name(self.index_path.name + ".tmp")
+        try:
+            with ExitStack() as stack:
+                iters: List[Iterable[bytes]] = [self.lines]
+                for run in self.runs:
+                    iters.append(stack.enter_context(open(run, "rb")))
+                with open(tmp_path, "wb") as fh:
+                    fh.writelines(_unique(heapq.merge(*iters)))
+            os.replace(tmp_path, self.index_path)
+        finally:
+            tmp_path.unlink(missing_ok=True)
+            self._cleanup()
+
+    def discard(self) -> None:
+        """Drop the keys of a failed run, keeping the previous index."""
+        self.closed = True
+        self._cleanup()
+
+    def _cleanup(self) -> None:
+        self.lines = []
+        self.runs = []
+        if self.tmp is not None:
+            self.tmp.cleanup()
+            self.tmp = None
+
+    def __repr__(self) -> str:
+        return repr(self.sink)
+
+
+class IdentifierIndex(object):
+    """Look up entity IDs by identifier key in a sorted index file, using a
+    binary search over the memory-mapped file."""
+
+    def __init__(self, path: Path) -> None:
+        self.fh = open(path, "rb")
+        self.data: Optional[mmap.mmap] = None
+        if path.stat().st_size > 0:
+            self.data = mmap.mmap(self.fh.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def _seek(self, data: mmap.mmap, key: bytes) -> int:
+        """Offset of the first line with a key not less than `key`."""
+        lo, hi = 0, len(data)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            start = data.rfind(b"\n", 0, mid) + 1
+            end = data.find(b"\n", mid)
+            if data[start : data.find(b"\t", start, end)] < key:
+                lo = end + 1
+            else:
+                hi = start
+        return lo
+
+    def get(self, key: str) -> List[str]:
+        if self.data is None:
+            return []
+        data = self.data
+        bkey = key.encode("utf-8")
+        pos = self._seek(data, bkey)
+        entity_ids: List[str] = []
+        while pos < len(data):
+            end = data.find(b"\n", pos)
+            line_key, _, entity_id = data[pos:end].partition(b"\t")
+            if line_key != bkey:
+                break
+            entity_ids.append(entity_id.decode("utf-8"))
+            pos = end + 1
+        return entity_ids
+
+    def close(self) -> None:
+        if self.data is not None:
+            self.data.close()
+        self.fh.close()
+
+    def __enter__(self) -> "IdentifierIndex":
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
+
+
+def _split(lines: BinaryIO) -> Generator[Tuple[bytes, bytes], None, None]:
+    for line in lines:
+        key, _, entity_id = line.rstrip(b"\n").partition(b"\t")
+        yield key, entity_id
+
+
+def join_indexes(paths: List[Path]) -> Generator[Tuple[str, List[str]], None, None]:
+    """Merge the sorted index files of several datasets and yield each key
+    that is shared by more than one entity, with the entity IDs."""
+    with ExitStack() as stack:
+        iters = [_split(stack.enter_context(open(p, "rb"))) for p in paths]
+        key: Optional[bytes] = None
+        entity_ids: Set[bytes] = set()
+        for next_key, entity_id in heapq.merge(*iters):
+            if next_key != key:
+                if len(entity_ids) > 1:
+                    yield key.decode("utf-8"), sorted(e.decode() for e in entity_ids)
+                key = next_key
+                entity_ids = set()
+            entity_ids.add(entity_id)
+        if key is not None and len(entity_ids) > 1:
+            yield key.decode("utf-8"), sorted(e.decode() for e in entity_ids)
+
+
+@click.group(help="Query and join cross-dataset identifier indexes")
+def cli() -> None:
+    pass
+
+
+@cli.command("get", help="Look up the entity IDs for an identifier key")
+@click.argument("path", type=click.Path(exists=True, path_type=Path))
+@click.argument("keys", nargs=-1)
+def get(path: Path, keys: List[str]) -> None:
+    with IdentifierIndex(path) as index:
+        for key in keys:
+            for entity_id in index.get(key):
+                print(f"{key}\t{entity_id}")
+
+
+@cli.command("join", help="Find entities that share an identifier")
+@click.argument("paths", nargs=-1, type=click.Path(exists=True, path_type=Path))
+@click.option("-o", "--outfile", type=click.File("wb"), default="-")
+@click.option(
+    "-r",
+    "--resolver",
+    type=click.Path(path_type=Path),
+    help="Also record the matches in a resolver file: as positive judgements "
+    "for LEI, OpenCorporates and INN keys, as candidates for the others",
+)
+def join(paths: List[Path], outfile: BinaryIO, resolver: Optional[Path]) -> None:
+    res = Resolver.load(resolver) if resolver is not None else None
+    for key, entity_ids in join_indexes(list(paths)):
+        outfile.write(orjson.dumps({"key": key, "entities": entity_ids}))
+        outfile.write(b"\n")
+        if res is not None:
+            positive = key.startswith(POSITIVE_KEYS)
+            for other_id in entity_ids[1:]:
+                if not res.check_candidate(entity_ids[0], other_id):
+                    continue
+                if positive:
+                    res.decide(entity_ids[0], other_id, Judgement.POSITIVE, "ids")
+                else:
+                    res.suggest(entity_ids[0], other_id, CANDIDATE_SCORE, "ids")
+    if res is not None:
+        res.save()
+
+
+if __name__ == "__main__":
+    cli()
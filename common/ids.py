@@ -0,0 +1,108 @@
+"""Generate entity IDs like `context.make_id` and `context.make_slug`, faster.
+
+`make_id` hashes the dataset name and the parts with SHA1, then passes the
+digest and the dataset prefix through `normality.slugify`, which is most of
+its cost: both are slugs already. `IdHasher` slugifies the prefix once and
+only slugifies parts that are not slugs yet, which gives the same result.
+IDs that share leading parts (e.g. those of all the officers of a company)
+can be made from a `scope`, which hashes those parts once:
+
+    ids = id_hasher(context).scope(company.id)
+    director.id = ids.make_id(name)  # == context.make_id(company.id, name)
+"""
+
+import re
+from hashlib import sha1
+from functools import lru_cache
+from typing import Any, Dict, Optional, Tuple
+from followthemoney.util import key_bytes
+from normality import slugify
+from zavod import Zavod
+
+SEP = "-"
+MAX_LEN = 255
+# Strings that `slugify` returns unchanged:
+SLUG = re.compile(r"[a-z0-9]+(?:-[a-z0-9]+)*")
+
+_hashers: Dict[Tuple[str, Optional[str]], "IdHasher"] = {}
+
+
+def slug_part(value: Any) -> Optional[str]:
+    """`slugify(value)`, without the work for values that are slugs."""
+    if isinstance(value, str) and SLUG.fullmatch(value) is not None:
+        return value
+    return slugify(value, sep=SEP)
+
+
+@lru_cache(maxsize=1000)
+def slug_prefix(prefix: Optional[str]) -> Optional[str]:
+    return slugify(prefix, sep=SEP)
+
+
+class IdHasher(object):
+    """`make_id` and `make_slug` of a zavod context. A hasher holds a SHA1
+    state with the dataset name and any leading parts already added."""
+
+    __slots__ = ("prefix", "digest", "size")
+
+    def __init__(self, key_prefix: Optional[str], prefix: Optional[str]) -> None:
+        self.prefix = prefix
+        self.digest = sha1()
+        if key_prefix:
+            self.digest.update(key_bytes(key_prefix))
+        # Bytes hashed beyond the key prefix; an ID of no bytes is `None`:
+        self.size = 0
+
+    def scope(self, *parts: Any) -> "IdHasher":
+        """A hasher for IDs that start with `parts`."""
+        scoped = IdHasher.__new__(IdHasher)
+        scoped.prefix = self.prefix
+        scoped.digest = self.digest.copy()
+        scoped.size = self.size
+        for part in parts:
+            data = key_bytes(part)
+            scoped.digest.update(data)
+            scoped.size += len(data)
+        return scoped
+
+    def make_id(self, *parts: Any, prefix: Optional[str] = None) -> Optional[str]:
+        digest = self.digest.copy()
+        size = self.size
+        for part in parts:
+            data = key_bytes(part)
+            digest.update(data)
+            size += len(data)
+        if size == 0:
+            return None
+        return self.make_slug(digest.hexdigest(), prefix=prefix)
+
+    def make_slug(
+        self, *parts: Any, strict: bool = True, prefix: Optional[str] = None
+    ) -> Optional[str]:
+        texts = []
+        for part in parts:
+            text = slug_part(part)
+            if text is None:
+                if strict:
+                    return None
+                continue
+            texts.append(text)
+        if not len(texts):
+            return None
+        prefix_slug = slug_prefix(self.prefix if prefix is None else prefix)
+        if prefix_slug is not None:
+            texts.insert(0, prefix_slug)
+        return SEP.join(texts)[:MAX_LEN].strip(SEP)
+
+    def __repr__(self) -> str:
+        return "<IdHasher(%r, %d)>" % (self.prefix, self.size)
+
+
+def id_hasher(context: Zavod) -> IdHasher:
+    """The (shared) hasher for the dataset of `context`."""
+    key = (context.dataset.name, context.dataset.prefix)
+    hasher = _hashers.get(key)
+    if hasher is None:
+        hasher = IdHasher(*key)
+        _hashers[key] = hasher
+    return hasher
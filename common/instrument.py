@@ -0,0 +1,278 @@
+import os
+import sys
+import time
+import orjson
+import cProfile
+import resource
+import threading
+from pathlib import Path
+from collections import Counter
+from contextlib import contextmanager
+from typing import Any, Dict, Generator, Iterable, List, Optional, TypeVar
+from nomenklatura.entity import CE
+from zavod import Zavod
+from zavod.sinks.common import Sink
+
+T = TypeVar("T")
+
+LOG_EVERY = 10_000
+RSS_INTERVAL = 1.0
+SAMPLE_INTERVAL = 0.01
+PAGE_SIZE = os.sysconf("SC_PAGE_SIZE") if hasattr(os, "sysconf") else 4096
+
+
+def read_rss() -> int:
+    """Current resident set size in bytes (peak RSS where /proc is missing)."""
+    try:
+        with open("/proc/self/statm", "rb") as fh:
+            return int(fh.read().split()[1]) * PAGE_SIZE
+    except OSError:
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if sys.platform == "darwin" else peak * 1024
+
+
+class Stage(object):
+    """Timings for one stage of a run. Durations are bucketed into a log2
+    histogram of microseconds, so recording an item stays cheap."""
+
+    def __init__(self, name: str) -> None:
+        self.name = name
+        self.lock = threading.Lock()
+        self.items = 0
+        self.bytes = 0
+        self.seconds = 0.0
+        self.histogram: List[int] = [0] * 40
+
+    def record(self, seconds: float, items: int = 1) -> None:
+        bucket = min(int(seconds * 1_000_000).bit_length(), 39)
+        with self.lock:
+            self.items += items
+            self.seconds += seconds
+            self.histogram[bucket] += 1
+
+    def to_dict(self) -> Dict[str, Any]:
+        histogram = {}
+        for bucket, count in enumerate(self.histogram):
+            if count > 0:
+                histogram[f"<{2 ** bucket}us"] = count
+        data: Dict[str, Any] = {
+            "items": self.items,
+            "seconds": round(self.seconds, 6),
+            "items_per_sec": (
+                round(self.items / self.seconds, 2) if self.seconds else None
+            ),
+            "histogram": histogram,
+        }
+        if self.bytes:
+            data["bytes"] = self.bytes
+        if self.bytes and self.seconds:
+            data["bytes_per_sec"] = round(self.bytes / self.seconds, 2)
+        return data
+
+
+class Recorder(object):
+    """Collects the stages of a parser run, samples its RSS in the background
+    and writes a report at the end."""
+
+    def __init__(self) -> None:
+        self.dataset: Optional[str] = None
+        self.stages: Dict[str, Stage] = {}
+        self.lock = threading.Lock()
+        self.started = time.time()
+        self.rss: List[List[float]] = []
+        self.peak_rss = 0
+        self.running = threading.Event()
+        self.sampler: Optional[threading.Thread] = None
+
+    def stage(self, name: str) -> Stage:
+        stage = self.stages.get(name)
+        if stage is None:
+            with self.lock:
+                stage = self.stages.setdefault(name, Stage(name))
+        return stage
+
+    def _sample_rss(self) -> None:
+        while not self.running.wait(RSS_INTERVAL):
+            rss = read_rss()
+            self.peak_rss = max(self.peak_rss, rss)
+            self.rss.append([round(time.time() - self.started, 1), rss])
+
+    def start(self, dataset: str) -> None:
+        self.dataset = dataset
+        self.started = time.time()
+        self.sampler = threading.Thread(
+            target=self._sample_rss, name="instrument-rss", daemon=True
+        )
+        self.sampler.start()
+
+    def stop(self) -> None:
+        self.running.set()
+        if self.sampler is not None:
+            self.sampler.join()
+            self.sampler = None
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "dataset": self.dataset,
+            "started_at": time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime(self.started)),
+            "seconds": round(time.time() - self.started, 3),
+            "peak_rss": max(self.peak_rss, read_rss()),
+            "rss": self.rss,
+            "stages": {n: s.to_dict() for n, s in sorted(self.stages.items())},
+        }
+
+    def write(self, path: Path) -> None:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with open(path, "wb") as fh:
+            fh.write(orjson.dumps(self.to_dict(), option=orjson.OPT_INDENT_2))
+
+
+RECORDER = Recorder()
+
+
+def track(
+    context: Zavod,
+    label: str,
+    items: Iterable[T],
+    source: Optional[Any] = None,
+    every: int = LOG_EVERY,
+) -> Generator[T, None, None]:
+    """Iterate `items`, timing the time spent producing each item (stage
+    `<label>.read`) and processing it in the loop body (`<label>.transform`,
+    excluding entity emission, which is recorded as `emit`).
+
+    If `source` is a file handle, its `tell()` is used to report bytes/sec.
+    Progress is logged every `every` items."""
+    read = RECORDER.stage(f"{label}.read")
+    transform = RECORDER.stage(f"{label}.transform")
+    emit = RECORDER.stage("emit")
+    started = time.perf_counter()
+    offset = source.tell() if source is not None else 0
+    idx = 0
+    iterator = iter(items)
+    while True:
+        before = time.perf_counter()
+        try:
+            item = next(iterator)
+        except StopIteration:
+            break
+        after = time.perf_counter()
+        read.record(after - before)
+        emitted = emit.seconds
+        yield item
+        body = time.perf_counter() - after - (emit.seconds - emitted)
+        transform.record(max(0.0, body))
+        idx += 1
+        if idx % every == 0:
+            rate = idx / (time.perf_counter() - started)
+            context.log.info("%s: %d (%.0f/s)..." % (label, idx, rate))
+    if source is not None:
+        try:
+            read.bytes += source.tell() - offset
+        except (OSError, ValueError):
+            pass
+    rate = idx / max(time.perf_counter() - started, 1e-9)
+    context.log.info("%s: %d done (%.0f/s)." % (label, idx, rate))
+
+
+@contextmanager
+def timed(label: str, items: int = 1) -> Generator[Stage, None, None]:
+    """Time a block of code (e.g. parsing a whole document) as a stage."""
+    stage = RECORDER.stage(label)
+    started = time.perf_counter()
+    try:
+        yield stage
+    finally:
+        stage.record(time.perf_counter() - started, items=items)
+
+
+class InstrumentedSink(Sink[CE]):
+    """Wrap a sink to record the time spent serialising and writing fragments."""
+
+    def __init__(self, sink: Sink[CE]) -> None:
+        super().__init__(sink.path)
+        self.sink = sink
+        self.stage = RECORDER.stage("emit")
+
+    def emit(self, entity: CE) -> None:
+        started = time.perf_counter()
+        self.sink.emit(entity)
+        self.stage.record(time.perf_counter() - started)
+
+    def close(self) -> None:
+        self.sink.close()
+        # Sharded sinks write several files (see `common.sinks.ShardedSink`):
+        for path in getattr(self.sink, "paths", [self.path]):
+            try:
+                self.stage.bytes += os.path.getsize(path)
+            except OSError:
+                pass
+
+    def __repr__(self) -> str:
+        return repr(self.sink)
+
+
+class StackSampler(object):
+    """Sample the stacks of all parser threads in-process and write them in
+    the collapsed ("folded") format used by flamegraph.pl, speedscope and
+    `py-spy record --format raw`."""
+
+    def __init__(self, path: Path, interval: float = SAMPLE_INTERVAL) -> None:
+        self.path = path
+        self.interval = interval
+        self.stacks: Counter[str] = Counter()
+        self.running = threading.Event()
+        self.thread = threading.Thread(
+            target=self._run, name="instrument-sampler", daemon=True
+        )
+
+    def _run(self) -> None:
+        while not self.running.wait(self.interval):
+            skip = set()
+            for thread in threading.enumerate():
+                if thread.name.startswith("instrument-"):
+                    skip.add(thread.ident)
+            for ident, frame in sys._current_frames().items():
+                if ident in skip:
+                    continue
+                names = []
+                while frame is not None:
+                    code = frame.f_code
+                    names.append(
+                        f"{code.co_name} ({code.co_filename}:{frame.f_lineno})"
+                    )
+                    frame = frame.f_back
+                self.stacks[";".join(reversed(names))] += 1
+
+    def start(self) -> None:
+        self.thread.start()
+
+    def stop(self) -> None:
+        self.running.set()
+        self.thread.join()
+        with open(self.path, "w") as fh:
+            for stack, count in self.stacks.most_common():
+                fh.write(f"{stack} {count}\n")
+
+
+@contextmanager
+def profile(mode: Optional[str], data_path: Path) -> Generator[None, None, None]:
+    """Opt-in profiling for a run: `cprofile` writes `profile.pstats`, `sample`
+    writes sampled stacks to `profile.folded` in the data path."""
+    if mode == "cprofile":
+        profiler = cProfile.Profile()
+        profiler.enable()
+        try:
+            yield
+        finally:
+            profiler.disable()
+            profiler.dump_stats(data_path.joinpath("profile.pstats"))
+    elif mode == "sample":
+        sampler = StackSampler(data_path.joinpath("profile.folded"))
+        sampler.start()
+        try:
+            yield
+        finally:
+            sampler.stop()
+    else:
+        yield
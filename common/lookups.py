@@ -0,0 +1,142 @@
+"""Precompiled datapatch lookups.
+
+`datapatch.Lookup.match` runs the regex of every option against each value
+it has not seen recently. A `CompiledLookup` builds the same lookup into a
+hash map of normalised `match` values per option, plus one alternation of
+all `contains`/`regex` clauses that has to match before any option regex is
+tried. Results are memoised without a size limit, and values without a
+result are counted so they can be reported once when the run is done.
+"""
+
+import re
+from collections import Counter
+from typing import Any, Dict, List, Optional, Tuple
+
+from banal import ensure_list
+from datapatch import Lookup, LookupException, Result, get_lookups
+from datapatch.option import Option
+from datapatch.util import normalize_value, str_list
+from zavod import Zavod
+
+Flags = Tuple[bool, bool, bool]
+MISSING = object()
+
+
+class _OptionGroup(object):
+    """Options of a lookup which normalise values the same way."""
+
+    def __init__(self, flags: Flags, options: List[Option]) -> None:
+        self.flags = flags
+        self.options = options
+        self.none_options = [o for o in options if o.none_matches]
+        self.exact: Dict[str, List[Option]] = {}
+        self.patterns: List[Option] = []
+        clauses: List[str] = []
+        for option in options:
+            for match in str_list(option.config.get("match", [])):
+                norm = normalize_value(match, *flags)
+                if norm is not None:
+                    options_ = self.exact.setdefault(norm, [])
+                    if option not in options_:
+                        options_.append(option)
+            option_clauses: List[str] = []
+            for contain in str_list(option.config.get("contains", [])):
+                norm = normalize_value(contain, *flags)
+                if norm is not None:
+                    option_clauses.append(".*%s.*" % re.escape(norm))
+            for regex in str_list(option.config.get("regex", [])):
+                if regex is not None:
+                    option_clauses.append(regex)
+            if len(option_clauses):
+                self.patterns.append(option)
+                clauses.extend(option_clauses)
+        self.prefilter: Optional[re.Pattern] = None
+        if len(clauses):
+            try:
+                pattern = "|".join("(?:%s)" % c for c in clauses)
+                self.prefilter = re.compile(pattern, re.U | re.M | re.S)
+            except re.error:
+                self.prefilter = None
+
+    def matching(self, value: Optional[str]) -> List[Option]:
+        norm = normalize_value(value, *self.flags)
+        if norm is None:
+            return list(self.none_options)
+        if "\n" in norm:
+            # Multi-line values can match `^...$` clauses in datapatch's
+            # (re.M) option regexes on any line, so check them one by one:
+            return [o for o in self.options if o.matches(value)]
+        matching = list(self.exact.get(norm, []))
+        if self.prefilter is None or self.prefilter.match(norm) is not None:
+            for option in self.patterns:
+                if option not in matching and option.regex.match(norm):
+                    matching.append(option)
+        return matching
+
+
+class CompiledLookup(object):
+    """A datapatch lookup with the same results as `Lookup.match`."""
+
+    def __init__(self, lookup: Lookup) -> None:
+        self.lookup = lookup
+        self.name = lookup.name
+        grouped: Dict[Flags, List[Option]] = {}
+        for option in lookup.options:
+            flags = (option.normalize, option.lowercase, option.asciify)
+            grouped.setdefault(flags, []).append(option)
+        self.groups = [_OptionGroup(f, opts) for f, opts in grouped.items()]
+        self.results: Dict[Any, Optional[Result]] = {}
+        self.misses: Counter[Any] = Counter()
+
+    def _match(self, value: Optional[str]) -> Optional[Result]:
+        matching: List[Option] = []
+        for group in self.groups:
+            matching.extend(group.matching(value))
+        matching = sorted(matching, key=lambda o: o.weight, reverse=True)
+        if len(matching) > 1 and matching[0].weight == matching[1].weight:
+            msg = "Ambiguous result: %r -> %r (set weights to fix)" % (value, matching)
+            raise LookupException(msg, lookup=self.lookup, value=value)
+        for option in matching:
+            option.ref_count += 1
+            return option.result
+        if self.lookup.required:
+            raise LookupException(
+                "Missing lookup result", lookup=self.lookup, value=value
+            )
+        return None
+
+    def match(self, value: Optional[str]) -> Optional[Result]:
+        result = self.results.get(value, MISSING)
+        if result is MISSING:
+            result = self.results[value] = self._match(value)
+        if result is None:
+            self.misses[value] += 1
+        return result  # type: ignore
+
+    def get_values(self, value: Optional[str], default: Any = None) -> List[str]:
+        result = self.match(value)
+        if result is not None:
+            return result.values
+        return ensure_list(default or [])
+
+    def __repr__(self) -> str:
+        return f"<CompiledLookup({self.name!r})>"
+
+
+def compile_lookups(config: Dict[str, Any]) -> Dict[str, CompiledLookup]:
+    return {n: CompiledLookup(lu) for n, lu in get_lookups(config).items()}
+
+
+def report_misses(
+    context: Zavod, lookups: Dict[str, CompiledLookup], examples: int = 10
+) -> None:
+    """Log one warning per lookup which had values without a result."""
+    for name, lookup in lookups.items():
+        if not len(lookup.misses):
+            continue
+        context.log.warning(
+            "Values missing from lookup [%s]" % name,
+            distinct=len(lookup.misses),
+            total=sum(lookup.misses.values()),
+            examples=[v for v, _ in lookup.misses.most_common(examples)],
+        )
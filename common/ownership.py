@@ -0,0 +1,353 @@
+"""Compact on-disk index of ownership edges, for multi-hop chain queries.
+
+Entity IDs are numbered in sorted order. Edges are stored in CSR form in both
+directions: for each node, `offsets[n]:offsets[n + 1]` is its slice of
+`targets` (the nodes on the other end of the edge) and `edges` (the numbers of
+the ownership statements). The arrays are raw little-endian int64 files which
+are memory-mapped when the index is read. The entity and statement IDs stay
+on disk as well: line `n` of a text file is found through the byte offsets in
+its `.offsets` file, and a node is looked up by entity ID with a binary search
+over the sorted `ids.txt`, so opening an index costs nothing however large it
+is.
+
+While the index is built, statement IDs are written out as the edges come in
+and the entity IDs at both ends of each edge are sorted in runs on disk (like
+`common.identifiers.IdentifierSink`), so only integer arrays are kept in
+memory.
+
+    data/export/ownership/
+        ids.txt             # entity ID of node n on line n, sorted
+        ids.txt.offsets     # byte offset of line n in ids.txt
+        statements.txt      # ownership statement ID of edge e on line e
+        statements.txt.offsets
+        owned.offsets ...   # owner -> asset
+        owners.offsets ...  # asset -> owner
+"""
+
+import sys
+import mmap
+import json
+import heapq
+import click
+import tempfile
+from array import array
+from pathlib import Path
+from contextlib import ExitStack
+from typing import Any, BinaryIO, Generator, Iterable, List, Optional, Set, Tuple
+
+TYPECODE = "q"
+ITEMSIZE = 8
+# Edge ends sorted in memory before a run is written to disk:
+BUFFER = 1_000_000
+# `owned` lists what a node owns, `owners` who owns it.
+DIRECTIONS = ("owned", "owners")
+
+
+class _LineWriter(object):
+    """Write lines to `path` and the byte offset of each (plus the end of
+    the file) to `path.offsets`."""
+
+    def __init__(self, path: Path) -> None:
+        self.path = path
+        self.fh: BinaryIO = open(path, "wb")
+        self.offsets = array(TYPECODE, [0])
+
+    def write(self, line: bytes) -> None:
+        self.fh.write(line)
+        self.offsets.append(self.offsets[-1] + len(line))
+
+    def save(self) -> None:
+        self.fh.flush()
+        _write_array(self.path.with_name(self.path.name + ".offsets"), self.offsets)
+
+    def close(self) -> None:
+        self.save()
+        self.fh.close()
+
+
+def _write_run(lines: List[bytes], directory: str) -> Path:
+    lines.sort()
+    with tempfile.NamedTemporaryFile(dir=directory, delete=False) as fh:
+        fh.writelines(lines)
+    return Path(fh.name)
+
+
+def _write_array(path: Path, values: array) -> None:
+    if sys.byteorder != "little":
+        values = array(TYPECODE, values)
+        values.byteswap()
+    with open(path, "wb") as fh:
+        values.tofile(fh)
+
+
+def _build_csr(
+    nodes: int, sources: array, targets: array
+) -> Tuple[array, array, array]:
+    """Counting sort of the edges by source node."""
+    offsets = array(TYPECODE, bytes(ITEMSIZE * (nodes + 1)))
+    for source in sources:
+        offsets[source + 1] += 1
+    for node in range(nodes):
+        offsets[node + 1] += offsets[node]
+    fill = array(TYPECODE, offsets)
+    out_targets = array(TYPECODE, bytes(ITEMSIZE * len(sources)))
+    out_edges = array(TYPECODE, bytes(ITEMSIZE * len(sources)))
+    for edge, (source, target) in enumerate(zip(sources, targets)):
+        pos = fill[source]
+        out_targets[pos] = target
+        out_edges[pos] = edge
+        fill[source] = pos + 1
+    return offsets, out_targets, out_edges
+
+
+class OwnershipIndex(object):
+    """Collects owner -> asset edges into the index at `path` while a dataset
+    is parsed. `write` numbers the nodes and writes the CSR arrays; it can be
+    called again after more edges were added."""
+
+    def __init__(self, path: Path, buffer: int = BUFFER) -> None:
+        self.path = path
+        self.buffer = buffer
+        path.mkdir(parents=True, exist_ok=True)
+        self.statements = _LineWriter(path / "statements.txt")
+        # `{entity_id}\t{edge * 2 + end}` for the owner (0) and asset (1) end:
+        self.lines: List[bytes] = []
+        self.runs: List[Path] = []
+        self.tmp = tempfile.TemporaryDirectory(dir=path)
+        self.edges = 0
+        self.nodes = 0
+
+    def add(self, owner_id: str, asset_id: str, statement_id: str) -> None:
+        edge = self.edges * 2
+        self.lines.append(f"{owner_id}\t{edge}\n".encode("utf-8"))
+        self.lines.append(f"{asset_id}\t{edge + 1}\n".encode("utf-8"))
+        self.statements.write(f"{statement_id}\n".encode("utf-8"))
+        self.edges += 1
+        if len(self.lines) >= self.buffer:
+            self.runs.append(_write_run(self.lines, self.tmp.name))
+            self.lines = []
+
+    def _number(self) -> Tuple[array, array]:
+        """Write the sorted entity IDs to `ids.txt` and give both ends of each
+        edge the number of their node."""
+        if len(self.lines):
+            self.runs.append(_write_run(self.lines, self.tmp.name))
+            self.lines = []
+        ends = array(TYPECODE, bytes(ITEMSIZE * self.edges * 2))
+        ids = _LineWriter(self.path / "ids.txt")
+        node = -1
+        prev: Optional[bytes] = None
+        with ExitStack() as stack:
+            runs: List[Iterable[bytes]] = []
+            for run in self.runs:
+                runs.append(stack.enter_context(open(run, "rb")))
+            for line in heapq.merge(*runs):
+                entity_id, _, end = line.rpartition(b"\t")
+                if entity_id != prev:
+                    ids.write(entity_id + b"\n")
+                    prev = entity_id
+                    node += 1
+                ends[int(end)] = node
+        ids.close()
+        self.nodes = node + 1
+        return ends[0::2], ends[1::2]
+
+    def write(self) -> None:
+        self.statements.save()
+        owners, assets = self._number()
+        for name, (sources, targets) in zip(
+            DIRECTIONS, ((owners, assets), (assets, owners))
+        ):
+            offsets, out_targets, out_edges = _build_csr(self.nodes, sources, targets)
+            _write_array(self.path / f"{name}.offsets", offsets)
+            _write_array(self.path / f"{name}.targets", out_targets)
+            _write_array(self.path / f"{name}.edges", out_edges)
+        meta = {"nodes": self.nodes, "edges": self.edges, "dtype": "<i8"}
+        with open(self.path / "index.json", "w") as fh:
+            json.dump(meta, fh)
+
+
+class _Mapped(object):
+    """Memory-mapped files of an index, closed together."""
+
+    def __init__(self) -> None:
+        self.handles: List[Any] = []
+        self.views: List[memoryview] = []
+
+    def _open(self, path: Path) -> Optional[mmap.mmap]:
+        fh = open(path, "rb")
+        self.handles.append(fh)
+        if path.stat().st_size == 0:
+            return None
+        data = mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ)
+        self.handles.append(data)
+        return data
+
+    def _map(self, path: Path) -> memoryview:
+        data = self._open(path)
+        if data is None:
+            return memoryview(array(TYPECODE))
+        view = memoryview(data).cast(TYPECODE)
+        self.views.append(view)
+        return view
+
+    def close(self) -> None:
+        for view in self.views:
+            view.release()
+        for handle in reversed(self.handles):
+            handle.close()
+
+
+class _Lines(_Mapped):
+    """Line `n` of a file written by `_LineWriter`."""
+
+    def __init__(self, path: Path) -> None:
+        super().__init__()
+        self.data = self._open(path)
+        self.offsets = self._map(path.with_name(path.name + ".offsets"))
+
+    def _line(self, n: int) -> bytes:
+        assert self.data is not None
+        return self.data[self.offsets[n] : self.offsets[n + 1] - 1]
+
+    def __getitem__(self, n: int) -> str:
+        return self._line(n).decode("utf-8")
+
+    def find(self, text: str) -> Optional[int]:
+        """The number of a line in a sorted file."""
+        key = text.encode("utf-8")
+        lo, hi = 0, len(self.offsets) - 1
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self._line(mid) < key:
+                lo = mid + 1
+            else:
+                hi = mid
+        if lo < len(self.offsets) - 1 and self._line(lo) == key:
+            return lo
+        return None
+
+
+class _Adjacency(_Mapped):
+    def __init__(self, path: Path, name: str) -> None:
+        super().__init__()
+        self.offsets = self._map(path / f"{name}.offsets")
+        self.targets = self._map(path / f"{name}.targets")
+        self.edges = self._map(path / f"{name}.edges")
+
+    def neighbours(self, node: int) -> Generator[Tuple[int, int], None, None]:
+        for pos in range(self.offsets[node], self.offsets[node + 1]):
+            yield self.targets[pos], self.edges[pos]
+
+
+class OwnershipGraph(object):
+    """Read-only view of an ownership index written by `OwnershipIndex`."""
+
+    def __init__(self, path: Path) -> None:
+        if sys.byteorder != "little":
+            raise RuntimeError("Ownership index is little-endian only")
+        self.path = path
+        self.ids = _Lines(path / "ids.txt")
+        self.statements = _Lines(path / "statements.txt")
+        self.owned = _Adjacency(path, "owned")
+        self.owners = _Adjacency(path, "owners")
+
+    def node(self, entity_id: str) -> Optional[int]:
+        return self.ids.find(entity_id)
+
+    def _adjacency(self, up: bool) -> _Adjacency:
+        return self.owners if up else self.owned
+
+    def neighbours(self, entity_id: str, up: bool = True) -> List[Tuple[str, str]]:
+        """Direct owners (or, with `up=False`, direct holdings) of an entity,
+        as (entity ID, ownership statement ID) pairs."""
+        node = self.node(entity_id)
+        if node is None:
+            return []
+        adjacency = self._adjacency(up)
+        return [
+            (self.ids[target], self.statements[edge])
+            for target, edge in adjacency.neighbours(node)
+        ]
+
+    def chains(
+        self, entity_id: str, up: bool = True, max_depth: int = 10
+    ) -> Generator[List[str], None, None]:
+        """All ownership chains starting at an entity, going up to its owners
+        (or down to its holdings), as lists of entity IDs. A chain ends at a
+        node without further edges, at `max_depth`, or before a cycle."""
+        node = self.node(entity_id)
+        if node is None:
+            return
+        adjacency = self._adjacency(up)
+        path: List[int] = [node]
+        on_path: Set[int] = {node}
+        stack = [adjacency.neighbours(node)]
+        while stack:
+            extended = False
+            if len(path) <= max_depth:
+                for target, _ in stack[-1]:
+                    if target in on_path:
+                        continue
+                    path.append(target)
+                    on_path.add(target)
+                    stack.append(adjacency.neighbours(target))
+                    extended = True
+                    break
+            if extended:
+                continue
+            stack.pop()
+            if len(path) > 1 and not self._has_next(
+                adjacency, path, on_path, max_depth
+            ):
+                yield [self.ids[n] for n in path]
+            on_path.discard(path.pop())
+
+    def _has_next(
+        self, adjacency: _Adjacency, path: List[int], on_path: Set[int], max_depth: int
+    ) -> bool:
+        if len(path) > max_depth:
+            return False
+        for target, _ in adjacency.neighbours(path[-1]):
+            if target not in on_path:
+                return True
+        return False
+
+    def ultimate(
+        self, entity_id: str, up: bool = True, max_depth: int = 10
+    ) -> Set[str]:
+        """The entities at the end of all chains from an entity, e.g. its
+        ultimate owners."""
+        return {chain[-1] for chain in self.chains(entity_id, up, max_depth)}
+
+    def close(self) -> None:
+        self.ids.close()
+        self.statements.close()
+        self.owned.close()
+        self.owners.close()
+
+    def __enter__(self) -> "OwnershipGraph":
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
+
+
+@click.group(help="Query an ownership index")
+def cli() -> None:
+    pass
+
+
+@cli.command("chains", help="Print the ownership chains of an entity")
+@click.argument("path", type=click.Path(exists=True, path_type=Path))
+@click.argument("entity_id")
+@click.option("--up/--down", default=True, help="Go to owners or to holdings")
+@click.option("-d", "--depth", type=int, default=10, show_default=True)
+def chains(path: Path, entity_id: str, up: bool, depth: int) -> None:
+    with OwnershipGraph(path) as graph:
+        for chain in graph.chains(entity_id, up=up, max_depth=depth):
+            print(" -> ".join(chain) if up else " <- ".join(chain))
+
+
+if __name__ == "__main__":
+    cli()
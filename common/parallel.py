@@ -0,0 +1,90 @@
+"""Run a parser over chunks of its input in a pool of worker processes.
+
+Each worker parses with a zavod context of its own, whose sink only collects
+the serialised fragments (`common.sinks.CollectingSink`). The parent emits
+them into its own context in the order of the chunks, so they pass through
+the same sinks (instrumentation, identifier index, in-memory aggregation) as
+the fragments of a serial run."""
+
+import orjson
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from pathlib import Path
+from typing import Any, Callable, Deque, Generator, Iterable, List, Optional, Tuple
+from followthemoney import model
+from nomenklatura.entity import CompositeEntity
+from zavod import Zavod, ZavodDataset
+
+from common import settings
+from common.countries import install as install_countries
+from common.instrument import track
+from common.sinks import CollectingSink
+
+Task = Tuple[Any, ...]
+Worker = Tuple[Zavod, CollectingSink, Callable[..., None]]
+
+_worker: Optional[Worker] = None
+
+
+def _init_worker(
+    dataset: ZavodDataset, data_path: Path, func: Callable[..., None]
+) -> None:
+    global _worker
+    if settings.COUNTRY_TABLE:
+        install_countries()
+    sink = CollectingSink()
+    context = Zavod(dataset, CompositeEntity, sink=sink, data_path=data_path)
+    _worker = (context, sink, func)
+
+
+def _run_task(task: Task) -> List[bytes]:
+    assert _worker is not None, "Worker is not initialised"
+    context, sink, func = _worker
+    func(context, *task)
+    return sink.take()
+
+
+def _results(
+    executor: ProcessPoolExecutor, tasks: Iterable[Task], window: int
+) -> Generator[List[bytes], None, None]:
+    pending: Deque[Future] = deque()
+    for task in tasks:
+        pending.append(executor.submit(_run_task, task))
+        if len(pending) >= window:
+            yield pending.popleft().result()
+    while len(pending):
+        yield pending.popleft().result()
+
+
+def parse_parallel(
+    context: Zavod,
+    func: Callable[..., None],
+    tasks: Iterable[Task],
+    workers: int = settings.PARSE_WORKERS,
+    label: str = "Parse chunks",
+) -> None:
+    """Run `func(context, *task)` for each of `tasks` in `workers` processes
+    and emit the fragments into `context`. Up to two chunks per worker are in
+    flight, so memory stays bounded if the parent emits slower than the
+    workers parse. With a single worker, the tasks run in this process.
+
+    Statements are not serialised with their dataset, so the fragments are
+    read back with that of `context`."""
+    if workers <= 1:
+        for task in tasks:
+            func(context, *task)
+        return
+    with ProcessPoolExecutor(
+        max_workers=workers,
+        initializer=_init_worker,
+        initargs=(context.dataset, context.path, func),
+    ) as executor:
+        results = _results(executor, tasks, workers * 2)
+        for lines in track(context, label, results, every=10):
+            for line in lines:
+                data = orjson.loads(line)
+                context.emit(
+                    CompositeEntity.from_dict(
+                        model, data, cleaned=True, default_dataset=context.dataset
+                    )
+                )
@@ -0,0 +1,92 @@
+"""Download the next resources of a crawl while the current one is parsed.
+
+`prefetch` takes a list of `(name, url)` resources and yields them in order
+as `(name, path)` once each file is on disk. Up to `ahead` resources after
+the one being parsed are fetched on background threads, as long as the files
+that are waiting to be parsed (or still downloading) add up to no more than
+`budget` bytes. The budget is counted by the size the server reports for each
+file, before its fetch starts. Because a file does not have to be fetched
+ahead of its turn, the resource after the one being parsed is always fetched,
+whatever its size.
+
+When a fetch fails or the caller stops (e.g. because parsing failed), the
+downloads still running are stopped and the error is raised right away,
+without waiting for them to finish. Their partial files are kept, so that
+the next run resumes them (see `common.download`).
+"""
+
+from pathlib import Path
+from threading import Event
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable, Deque, Generator, Iterable, Iterator, Optional, Tuple
+from zavod import Zavod
+
+from common import settings
+from common.download import fetch_resource, resource_size
+
+Resource = Tuple[str, str]
+Fetch = Callable[..., Path]
+Size = Callable[[Zavod, str, str], Optional[int]]
+
+
+def prefetch(
+    context: Zavod,
+    resources: Iterable[Resource],
+    ahead: int = settings.PREFETCH_AHEAD,
+    budget: int = settings.PREFETCH_BUDGET,
+    delete: bool = False,
+    fetch: Fetch = fetch_resource,
+    size: Size = resource_size,
+) -> Generator[Tuple[str, Path], None, None]:
+    """Yield the path of each resource, fetching the next `ahead` resources
+    in the background. With `delete`, each file is removed once the caller
+    asks for the next one.
+
+    `fetch(context, name, url, stop=event)` downloads a resource and should
+    give up once the event is set; `size(context, name, url)` is its expected
+    size in bytes (files of unknown size count as empty)."""
+    items: Iterator[Resource] = iter(resources)
+    # Name, expected size and fetch of the resources not yet yielded:
+    pending: Deque[Tuple[str, int, Future]] = deque()
+    upcoming: Optional[Tuple[str, str, int]] = None
+    exhausted = False
+    stop = Event()
+    executor = ThreadPoolExecutor(max_workers=max(1, ahead))
+
+    def submit(force: bool) -> bool:
+        nonlocal upcoming, exhausted
+        if upcoming is None:
+            for name, url in items:
+                upcoming = (name, url, size(context, name, url) or 0)
+                break
+            else:
+                exhausted = True
+                return False
+        name, url, expected = upcoming
+        used = sum(e for _, e, _ in pending)
+        if not force and used + expected > budget:
+            return False
+        future = executor.submit(fetch, context, name, url, stop=stop)
+        pending.append((name, expected, future))
+        upcoming = None
+        return True
+
+    try:
+        submit(True)
+        while len(pending):
+            name, _, future = pending.popleft()
+            # Keep the next resources coming while this one is parsed:
+            if not len(pending) and not exhausted:
+                submit(True)
+            while not exhausted and len(pending) < ahead:
+                if not submit(False):
+                    break
+            path = future.result()
+            yield name, path
+            if delete:
+                path.unlink(missing_ok=True)
+    finally:
+        # Stop the running downloads instead of waiting for them:
+        stop.set()
+        executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,338 @@
+import gzip
+import json
+import time
+import click
+import shutil
+import hashlib
+import logging
+import mimetypes
+import boto3
+import zstandard
+from botocore.exceptions import ClientError
+from pathlib import Path
+from threading import RLock
+from typing import Any, Dict, List, Optional, Tuple
+from concurrent.futures import ThreadPoolExecutor
+
+log = logging.getLogger("publish")
+
+BUCKET = "data.opensanctions.org"
+PREFIX = "graph"
+DISTRIBUTION_ID = "ETROMAQBEJS91"
+PART_SIZE = 64 * 1024 * 1024
+COMPRESS_MIN_SIZE = 1024 * 1024
+CHUNK_SIZE = 8 * 1024 * 1024
+VARIANTS = (".gz", ".zst")
+# Files that a writer has not finished yet (exports, compressed variants and
+# the state of interrupted downloads):
+TEMP_SUFFIXES = (".tmp", ".part", ".part.json")
+MIME_TYPES = {
+    ".json": "application/json",
+    ".gz": "application/gzip",
+    ".zst": "application/zstd",
+}
+
+
+def file_sha256(path: Path) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as fh:
+        while chunk := fh.read(CHUNK_SIZE):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def compress_file(path: Path, suffix: str) -> Path:
+    """Write a compressed variant of `path` next to it, via a temp file so that
+    an interrupted run never leaves a truncated variant behind."""
+    out_path = path.with_name(path.name + suffix)
+    tmp_path = out_path.with_name(out_path.name + ".tmp")
+    with open(path, "rb") as infh:
+        if suffix == ".gz":
+            with gzip.open(tmp_path, "wb", compresslevel=6) as outfh:
+                shutil.copyfileobj(infh, outfh, CHUNK_SIZE)
+        elif suffix == ".zst":
+            cctx = zstandard.ZstdCompressor(level=10, threads=-1)
+            with open(tmp_path, "wb") as outfh:
+                cctx.copy_stream(infh, outfh, read_size=CHUNK_SIZE)
+        else:
+            raise ValueError("Unknown compression: %s" % suffix)
+    tmp_path.replace(out_path)
+    return out_path
+
+
+class Manifest(object):
+    """Local publish state: content hashes of exported files (keyed on size
+    and mtime so unchanged files are not re-hashed) and the progress of
+    multipart uploads that have not been completed."""
+
+    def __init__(self, path: Path) -> None:
+        self.path = path
+        self.lock = RLock()
+        self.files: Dict[str, Dict[str, Any]] = {}
+        self.uploads: Dict[str, Dict[str, Any]] = {}
+        if path.exists():
+            with open(path, "r") as fh:
+                data = json.load(fh)
+            self.files = data.get("files", {})
+            self.uploads = data.get("uploads", {})
+
+    def sha256(self, path: Path, name: str) -> str:
+        stat = path.stat()
+        with self.lock:
+            entry = self.files.get(name)
+        if entry is not None:
+            if entry["size"] == stat.st_size and entry["mtime"] == stat.st_mtime_ns:
+                return entry["sha256"]
+        digest = file_sha256(path)
+        with self.lock:
+            self.files[name] = {
+                "size": stat.st_size,
+                "mtime": stat.st_mtime_ns,
+                "sha256": digest,
+            }
+        self.save()
+        return digest
+
+    def save(self) -> None:
+        with self.lock:
+            tmp_path = self.path.with_name(self.path.name + ".tmp")
+            with open(tmp_path, "w") as fh:
+                json.dump({"files": self.files, "uploads": self.uploads}, fh)
+            tmp_path.replace(self.path)
+
+
+class Publisher(object):
+    def __init__(
+        self,
+        name: str,
+        folder: Path,
+        bucket: str = BUCKET,
+        prefix: str = PREFIX,
+        endpoint_url: Optional[str] = None,
+        workers: int = 8,
+    ) -> None:
+        self.name = name
+        self.folder = folder
+        self.bucket = bucket
+        self.prefix = f"{prefix}/{name}"
+        self.workers = workers
+        self.s3 = boto3.client("s3", endpoint_url=endpoint_url)
+        self.manifest = Manifest(folder.parent / f"{folder.name}.publish.json")
+
+    def relative(self, path: Path) -> str:
+        return path.relative_to(self.folder).as_posix()
+
+    def key(self, path: Path) -> str:
+        return f"{self.prefix}/{self.relative(path)}"
+
+    def files(self) -> List[Path]:
+        """All finished files in the folder and its subdirectories."""
+        paths = []
+        for path in self.folder.rglob("*"):
+            if not path.is_file() or path.name.endswith(TEMP_SUFFIXES):
+                continue
+            paths.append(path)
+        return sorted(paths)
+
+    def make_variants(self, pool: ThreadPoolExecutor) -> None:
+        jobs = []
+        for path in self.files():
+            if path.suffix in VARIANTS:
+                continue
+            if path.stat().st_size < COMPRESS_MIN_SIZE:
+                continue
+            for suffix in VARIANTS:
+                variant = path.with_name(path.name + suffix)
+                if variant.exists() and variant.stat().st_mtime >= path.stat().st_mtime:
+                    continue
+                log.info("Compressing: %s", variant.name)
+                jobs.append(pool.submit(compress_file, path, suffix))
+        for job in jobs:
+            job.result()
+
+    def remote_sha256(self, key: str) -> Optional[str]:
+        try:
+            head = self.s3.head_object(Bucket=self.bucket, Key=key)
+        except ClientError as exc:
+            if exc.response["Error"]["Code"] in ("404", "NoSuchKey"):
+                return None
+            raise
+        return head.get("Metadata", {}).get("sha256")
+
+    def object_args(self, path: Path, digest: str) -> Dict[str, Any]:
+        mime_type, _ = mimetypes.guess_type(path.name)
+        if path.suffix in MIME_TYPES:
+            mime_type = MIME_TYPES[path.suffix]
+        return {
+            "ACL": "public-read",
+            "ContentType": mime_type or "application/octet-stream",
+            "ContentDisposition": "attachment",
+            "Metadata": {"sha256": digest},
+        }
+
+    def upload_part(self, key: str, upload_id: str, path: Path, number: int) -> str:
+        with open(path, "rb") as fh:
+            fh.seek((number - 1) * PART_SIZE)
+            body = fh.read(PART_SIZE)
+        res = self.s3.upload_part(
+            Bucket=self.bucket,
+            Key=key,
+            UploadId=upload_id,
+            PartNumber=number,
+            Body=body,
+        )
+        with self.manifest.lock:
+            self.manifest.uploads[key]["parts"][str(number)] = res["ETag"]
+        self.manifest.save()
+        return res["ETag"]
+
+    def resume_upload(self, key: str, digest: str) -> Optional[str]:
+        state = self.manifest.uploads.get(key)
+        if state is None:
+            return None
+        if state["sha256"] != digest:
+            self.abort_upload(key)
+            return None
+        try:
+            parts: Dict[str, str] = {}
+            pager = self.s3.get_paginator("list_parts")
+            pages = pager.paginate(
+                Bucket=self.bucket, Key=key, UploadId=state["upload_id"]
+            )
+            for page in pages:
+                for part in page.get("Parts", []):
+                    parts[str(part["PartNumber"])] = part["ETag"]
+        except self.s3.exceptions.NoSuchUpload:
+            self.manifest.uploads.pop(key, None)
+            return None
+        log.info("Resuming upload: %s (%d parts done)", key, len(parts))
+        state["parts"] = parts
+        return state["upload_id"]
+
+    def abort_upload(self, key: str) -> None:
+        state = self.manifest.uploads.pop(key, None)
+        if state is not None:
+            try:
+                self.s3.abort_multipart_upload(
+                    Bucket=self.bucket, Key=key, UploadId=state["upload_id"]
+                )
+            except self.s3.exceptions.NoSuchUpload:
+                pass
+        self.manifest.save()
+
+    def upload_multipart(
+        self, pool: ThreadPoolExecutor, path: Path, key: str, digest: str
+    ) -> None:
+        upload_id = self.resume_upload(key, digest)
+        if upload_id is None:
+            res = self.s3.create_multipart_upload(
+                Bucket=self.bucket, Key=key, **self.object_args(path, digest)
+            )
+            upload_id = res["UploadId"]
+            self.manifest.uploads[key] = {
+                "upload_id": upload_id,
+                "sha256": digest,
+                "parts": {},
+            }
+            self.manifest.save()
+
+        size = path.stat().st_size
+        count = max(1, -(-size // PART_SIZE))
+        done = self.manifest.uploads[key]["parts"]
+        jobs = {}
+        for number in range(1, count + 1):
+            if str(number) in done:
+                continue
+            jobs[number] = pool.submit(self.upload_part, key, upload_id, path, number)
+        for job in jobs.values():
+            job.result()
+
+        parts = [{"PartNumber": n, "ETag": done[str(n)]} for n in range(1, count + 1)]
+        self.s3.complete_multipart_upload(
+            Bucket=self.bucket,
+            Key=key,
+            UploadId=upload_id,
+            MultipartUpload={"Parts": parts},
+        )
+        self.manifest.uploads.pop(key, None)
+        self.manifest.save()
+
+    def upload_file(self, pool: ThreadPoolExecutor, path: Path) -> bool:
+        key = self.key(path)
+        digest = self.manifest.sha256(path, self.relative(path))
+        if key not in self.manifest.uploads and self.remote_sha256(key) == digest:
+            log.info("Unchanged: %s", key)
+            return False
+        log.info("Uploading: %s -> s3://%s/%s", path, self.bucket, key)
+        if path.stat().st_size > PART_SIZE:
+            self.upload_multipart(pool, path, key, digest)
+        else:
+            with open(path, "rb") as fh:
+                self.s3.put_object(
+                    Bucket=self.bucket,
+                    Key=key,
+                    Body=fh,
+                    **self.object_args(path, digest),
+                )
+        return True
+
+    def publish(self) -> List[str]:
+        uploaded: List[str] = []
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            self.make_variants(pool)
+            # Part uploads are queued on the same pool, so files are handled
+            # one by one to avoid starving it with blocked file jobs.
+            for path in self.files():
+                if self.upload_file(pool, path):
+                    uploaded.append(self.key(path))
+        return uploaded
+
+    def invalidate(self, distribution_id: str = DISTRIBUTION_ID) -> None:
+        cloudfront = boto3.client("cloudfront")
+        cloudfront.create_invalidation(
+            DistributionId=distribution_id,
+            InvalidationBatch={
+                "Paths": {"Quantity": 1, "Items": [f"/{self.prefix}/*"]},
+                "CallerReference": f"{self.prefix}-{time.time()}",
+            },
+        )
+
+
+def split_uri(uri: str) -> Tuple[str, str]:
+    bucket, _, prefix = uri.removeprefix("s3://").partition("/")
+    return bucket, prefix.strip("/")
+
+
+@click.command()
+@click.argument("name")
+@click.argument("folder", type=click.Path(exists=True, file_okay=False, path_type=Path))
+@click.option("--target", default=f"s3://{BUCKET}/{PREFIX}", show_default=True)
+@click.option("--endpoint-url", envvar="AWS_ENDPOINT_URL", default=None)
+@click.option("--workers", type=int, default=8, show_default=True)
+@click.option("--invalidate/--no-invalidate", default=True)
+def main(
+    name: str,
+    folder: Path,
+    target: str,
+    endpoint_url: Optional[str],
+    workers: int,
+    invalidate: bool,
+):
+    logging.basicConfig(level=logging.INFO)
+    bucket, prefix = split_uri(target)
+    publisher = Publisher(
+        name,
+        folder,
+        bucket=bucket,
+        prefix=prefix,
+        endpoint_url=endpoint_url,
+        workers=workers,
+    )
+    uploaded = publisher.publish()
+    log.info("Uploaded %d files.", len(uploaded))
+    if invalidate and len(uploaded):
+        publisher.invalidate()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+import os
+
+# Output file for entity fragments, relative to the zavod data path. The
+# suffix selects the format: `.json` for plain JSON lines, `.json.zst` for
+# zstd-compressed JSON lines, `.msgpack` (or `.msgpack.zst`) for binary records.
+FRAGMENTS = os.environ.get("GRAPH_FRAGMENTS", "fragments.json")
+
+# Number of files (up to 100) to partition the fragments of a run into, by a
+# hash of the entity ID (see `common.sinks.ShardedSink`). Each shard is then
+# sorted and aggregated in parallel with `python -m common.fragments
+# aggregate-shards`.
+SHARDS = int(os.environ.get("GRAPH_SHARDS", "1"))
+
+# Runs that emit up to this many fragments are aggregated in memory and write
+# `AGGREGATE_EXPORT` (relative to the zavod data path) directly, without a
+# fragment file to sort (see `common.sinks.AggregatingSink`). Larger runs
+# write their fragments as usual. `0` disables in-memory aggregation.
+AGGREGATE_LIMIT = int(os.environ.get("GRAPH_AGGREGATE_LIMIT", "0"))
+AGGREGATE_EXPORT = os.environ.get("GRAPH_AGGREGATE_EXPORT", "export/entities.ftm.json")
+
+# Worker processes for parsers that split their source into chunks (see
+# `common.parallel`), and the size of the chunks in bytes. With `1`, the
+# source is streamed in the parser process as usual.
+PARSE_WORKERS = int(os.environ.get("GRAPH_PARSE_WORKERS", "1"))
+PARSE_CHUNK_SIZE = int(os.environ.get("GRAPH_PARSE_CHUNK_SIZE", str(64 * 1024**2)))
+
+# Also parse the individual entrepreneur (FOP) file of `ua_edr`, which is much
+# larger than the legal entity file. Off until parallel parsing has been shown
+# to keep a full run within time on a multi-core machine.
+EDR_FOP = os.environ.get("GRAPH_EDR_FOP", "0") == "1"
+
+# zstd compression level for fragment files.
+ZSTD_LEVEL = int(os.environ.get("GRAPH_ZSTD_LEVEL", "3"))
+
+# Size of the zstd dictionary trained on the first fragments of a run. This is
+# off by default: on a single long stream zstd builds up the same context by
+# itself (see `benchmarks/fragments.py`), it mainly helps small files.
+ZSTD_DICT_SIZE = int(os.environ.get("GRAPH_ZSTD_DICT_SIZE", "0"))
+ZSTD_DICT_SAMPLES = int(os.environ.get("GRAPH_ZSTD_DICT_SAMPLES", "20000"))
+
+# Machine-readable report on stage timings and memory use of a parser run,
+# relative to the zavod data path (next to `export/index.json`).
+RUN_REPORT = os.environ.get("GRAPH_RUN_REPORT", "export/run.json")
+
+# Opt-in profiling of parser runs: `cprofile` writes `profile.pstats`, `sample`
+# writes stack samples in the folded format (flamegraph.pl, speedscope).
+PROFILE = os.environ.get("GRAPH_PROFILE")
+
+# Parse BODS files in fast mode (see `common.bods.parse_statements`). Set to
+# `0` to audit every statement and log each unknown identifier scheme.
+BODS_FAST = os.environ.get("GRAPH_BODS_FAST", "1") != "0"
+
+# Directory for the ownership graph index written while BODS files are parsed
+# (see `common.ownership`), relative to the zavod data path. Empty to disable.
+OWNERSHIP_INDEX = os.environ.get("GRAPH_OWNERSHIP_INDEX", "export/ownership")
+
+# Sorted index of the registration numbers, LEIs, OpenCorporates URLs and INNs
+# of all emitted entities (see `common.identifiers`), relative to the zavod
+# data path. Empty to disable.
+IDENTIFIER_INDEX = os.environ.get("GRAPH_IDENTIFIER_INDEX", "export/identifiers.tsv")
+
+# Size of the buffer that JSON fragments are collected in before they are
+# written out (see `common.sinks.BatchedJSONEntitySink`).
+EMIT_BUFFER = int(os.environ.get("GRAPH_EMIT_BUFFER", str(1024 * 1024)))
+
+# Clean country values through the precomputed table in `common/countries.json`
+# before asking the followthemoney registry (see `common.countries`). Set to
+# `0` to use the registry only.
+COUNTRY_TABLE = os.environ.get("GRAPH_COUNTRY_TABLE", "1") != "0"
+
+# Number of resources downloaded ahead of the one being parsed by crawlers
+# that use `common.prefetch`, and the disk space (in bytes, by the size the
+# server reports) that files waiting to be parsed may take up before no more
+# downloads are started.
+PREFETCH_AHEAD = int(os.environ.get("GRAPH_PREFETCH_AHEAD", "2"))
+PREFETCH_BUDGET = int(os.environ.get("GRAPH_PREFETCH_BUDGET", str(20 * 1024**3)))
+
+# Resumable downloads (see `common.download`): files larger than twice the
+# segment size (in bytes) are fetched over up to `DOWNLOAD_SEGMENTS` parallel
+# range requests, and interrupted transfers are resumed this many times.
+DOWNLOAD_SEGMENTS = int(os.environ.get("GRAPH_DOWNLOAD_SEGMENTS", "4"))
+DOWNLOAD_SEGMENT_SIZE = int(
+    os.environ.get("GRAPH_DOWNLOAD_SEGMENT_SIZE", str(64 * 1024 * 1024))
+)
+DOWNLOAD_RETRIES = int(os.environ.get("GRAPH_DOWNLOAD_RETRIES", "5"))
@@ -0,0 +1,345 @@
+import os
+import orjson
+import zstandard
+from pathlib import Path
+from contextlib import ExitStack
+from typing import BinaryIO, Dict, List, Optional
+from followthemoney import model
+from followthemoney.cli.util import write_entity
+from nomenklatura.dataset import Dataset
+from nomenklatura.entity import CE, CompositeEntity
+from zavod.sinks.common import FileSink, Sink
+
+from common import settings
+from common.fragments import dict_path, is_msgpack, is_zstd
+from common.fragments import MAX_SHARDS, shard_of, shard_path, shard_paths
+from common.fragments import open_writer, pack_entity
+
+
+class _Buffer(object):
+    """Collects serialised fragments in memory before a dictionary is trained."""
+
+    def __init__(self) -> None:
+        self.samples: List[bytes] = []
+
+    def write(self, data: bytes) -> int:
+        self.samples.append(data)
+        return len(data)
+
+
+class ZstdEntitySink(FileSink[CE]):
+    """Write entity fragments as zstd-compressed JSON lines.
+
+    If `dict_size` is set, the first `dict_samples` fragments are held back
+    and used to train a compression dictionary, which is stored next to the
+    output file (see `common.fragments.dict_path`) and used for the whole
+    stream. FtM fragments are small and repetitive, so this helps the ratio
+    noticeably at low compression levels."""
+
+    def __init__(
+        self,
+        path: Path,
+        level: int = settings.ZSTD_LEVEL,
+        dict_size: int = settings.ZSTD_DICT_SIZE,
+        dict_samples: int = settings.ZSTD_DICT_SAMPLES,
+    ) -> None:
+        super().__init__(path)
+        self.level = level
+        self.dict_size = dict_size
+        self.dict_samples = dict_samples
+        self.buffer: Optional[_Buffer] = _Buffer() if dict_size > 0 else None
+        self.writer: Optional[BinaryIO] = None
+
+    def open(self, dict_data: Optional[zstandard.ZstdCompressionDict]) -> BinaryIO:
+        self.fh = open(self.path, "wb")
+        cctx = zstandard.ZstdCompressor(level=self.level, dict_data=dict_data)
+        return cctx.stream_writer(self.fh, closefd=False)
+
+    def train(self) -> None:
+        """Train the dictionary on the buffered fragments and flush them."""
+        if self.buffer is None:
+            return
+        samples, self.buffer = self.buffer.samples, None
+        dict_data: Optional[zstandard.ZstdCompressionDict] = None
+        dpath = dict_path(Path(self.path))
+        dpath.unlink(missing_ok=True)
+        try:
+            dict_data = zstandard.train_dictionary(self.dict_size, samples)
+            dpath.write_bytes(dict_data.as_bytes())
+        except zstandard.ZstdError:
+            # Too few samples to train on; this is a small file anyway.
+            dict_data = None
+        self.writer = self.open(dict_data)
+        for sample in samples:
+            self.writer.write(sample)
+
+    def emit(self, entity: CE) -> None:
+        with self.lock:
+            if self.buffer is not None:
+                write_entity(self.buffer, entity)  # type: ignore
+                if len(self.buffer.samples) >= self.dict_samples:
+                    self.train()
+                return
+            if self.writer is None:
+                self.writer = self.open(None)
+            write_entity(self.writer, entity)
+
+    def close(self) -> None:
+        with self.lock:
+            if self.buffer is not None:
+                self.train()
+            if self.writer is not None:
+                self.writer.close()
+                self.writer = None
+            super().close()
+
+    def __repr__(self) -> str:
+        return f"<ZstdEntitySink({self.path!r})>"
+
+
+class MsgPackEntitySink(FileSink[CE]):
+    """Write entity fragments as msgpack records, for pipelines where the sort
+    and aggregate stages read them back in Python (see `common.fragments`)
+    instead of re-parsing JSON lines."""
+
+    def __init__(self, path: Path) -> None:
+        super().__init__(path)
+        self.stack: Optional[ExitStack] = None
+        self.writer: Optional[BinaryIO] = None
+
+    def emit(self, entity: CE) -> None:
+        with self.lock:
+            if self.writer is None:
+                self.stack = ExitStack()
+                self.writer = self.stack.enter_context(open_writer(Path(self.path)))
+            self.writer.write(pack_entity(entity))
+
+    def close(self) -> None:
+        with self.lock:
+            if self.stack is not None:
+                self.stack.close()
+                self.stack = None
+                self.writer = None
+            super().close()
+
+    def __repr__(self) -> str:
+        return f"<MsgPackEntitySink({self.path!r})>"
+
+
+def serialize_entity(entity: CE) -> bytes:
+    """Serialise a fragment as a JSON line, byte-for-byte the same as
+    `followthemoney.cli.util.write_entity`."""
+    data = entity.to_dict()
+    if next(iter(data)) != "id":
+        entity_id = data.pop("id")
+        data = {"id": entity_id, **data}
+    assert data["id"] is not None, data
+    return orjson.dumps(data, option=orjson.OPT_APPEND_NEWLINE)
+
+
+class CollectingSink(Sink[CE]):
+    """Keep the serialised fragments in memory, for a worker process to hand
+    them back to the parent (see `common.parallel`)."""
+
+    def __init__(self) -> None:
+        super().__init__("<memory>")
+        self.lines: List[bytes] = []
+
+    def emit(self, entity: CE) -> None:
+        self.lines.append(serialize_entity(entity))
+
+    def take(self) -> List[bytes]:
+        lines, self.lines = self.lines, []
+        return lines
+
+    def __repr__(self) -> str:
+        return "<CollectingSink()>"
+
+
+def _write_all(fh: BinaryIO, data: bytes) -> None:
+    """Write all of `data` to an unbuffered file, whose `write` may write
+    less than it was given (e.g. when interrupted by a signal)."""
+    view = memoryview(data)
+    while len(view):
+        view = view[fh.write(view) :]
+
+
+class BatchedJSONEntitySink(FileSink[CE]):
+    """Write entity fragments as JSON lines through a preallocated buffer,
+    which is written to the (unbuffered) file each time it fills up, instead
+    of passing every fragment through the buffered file object."""
+
+    def __init__(self, path: Path, flush_size: int = settings.EMIT_BUFFER) -> None:
+        super().__init__(path)
+        self.buffer = bytearray(flush_size)
+        self.view = memoryview(self.buffer)
+        self.pos = 0
+
+    def flush(self) -> None:
+        with self.lock:
+            if self.pos > 0 and self.fh is not None:
+                _write_all(self.fh, self.view[: self.pos])
+            self.pos = 0
+
+    def emit(self, entity: CE) -> None:
+        data = serialize_entity(entity)
+        size = len(data)
+        with self.lock:
+            if self.fh is None:
+                self.fh = open(self.path, "wb", buffering=0)
+            end = self.pos + size
+            if end > len(self.buffer):
+                self.flush()
+                if size > len(self.buffer):
+                    _write_all(self.fh, data)
+                    return
+                end = size
+            self.view[self.pos : end] = data
+            self.pos = end
+
+    def close(self) -> None:
+        with self.lock:
+            self.flush()
+            super().close()
+
+    def __repr__(self) -> str:
+        return f"<BatchedJSONEntitySink({self.path!r})>"
+
+
+class ShardedSink(Sink[CE]):
+    """Partition fragments into `shards` files by a hash of the entity ID (see
+    `common.fragments.shard_of`), so that each file can be sorted and
+    aggregated on its own (`python -m common.fragments aggregate-shards`)."""
+
+    def __init__(self, path: Path, shards: int) -> None:
+        if shards > MAX_SHARDS:
+            raise ValueError("Too many shards: %d (max. %d)" % (shards, MAX_SHARDS))
+        super().__init__(path)
+        self.paths = [shard_path(path, shard) for shard in range(shards)]
+        self.sinks = [make_sink(shard, shards=1) for shard in self.paths]
+
+    def emit(self, entity: CE) -> None:
+        assert entity.id is not None, entity
+        self.sinks[shard_of(entity.id, len(self.sinks))].emit(entity)
+
+    def close(self) -> None:
+        for sink in self.sinks:
+            sink.close()
+
+    def __repr__(self) -> str:
+        return f"<ShardedSink({self.path!r}, {len(self.sinks)})>"
+
+
+class AggregatingSink(Sink[CE]):
+    """Aggregate the fragments of a small run in memory and write the export
+    directly, skipping the fragment file, `sort` and `nk sorted-aggregate`.
+
+    Fragments are kept as serialised lines grouped by entity ID. On `close`,
+    the entities are merged and written in the order that `sort` (in the C
+    locale) would put their lines in, so the export is the same as the one
+    from the sorted path. Once more than `limit` fragments have been emitted,
+    the held fragments are passed on to `sink` along with all later ones,
+    and the fragment file is sorted and aggregated as usual.
+
+    The export is written to a temporary file and renamed once complete. A
+    failed run should `discard` the sink instead of closing it, so that it
+    does not leave an export of the fragments emitted before the error."""
+
+    def __init__(
+        self, sink: Sink[CE], export_path: Path, limit: int, dataset: Dataset
+    ) -> None:
+        super().__init__(sink.path)
+        self.sink = sink
+        self.export_path = export_path
+        self.limit = limit
+        self.dataset = dataset
+        self.count = 0
+        self.fragments: Optional[Dict[str, List[bytes]]] = {}
+
+    def spill(self) -> None:
+        """Pass the held fragments on to the wrapped sink. Statements are not
+        serialised with their dataset, so it has to be given again."""
+        if self.fragments is None:
+            return
+        fragments, self.fragments = self.fragments, None
+        for lines in fragments.values():
+            for line in lines:
+                data = orjson.loads(line)
+                self.sink.emit(
+                    CompositeEntity.from_dict(
+                        model, data, cleaned=True, default_dataset=self.dataset
+                    )
+                )
+
+    def emit(self, entity: CE) -> None:
+        if self.fragments is None:
+            self.sink.emit(entity)
+            return
+        self.count += 1
+        if self.count > self.limit:
+            self.spill()
+            self.sink.emit(entity)
+            return
+        assert entity.id is not None, entity
+        line = serialize_entity(entity)
+        lines = self.fragments.get(entity.id)
+        if lines is None:
+            self.fragments[entity.id] = [line]
+        else:
+            lines.append(line)
+
+    def write(self) -> None:
+        assert self.fragments is not None
+        # Lines sort by their `{"id":"…",` prefix first, i.e. by the JSON
+        # encoded IDs, then by their content for fragments of the same ID:
+        keys = sorted(self.fragments, key=orjson.dumps)
+        self.export_path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.export_path.with_name(self.export_path.name + ".tmp")
+        try:
+            with open(tmp_path, "wb") as fh:
+                for key in keys:
+                    entity: Optional[CompositeEntity] = None
+                    for line in sorted(self.fragments[key]):
+                        data = orjson.loads(line)
+                        fragment = CompositeEntity.from_dict(model, data, cleaned=True)
+                        entity = fragment if entity is None else entity.merge(fragment)
+                    write_entity(fh, entity)
+            os.replace(tmp_path, self.export_path)
+        finally:
+            tmp_path.unlink(missing_ok=True)
+
+    def discard(self) -> None:
+        """Drop the held fragments of a failed run without writing them."""
+        self.fragments = None
+
+    def close(self) -> None:
+        if self.fragments is None:
+            self.sink.close()
+            return
+        self.write()
+        self.fragments = None
+        # Don't leave fragments from a previous run for the sorted path:
+        for path in getattr(self.sink, "paths", [self.path]):
+            Path(path).unlink(missing_ok=True)
+        self.sink.close()
+
+    def __repr__(self) -> str:
+        return f"<AggregatingSink({self.sink!r}, {self.limit})>"
+
+
+def make_sink(path: Path, shards: int = settings.SHARDS) -> Sink:
+    """Pick a fragment sink based on the suffix of the output path, writing
+    `shards` files if there is more than one."""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    # A previous run may have written more shards, or different ones, which
+    # `aggregate-shards` would pick up instead of (or along with) this run's:
+    for stale in shard_paths(path):
+        stale.unlink()
+        dict_path(stale).unlink(missing_ok=True)
+    if shards > 1:
+        return ShardedSink(path, shards)
+    if is_msgpack(path):
+        return MsgPackEntitySink(path)
+    if is_zstd(path):
+        return ZstdEntitySink(path)
+    return BatchedJSONEntitySink(path)
@@ -0,0 +1,278 @@
+"""Stream the records of large XML files with flat memory use.
+
+`iterparse` builds the whole document as it goes, and `el.clear()` only
+empties a record: the element itself stays attached to its parent, so a file
+with millions of records still leaves millions of empty shells in memory.
+`iter_records` clears each record once the caller is done with it (including
+when the loop body `continue`s, `break`s or raises) and also detaches it, and
+anything before it, from the parent element.
+
+`RecordFile` splits a file of records into byte ranges at record boundaries,
+which can then be streamed separately, e.g. in worker processes.
+"""
+
+from pathlib import Path
+from typing import BinaryIO, Dict, Generator, Iterable, List, Optional, Tuple
+from lxml import etree
+from lxml.etree import _Element as Element
+
+
+def qualify(tag: str, namespace: Optional[str] = None) -> str:
+    """The Clark notation (`{namespace}tag`) of a tag name."""
+    if namespace is None:
+        return tag
+    return "{%s}%s" % (namespace, tag)
+
+
+class Namespace(object):
+    """Qualify the tag names in ElementPath expressions with a namespace, so
+    that namespaced documents can be queried without rewriting their tags:
+    `Namespace(uri)("Entity/LegalName")` gives `{uri}Entity/{uri}LegalName`.
+    The default, `*`, matches a tag in any namespace (or none). Qualified
+    paths are cached, so this can be called for every lookup."""
+
+    def __init__(self, uri: str = "*") -> None:
+        self.uri = uri
+        self.paths: Dict[str, str] = {}
+
+    def qualify_step(self, step: str) -> str:
+        if step in ("", ".", "..", "*") or step[0] in "{@":
+            return step
+        return "{%s}%s" % (self.uri, step)
+
+    def __call__(self, path: str) -> str:
+        qualified = self.paths.get(path)
+        if qualified is None:
+            qualified = "/".join(self.qualify_step(s) for s in path.split("/"))
+            self.paths[path] = qualified
+        return qualified
+
+    def __repr__(self) -> str:
+        return "<Namespace(%r)>" % self.uri
+
+
+class TagIndex(object):
+    """Elements grouped by tag in a single pass, to replace a run of `find`,
+    `findall` and `findtext` calls with simple paths on the same element.
+    Each of those calls parses its path and walks the children again, while
+    a lookup in the index is a dict access. With `local`, elements are
+    indexed by tag name without the namespace."""
+
+    __slots__ = ("tags",)
+
+    def __init__(self, elements: Iterable[Element], local: bool = False) -> None:
+        self.tags: Dict[str, List[Element]] = {}
+        for el in elements:
+            tag = el.tag
+            if local and tag[0] == "{":
+                tag = tag[tag.index("}") + 1 :]
+            found = self.tags.get(tag)
+            if found is None:
+                self.tags[tag] = [el]
+            else:
+                found.append(el)
+
+    @classmethod
+    def children(cls, el: Element, local: bool = False) -> "TagIndex":
+        """Index the child elements (`./tag`) of `el`."""
+        return cls(el.iterchildren(etree.Element), local=local)
+
+    @classmethod
+    def descendants(cls, el: Element, local: bool = False) -> "TagIndex":
+        """Index all elements below `el` (`.//tag`), in document order."""
+        return cls(el.iterdescendants(etree.Element), local=local)
+
+    def find(self, tag: str) -> Optional[Element]:
+        found = self.tags.get(tag)
+        return found[0] if found is not None else None
+
+    def findall(self, tag: str) -> List[Element]:
+        return self.tags.get(tag, [])
+
+    def findtext(self, tag: str) -> Optional[str]:
+        """Like `findtext`: the text of the first `tag` element, an empty
+        string if it has none and `None` if there is no such element."""
+        found = self.tags.get(tag)
+        if found is None:
+            return None
+        return found[0].text or ""
+
+    def get(self, tag: str, attr: str) -> Optional[str]:
+        """An attribute of the first `tag` element."""
+        found = self.tags.get(tag)
+        if found is None:
+            return None
+        return found[0].get(attr)
+
+    def __repr__(self) -> str:
+        return "<TagIndex(%r)>" % list(self.tags)
+
+
+def strip_namespace(el: Element) -> Element:
+    """Remove namespaces from the tags and attribute names of an element and
+    its descendants, in place. Unlike `zavod.parse.remove_namespace`, this
+    does not build a `QName` for every tag, and leaves the namespace map
+    alone instead of cleaning it up."""
+    for node in el.iter(etree.Element):
+        tag = node.tag
+        if tag[0] == "{":
+            node.tag = tag[tag.index("}") + 1 :]
+        if len(node.attrib):
+            attrib = node.attrib
+            for key in [k for k in attrib if k[0] == "{"]:
+                attrib[key[key.index("}") + 1 :]] = attrib.pop(key)
+    return el
+
+
+def release(el: Element) -> None:
+    """Free a record and the records before it."""
+    el.clear(keep_tail=False)
+    parent = el.getparent()
+    if parent is None:
+        return
+    while el.getprevious() is not None:
+        del parent[0]
+
+
+def iter_records(
+    fh: BinaryIO,
+    tag: str,
+    namespace: Optional[str] = None,
+    strip: bool = False,
+) -> Generator[Element, None, None]:
+    """Yield each `tag` element (in `namespace`) of the file once it has been
+    parsed completely, and release it when the next one is asked for. With
+    `strip`, namespaces are removed from the tags of each record."""
+    events = etree.iterparse(fh, events=("end",), tag=qualify(tag, namespace))
+    for _, el in events:
+        if strip:
+            strip_namespace(el)
+        try:
+            yield el
+        finally:
+            release(el)
+
+
+class _RangeReader(object):
+    """A file-like view of `header`, then bytes `start` to `end` of `fh`, then
+    `trailer`, for `iterparse`."""
+
+    def __init__(
+        self, fh: BinaryIO, header: bytes, start: int, end: int, trailer: bytes
+    ) -> None:
+        fh.seek(start)
+        self.fh = fh
+        self.parts = [header, trailer]
+        self.remaining = end - start
+        self.offset = 0
+
+    def read(self, size: int = -1) -> bytes:
+        if self.parts[0]:
+            data, self.parts[0] = self.parts[0], b""
+            return data
+        if self.remaining > 0:
+            if size < 0 or size > self.remaining:
+                size = self.remaining
+            data = self.fh.read(size)
+            self.remaining -= len(data)
+            self.offset += len(data)
+            if len(data):
+                return data
+            self.remaining = 0
+        data, self.parts[1] = self.parts[1], b""
+        return data
+
+    def tell(self) -> int:
+        return self.offset
+
+
+class RecordFile(object):
+    """The layout of an XML file of `tag` records, to parse byte ranges of it
+    on their own. A range starts at the opening tag of a record and is parsed
+    between the bytes before the first record (the XML declaration and the
+    opening root tag) and those after the last one (the closing root tag),
+    so the encoding and namespace declarations of the file still apply.
+
+    Records are found by their opening and closing tags in the raw bytes, so
+    `tag` must be ASCII and used without a namespace prefix, and records must
+    not be nested."""
+
+    def __init__(
+        self,
+        path: Path,
+        tag: str,
+        namespace: Optional[str] = None,
+        block_size: int = 1024 * 1024,
+    ) -> None:
+        self.path = path
+        self.tag = tag
+        self.namespace = namespace
+        self.block_size = block_size
+        self.opening = ("<%s" % tag).encode("ascii")
+        self.closing = ("</%s>" % tag).encode("ascii")
+        self.size = path.stat().st_size
+        with open(path, "rb") as fh:
+            self.start = self.find_record(fh, 0)
+            self.end = max(self.start, self.find_end(fh))
+            fh.seek(0)
+            self.header = fh.read(self.start)
+            fh.seek(self.end)
+            self.trailer = fh.read()
+
+    def find_record(self, fh: BinaryIO, offset: int) -> int:
+        """The offset of the first record that starts at or after `offset`, or
+        the end of the file."""
+        overlap = len(self.opening)
+        fh.seek(offset)
+        block = b""
+        while True:
+            data = fh.read(self.block_size)
+            # Keep the end of the last block, for a tag across the boundary:
+            kept = block[-overlap:]
+            offset += len(block) - len(kept)
+            block = kept + data
+            pos = block.find(self.opening)
+            while pos != -1 and pos + overlap < len(block):
+                if block[pos + overlap] in b" \t\r\n/>":
+                    return offset + pos
+                pos = block.find(self.opening, pos + 1)
+            if not len(data):
+                return self.size
+
+    def find_end(self, fh: BinaryIO) -> int:
+        """The offset after the closing tag of the last record, or 0."""
+        end = self.size
+        while end > 0:
+            start = max(0, end - self.block_size)
+            fh.seek(start)
+            block = fh.read(end - start + len(self.closing))
+            pos = block.rfind(self.closing)
+            if pos != -1:
+                return start + pos + len(self.closing)
+            end = start
+        return 0
+
+    def chunks(self, size: int) -> List[Tuple[int, int]]:
+        """Split the records into byte ranges of roughly `size` bytes."""
+        ranges: List[Tuple[int, int]] = []
+        with open(self.path, "rb") as fh:
+            start = self.start
+            while start < self.end:
+                end = min(self.end, self.find_record(fh, start + size))
+                ranges.append((start, end))
+                start = end
+        return ranges
+
+    def records(
+        self, start: int, end: int, strip: bool = False
+    ) -> Generator[Element, None, None]:
+        """Stream the records in the byte range from `start` to `end` like
+        `iter_records`."""
+        with open(self.path, "rb") as fh:
+            reader = _RangeReader(fh, self.header, start, end, self.trailer)
+            yield from iter_records(
+                reader, self.tag, self.namespace, strip=strip  # type: ignore
+            )
+
+    def __repr__(self) -> str:
+        return "<RecordFile(%r, %r)>" % (str(self.path), self.tag)
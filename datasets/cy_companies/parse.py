@@ -1,14 +1,17 @@
 import csv
-from typing import Dict, Optional
+from typing import Dict, Optional, Tuple
 from datetime import datetime
-from io import TextIOWrapper
-from zipfile import ZipFile
 from normality import collapse_spaces
-from zavod import Zavod, init_context
+from zavod import Zavod
 from zavod.audit import audit_data
 
 from followthemoney.util import join_text
 
+from common.archive import Archive
+from common.context import init_context
+from common.ids import IdHasher, id_hasher
+from common.instrument import track
+
 NAME = "cy_companies"
 URL = "https://www.data.gov.cy/node/4016/dataset/download"
 TYPES = {"C": "HE", "P": "S", "O": "AE", "N": "BN", "B": "B"}
@@ -27,10 +30,9 @@ def company_id(org_type: str, reg_nr: str) -> Optional[str]:
     return f"oc-companies-cy-{org_type_oc}{reg_nr}".lower()
 
 
-def iter_rows(zip: ZipFile, name: str):
-    with zip.open(name, "r") as fh:
-        wrapper = TextIOWrapper(fh, encoding="utf-8-sig")
-        for row in csv.DictReader(wrapper):
+def iter_rows(archive: Archive, name: str):
+    with archive.open_text(name, encoding="utf-8-sig") as fh:
+        for row in csv.DictReader(fh):
             yield row
 
 
@@ -76,20 +78,31 @@ def parse_organisations(context: Zavod, rows, addresses: Dict[str, str]):
 
 def parse_officials(context: Zavod, rows):
     org_types = list(TYPES.keys())
+    ids = id_hasher(context)
+    links = ids.scope("Directorship")
+    # The officials of an organisation come in a run, so their IDs are made
+    # from hashers that have its type and number already:
+    org: Optional[Tuple[str, str]] = None
+    person_ids: IdHasher = ids
+    link_ids: IdHasher = links
     for row in rows:
         org_type = row.pop("ORGANISATION_TYPE_CODE")
         if org_type not in org_types:
             continue
         reg_nr = row.pop("REGISTRATION_NO")
+        if org != (org_type, reg_nr):
+            org = (org_type, reg_nr)
+            person_ids = ids.scope(org_type, reg_nr)
+            link_ids = links.scope(org_type, reg_nr)
         name = row.pop("PERSON_OR_ORGANISATION_NAME")
         position = row.pop("OFFICIAL_POSITION")
         entity = context.make("LegalEntity")
-        entity.id = context.make_id(org_type, reg_nr, name)
+        entity.id = person_ids.make_id(name)
         entity.add("name", name)
         context.emit(entity)
 
         link = context.make("Directorship")
-        link.id = context.make_id("Directorship", org_type, reg_nr, name, position)
+        link.id = link_ids.make_id(name, position)
         org_id = company_id(org_type, reg_nr)
         if org_id is None:
             context.log.error("Could not make ID", org_type=org_type, reg_nr=reg_nr)
@@ -119,19 +132,20 @@ def load_addresses(rows) -> Dict[str, str]:
 
 def parse(context: Zavod):
     data_path = context.fetch_resource("data.zip", URL)
-    with ZipFile(data_path, "r") as zip:
+    with Archive(data_path) as archive:
         addresses: Dict[str, str] = {}
-        for name in zip.namelist():
+        for name in archive.namelist():
             if name.startswith("registered_office_"):
-                addresses = load_addresses(iter_rows(zip, name))
+                rows = track(context, "Addresses", iter_rows(archive, name))
+                addresses = load_addresses(rows)
 
-        for name in zip.namelist():
+        for name in archive.namelist():
             context.log.info("Reading: %s in %s" % (name, data_path))
             if name.startswith("organisations_"):
-                rows = iter_rows(zip, name)
+                rows = track(context, "Organisations", iter_rows(archive, name))
                 parse_organisations(context, rows, addresses)
             if name.startswith("organisation_officials_"):
-                rows = iter_rows(zip, name)
+                rows = track(context, "Officials", iter_rows(archive, name))
                 parse_officials(context, rows)
 
 
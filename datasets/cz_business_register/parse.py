@@ -5,10 +5,14 @@ from typing import Optional
 
 from followthemoney.util import make_entity_id
 from lxml import etree
+from lxml.etree import _Element as Element
 from nomenklatura.entity import CE
-from zavod import Zavod, init_context
+from zavod import Zavod
 from zavod.parse import format_address
-from zavod.parse.xml import ElementOrTree, remove_namespace
+
+from common.context import init_context
+from common.instrument import track
+from common.xmlstream import TagIndex
 
 URL = "http://wwwinfo.mfcr.cz/ares/ares_vreo_all.tar.gz"
 
@@ -27,8 +31,16 @@ def person_id(context: Zavod, name: str, address: str, company_id: str) -> str:
     return context.make_slug("person", name, make_entity_id(company_id))
 
 
-def make_address(tree: Optional[ElementOrTree] = None) -> Optional[str]:
-    if tree is None:
+def children(el: Optional[Element]) -> TagIndex:
+    """The child elements of `el` by tag name, whatever the namespace (none
+    if there is no `el`)."""
+    if el is None:
+        return TagIndex(())
+    return TagIndex.children(el, local=True)
+
+
+def make_address(el: Optional[Element] = None) -> Optional[str]:
+    if el is None:
         return None
 
     components = {
@@ -40,8 +52,9 @@ def make_address(tree: Optional[ElementOrTree] = None) -> Optional[str]:
         "cisloTxt": "street_nr",
     }
     data = {}
-    for path, key in components.items():
-        data[key] = tree.findtext(path)
+    parts = children(el)
+    for tag, key in components.items():
+        data[key] = parts.findtext(tag)
 
     summary_parts = []
     street = " ".join((data.pop("street") or "", data.pop("street_nr") or "")).strip()
@@ -55,41 +68,46 @@ def make_address(tree: Optional[ElementOrTree] = None) -> Optional[str]:
     return format_address(**data)
 
 
-def make_company(context: Zavod, tree: ElementOrTree) -> CE:
-    tree = remove_namespace(tree)
-    name = tree.findtext(".//ObchodniFirma")
+def make_company(context: Zavod, doc: TagIndex) -> CE:
+    name = doc.findtext("ObchodniFirma")
     proxy = context.make("Company")
-    reg_nr = tree.findtext(".//ICO")
+    reg_nr = doc.findtext("ICO")
     proxy.id = company_id(context, reg_nr, name)
     if proxy.id is not None:
         proxy.add("name", name)
         proxy.add("registrationNumber", reg_nr)
-        proxy.add("address", make_address(tree.find(".//Sidlo")))
-        proxy.add("incorporationDate", tree.findtext(".//DatumZapisu"))
-        proxy.add("dissolutionDate", tree.findtext(".//DatumVymazu"))
+        proxy.add("address", make_address(doc.find("Sidlo")))
+        proxy.add("incorporationDate", doc.findtext("DatumZapisu"))
+        proxy.add("dissolutionDate", doc.findtext("DatumVymazu"))
         return proxy
 
 
 def parse_xml(context: Zavod, reader: BufferedReader):
     tree = etree.parse(reader)
-    company = make_company(context, tree)
+    # All elements of the document by tag name, matched in any namespace
+    # instead of rewriting every tree:
+    doc = TagIndex.descendants(tree.getroot(), local=True)
+    company = make_company(context, doc)
     if company is not None:
         context.emit(company)
-        for member in tree.findall(".//Clen"):
+        for member in doc.findall("Clen"):
             proxy = context.make("Person")
-            first_name = member.findtext("fosoba/jmeno")
-            last_name = member.findtext("fosoba/prijmeni")
+            parts = children(member)
+            person = children(parts.find("fosoba"))
+            first_name = person.findtext("jmeno")
+            last_name = person.findtext("prijmeni")
             proxy.add("firstName", first_name)
             proxy.add("lastName", last_name)
             if first_name and last_name:
                 proxy.add("name", " ".join((first_name, last_name)))
-            address = make_address(member.find(".//adresa"))
+            nested = TagIndex.descendants(member, local=True)
+            address = make_address(nested.find("adresa"))
             proxy.add("address", address)
             proxy.id = person_id(context, proxy.caption, address, company.id)
             if proxy.id is not None:
                 context.emit(proxy)
 
-                role = member.findtext("funkce/nazev")
+                role = children(parts.find("funkce")).findtext("nazev")
                 if role is not None:
                     rel = context.make("Directorship")
                     rel.id = context.make_slug("directorship", company.id, proxy.id)
@@ -101,18 +119,10 @@ def parse_xml(context: Zavod, reader: BufferedReader):
 
 def parse(context: Zavod):
     data_path = context.fetch_resource("data.tar.gz", URL)
-    ix = 0
     with tarfile.open(data_path, "r:gz") as f:
-        archive_member = f.next()
-        while archive_member is not None:
-            ix += 1
+        for archive_member in track(context, "Parse item", f, source=f.fileobj):
             res = f.extractfile(archive_member)
             parse_xml(context, res)
-            archive_member = f.next()
-            if ix and ix % 10_000 == 0:
-                context.log.info("Parse item %d ..." % ix)
-    if ix:
-        context.log.info("Parsed %d items." % (ix + 1), fp=data_path.name)
 
 
 if __name__ == "__main__":
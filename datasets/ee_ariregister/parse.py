@@ -4,7 +4,10 @@ from typing import Any, Callable, Optional, Tuple
 import ijson
 from followthemoney.util import make_entity_id
 from nomenklatura.entity import CE
-from zavod import Zavod, init_context
+from zavod import Zavod
+
+from common.context import init_context
+from common.instrument import track
 
 # https://avaandmed.ariregister.rik.ee/en/downloading-open-data
 SOURCES = {
@@ -181,15 +184,10 @@ def parse_bfo(context: Zavod, row: dict):
 
 def parse_json(context: Zavod, source: str, handler: Callable):
     data_path = context.get_resource_path(source)
-    ix = 0
     with open(data_path, "r") as f:
         items = ijson.items(f, "item")
-        for ix, item in enumerate(items):
+        for item in track(context, f"Parse ijson item [{source}]", items, source=f):
             handler(context, item)
-            if ix and ix % 10_000 == 0:
-                context.log.info("Parse ijson item %d ..." % ix)
-    if ix:
-        context.log.info("Parsed %d ijson items." % (ix + 1), fp=data_path.name)
 
 
 def parse(context: Zavod):
@@ -1,19 +1,25 @@
 import csv
 import json
-from typing import Optional
+from typing import Optional, Union
+from pathlib import Path
 from lxml import html
-from zipfile import ZipFile
 from functools import cache, lru_cache
-from io import TextIOWrapper
 from datetime import datetime
 from urllib.parse import urljoin
 from concurrent.futures import ThreadPoolExecutor, wait
-from followthemoney.types import registry
 from followthemoney.util import join_text
 
-from zavod import PathLike, init_context, Zavod
+from zavod import PathLike, Zavod
 from zavod.parse import format_address
 from zavod.audit import audit_data
+from nomenklatura.entity import CompositeEntity
+
+from common.archive import Archive
+from common.builder import Fragment, FragmentType
+from common.countries import clean_country
+from common.download import fetch_resource
+from common.context import init_context
+from common.instrument import track
 
 BASE_URL = "http://download.companieshouse.gov.uk/en_output.html"
 PSC_URL = "http://download.companieshouse.gov.uk/en_pscdata.html"
@@ -36,9 +42,8 @@ def company_id(context: Zavod, company_nr):
     return f"oc-companies-gb-{nr}"
 
 
-@cache
 def parse_country(name: str, default: Optional[str] = None) -> Optional[str]:
-    code = registry.country.clean(name)
+    code = clean_country(name)
     if code is None:
         return default
     return code
@@ -68,72 +73,72 @@ def get_base_data_url(context: Zavod):
 
 
 def read_base_data_csv(path: PathLike):
-    with ZipFile(path, "r") as zip:
-        for name in zip.namelist():
-            with zip.open(name, "r") as fh:
-                fhtext = TextIOWrapper(fh)
+    with Archive(path) as archive:
+        for name in archive.namelist():
+            with archive.open_text(name) as fhtext:
                 for row in csv.DictReader(fhtext):
                     yield {k.strip(): v for (k, v) in row.items()}
 
 
-def parse_base_data(context: Zavod):
+def fetch_base_data(context: Zavod) -> Path:
     base_data_url = get_base_data_url(context)
     if base_data_url is None:
         raise RuntimeError("Base data zip URL not found!")
-    data_path = context.fetch_resource("base_data.zip", base_data_url)
+    return fetch_resource(context, "base_data.zip", base_data_url)
 
+
+def parse_base_data(context: Zavod, data_path: PathLike):
     context.log.info("Loading: %s" % data_path)
-    for idx, row in enumerate(read_base_data_csv(data_path)):
-        if idx > 0 and idx % 10000 == 0:
-            context.log.info("Companies: %d..." % idx)
-        # if idx > 0 and idx % 1000000 == 0:
-        #     return
+    companies = FragmentType("Company", context.dataset, jurisdiction="gb")
+    for row in track(context, "Companies", read_base_data_csv(data_path)):
         company_nr = row.pop("CompanyNumber")
-        entity = context.make("Company")
-        entity.id = company_id(context, company_nr)
-        entity.add("name", row.pop("CompanyName"))
-        entity.add("registrationNumber", company_nr)
-        entity.add("status", row.pop("CompanyStatus"))
-        entity.add("legalForm", row.pop("CompanyCategory"))
-        entity.add("country", row.pop("CountryOfOrigin"))
-        entity.add("jurisdiction", "gb")
-
-        oc_url = f"https://opencorporates.com/companies/gb/{company_nr}"
-        entity.add("opencorporatesUrl", oc_url)
-        # entity.add("sourceUrl", row.pop("URI"))
-
-        for i in range(1, 5):
-            sector = row.pop(f"SICCode.SicText_{i}")
-            entity.add("sector", clean_sector(sector))
-        inc_date = parse_date(row.pop("IncorporationDate"))
-        entity.add("incorporationDate", inc_date)
-        dis_date = parse_date(row.pop("DissolutionDate"))
-        entity.add("dissolutionDate", dis_date)
-
-        for i in range(1, 11):
-            row.pop(f"PreviousName_{i}.CONDATE")
-            entity.add("previousName", row.pop(f"PreviousName_{i}.CompanyName"))
-
-        country_code = parse_country(row.pop("RegAddress.Country"), default="gb")
-        street = join_text(
-            row.pop("RegAddress.AddressLine1"),
-            row.pop("RegAddress.AddressLine2"),
-        )
-        addr_text = format_address(
-            summary=row.pop("RegAddress.CareOf"),
-            po_box=row.pop("RegAddress.POBox"),
-            street=street,
-            postal_code=row.pop("RegAddress.PostCode"),
-            county=row.pop("RegAddress.County"),
-            city=row.pop("RegAddress.PostTown"),
-            country_code=country_code,
-        )
-        entity.add("address", addr_text)
-
-        # pprint(entity.to_dict())
+        entity = companies.make(company_id(context, company_nr))
+        add_base_data(entity, company_nr, row)
         context.emit(entity)
 
 
+def add_base_data(entity: Union[Fragment, CompositeEntity], company_nr, row):
+    """Add the fields of a base data row to a company (either a fragment or a
+    full entity, see `benchmarks/builder.py`)."""
+    entity.add("name", row.pop("CompanyName"))
+    entity.add("registrationNumber", company_nr)
+    entity.add("status", row.pop("CompanyStatus"))
+    entity.add("legalForm", row.pop("CompanyCategory"))
+    entity.add("country", row.pop("CountryOfOrigin"))
+
+    oc_url = f"https://opencorporates.com/companies/gb/{company_nr}"
+    entity.add("opencorporatesUrl", oc_url)
+    # entity.add("sourceUrl", row.pop("URI"))
+
+    for i in range(1, 5):
+        sector = row.pop(f"SICCode.SicText_{i}")
+        entity.add("sector", clean_sector(sector))
+    inc_date = parse_date(row.pop("IncorporationDate"))
+    entity.add("incorporationDate", inc_date)
+    dis_date = parse_date(row.pop("DissolutionDate"))
+    entity.add("dissolutionDate", dis_date)
+
+    for i in range(1, 11):
+        row.pop(f"PreviousName_{i}.CONDATE")
+        entity.add("previousName", row.pop(f"PreviousName_{i}.CompanyName"))
+
+    country_code = parse_country(row.pop("RegAddress.Country"), default="gb")
+    street = join_text(
+        row.pop("RegAddress.AddressLine1"),
+        row.pop("RegAddress.AddressLine2"),
+    )
+    addr_text = format_address(
+        summary=row.pop("RegAddress.CareOf"),
+        po_box=row.pop("RegAddress.POBox"),
+        street=street,
+        postal_code=row.pop("RegAddress.PostCode"),
+        county=row.pop("RegAddress.County"),
+        city=row.pop("RegAddress.PostTown"),
+        country_code=country_code,
+    )
+    entity.add("address", addr_text)
+
+
 def get_psc_data_url(context: Zavod):
     res = context.http.get(PSC_URL)
     doc = html.fromstring(res.text)
@@ -144,25 +149,23 @@ def get_psc_data_url(context: Zavod):
 
 
 def read_psc_data(path: PathLike):
-    with ZipFile(path, "r") as zip:
-        for name in zip.namelist():
-            with zip.open(name, "r") as fh:
-                fhtext = TextIOWrapper(fh)
+    with Archive(path) as archive:
+        for name in archive.namelist():
+            with archive.open_text(name) as fhtext:
                 while line := fhtext.readline():
                     yield json.loads(line)
 
 
-def parse_psc_data(context: Zavod):
+def fetch_psc_data(context: Zavod) -> Path:
     psc_data_url = get_psc_data_url(context)
     if psc_data_url is None:
         raise RuntimeError("PSC data zip URL not found!")
-    data_path = context.fetch_resource("psc_data.zip", psc_data_url)
+    return fetch_resource(context, "psc_data.zip", psc_data_url)
+
+
+def parse_psc_data(context: Zavod, data_path: PathLike):
     context.log.info("Loading: %s" % data_path)
-    for idx, row in enumerate(read_psc_data(data_path)):
-        if idx > 0 and idx % 10000 == 0:
-            context.log.info("PSC statements: %d..." % idx)
-        # if idx > 0 and idx % 1000000 == 0:
-        #     return
+    for row in track(context, "PSC statements", read_psc_data(data_path)):
         company_nr = row.pop("company_number", None)
         if company_nr is None:
             context.log.warning("No company number: %r" % row)
@@ -253,8 +256,8 @@ def parse_psc_data(context: Zavod):
 
 
 def parse_all(context: Zavod):
-    parse_base_data(context)
-    parse_psc_data(context)
+    parse_base_data(context, fetch_base_data(context))
+    parse_psc_data(context, fetch_psc_data(context))
     # with ThreadPoolExecutor(max_workers=3) as pool:
     #     base_fut = pool.submit(parse_base_data, context)
     #     psc_fut = pool.submit(parse_psc_data, context)
@@ -1,5 +1,4 @@
-from zavod import init_context
-
+from common.context import init_context
 from common.bods import parse_file
 
 if __name__ == "__main__":
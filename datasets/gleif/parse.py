@@ -4,17 +4,23 @@ from io import TextIOWrapper
 from pathlib import Path
 from typing import BinaryIO, Dict, List, Optional, Tuple, Union
 from urllib.parse import urljoin
-from zipfile import ZipFile
 
 from lxml import etree, html
 from normality import slugify
-from zavod import Zavod, init_context
-from zavod.parse import remove_namespace
+from zavod import Zavod
 from zavod.parse import format_address
 
+from common.archive import Archive
+from common.context import init_context
+from common.instrument import track
+from common.prefetch import prefetch
+from common.xmlstream import Namespace, TagIndex, iter_records
+
 UA = "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/111.0.0.0 Safari/537.36"
 LEI = "http://www.gleif.org/data/schema/leidata/2016"
 RR = "http://www.gleif.org/data/schema/rr/2016"
+L = Namespace(LEI)
+R = Namespace(RR)
 
 CAT_URL = "https://www.gleif.org/en/lei-data/gleif-concatenated-file/download-the-concatenated-file"
 BIC_URL = "https://mapping.gleif.org/api/v2/bic-lei/latest/download"
@@ -42,9 +48,9 @@ ADDRESS_PARTS: Dict[str, str] = {
 
 def make_address(el: etree._Element) -> str:
     parts: Dict[str, Union[str, None]] = {"summary": el.text}  # FirstAddressLine
-    parent = el.getparent()
+    parent = TagIndex.children(el.getparent())
     for tag, key in ADDRESS_PARTS.items():
-        parts[key] = parent.findtext(tag)
+        parts[key] = parent.findtext(L(tag))
     return format_address(**parts)
 
 
@@ -71,42 +77,27 @@ def parse_date(text: Optional[str]) -> Optional[str]:
     return text.split("T")[0]
 
 
-def fetch_cat_file(context: Zavod, url_part: str, name: str) -> Optional[Path]:
+def find_cat_url(context: Zavod, url_part: str) -> str:
     res = context.http.get(CAT_URL)
     doc = html.fromstring(res.text)
     for link in doc.findall(".//a"):
         url = urljoin(CAT_URL, link.get("href"))
         if url_part in url:
-            return context.fetch_resource(name, url)
+            return url
     context.log.info("Failed HTML", url=CAT_URL, html=res.text)
-    return None
-
-
-def fetch_lei_file(context: Zavod) -> Path:
-    path = fetch_cat_file(context, "/concatenated-files/lei2/get/", "lei.zip")
-    if path is None:
-        raise RuntimeError("Cannot find cat LEI2 file!")
-    return path
-
-
-def fetch_rr_file(context: Zavod) -> Path:
-    path = fetch_cat_file(context, "/concatenated-files/rr/get/", "rr.zip")
-    if path is None:
-        raise RuntimeError("Cannot find cat RR file!")
-    return path
+    raise RuntimeError("Cannot find cat file: %s" % url_part)
 
 
 @contextmanager
 def read_zip_file(context: Zavod, path: Path):
-    with ZipFile(path, "r") as zip:
-        for name in zip.namelist():
+    with Archive(path) as archive:
+        for name in archive.namelist():
             context.log.info("Reading: %s in %s" % (name, path))
-            with zip.open(name, "r") as fh:
+            with archive.open(name) as fh:
                 yield fh
 
 
-def load_bic_mapping(context: Zavod) -> Dict[str, List[str]]:
-    zip_path = context.fetch_resource("bic_lei.zip", BIC_URL)
+def load_bic_mapping(context: Zavod, zip_path: Path) -> Dict[str, List[str]]:
     mapping: Dict[str, List[str]] = {}
     with read_zip_file(context, zip_path) as fh:
         textfh = TextIOWrapper(fh, encoding="utf-8")
@@ -121,8 +112,7 @@ def load_bic_mapping(context: Zavod) -> Dict[str, List[str]]:
     return mapping
 
 
-def load_oc_mapping(context: Zavod) -> Dict[str, List[str]]:
-    zip_path = context.fetch_resource("oc_lei.zip", OC_URL)
+def load_oc_mapping(context: Zavod, zip_path: Path) -> Dict[str, List[str]]:
     mapping: Dict[str, List[str]] = {}
     with read_zip_file(context, zip_path) as fh:
         textfh = TextIOWrapper(fh, encoding="utf-8")
@@ -138,8 +128,7 @@ def load_oc_mapping(context: Zavod) -> Dict[str, List[str]]:
     return mapping
 
 
-def load_isin_mapping(context: Zavod) -> Dict[str, List[str]]:
-    zip_path = context.fetch_resource("isin_lei.zip", ISIN_URL)
+def load_isin_mapping(context: Zavod, zip_path: Path) -> Dict[str, List[str]]:
     mapping: Dict[str, List[str]] = {}
     with read_zip_file(context, zip_path) as fh:
         textfh = TextIOWrapper(fh, encoding="utf-8")
@@ -154,31 +143,34 @@ def load_isin_mapping(context: Zavod) -> Dict[str, List[str]]:
     return mapping
 
 
-def parse_lei_file(context: Zavod, fh: BinaryIO) -> None:
+def parse_lei_file(
+    context: Zavod,
+    fh: BinaryIO,
+    bics: Dict[str, List[str]],
+    ocurls: Dict[str, List[str]],
+    isins: Dict[str, List[str]],
+) -> None:
     elfs = load_elfs()
-    bics = load_bic_mapping(context)
-    ocurls = load_oc_mapping(context)
-    isins = load_isin_mapping(context)
-    for idx, (_, el) in enumerate(etree.iterparse(fh, tag="{%s}LEIRecord" % LEI)):
-        if idx > 0 and idx % 10000 == 0:
-            context.log.info("Parse LEIRecord: %d..." % idx)
-        elc = remove_namespace(el)
+    records = iter_records(fh, "LEIRecord", LEI)
+    for idx, el in enumerate(track(context, "Parse LEIRecord", records, fh)):
         proxy = context.make("Organization")
-        lei = elc.findtext("LEI")
+        record = TagIndex.children(el)
+        lei = record.findtext(L("LEI"))
         if lei is None:
             continue
         proxy.id = lei_id(lei)
-        entity = elc.find("Entity")
-        if entity is None:
+        entity_el = record.find(L("Entity"))
+        if entity_el is None:
             continue
-        proxy.add("name", entity.findtext("LegalName"))
-        proxy.add("jurisdiction", entity.findtext("LegalJurisdiction"))
-        proxy.add("status", entity.findtext("EntityStatus"))
-        create_date = parse_date(entity.findtext("EntityCreationDate"))
+        entity = TagIndex.children(entity_el)
+        proxy.add("name", entity.findtext(L("LegalName")))
+        proxy.add("jurisdiction", entity.findtext(L("LegalJurisdiction")))
+        proxy.add("status", entity.findtext(L("EntityStatus")))
+        create_date = parse_date(entity.findtext(L("EntityCreationDate")))
         proxy.add("incorporationDate", create_date)
-        authority = entity.find("RegistrationAuthority")
+        authority = entity.find(L("RegistrationAuthority"))
         if authority is not None:
-            reg_id = authority.findtext("RegistrationAuthorityEntityID")
+            reg_id = authority.findtext(L("RegistrationAuthorityEntityID"))
             proxy.add("registrationNumber", reg_id)
 
         proxy.add("swiftBic", bics.get(lei))
@@ -190,36 +182,35 @@ def parse_lei_file(context: Zavod, fh: BinaryIO) -> None:
             security.id = f"lei-isin-{isin}"
             security.add("isin", isin)
             security.add("issuer", proxy.id)
-            security.add("country", entity.findtext("LegalJurisdiction"))
+            security.add("country", entity.findtext(L("LegalJurisdiction")))
             context.emit(security)
 
-        legal_form = entity.find("LegalForm")
+        legal_form = entity.find(L("LegalForm"))
         if legal_form is not None:
-            code = legal_form.findtext("EntityLegalFormCode")
+            code = legal_form.findtext(L("EntityLegalFormCode"))
             if code is not None:
                 proxy.add("legalForm", elfs.get(code))
-            proxy.add("legalForm", legal_form.findtext("OtherLegalForm"))
+            proxy.add("legalForm", legal_form.findtext(L("OtherLegalForm")))
 
-        registration = elc.find("Registration")
+        registration = record.find(L("Registration"))
         if registration is not None:
-            mod_date = parse_date(registration.findtext("LastUpdateDate"))
+            mod_date = parse_date(registration.findtext(L("LastUpdateDate")))
             proxy.add("modifiedAt", mod_date)
 
         # pprint(proxy.to_dict())
 
-        successor = elc.find("SuccessorEntity")
+        successor = record.find(L("SuccessorEntity"))
         if successor is not None:
-            succ_lei = successor.findtext("SuccessorLEI")
+            succ_lei = successor.findtext(L("SuccessorLEI"))
             succession = context.make("Succession")
             succession.id = f"lei-succession-{lei}-{succ_lei}"
             succession.add("predecessor", lei)
             succession.add("successor", lei_id(succ_lei))
             context.emit(succession)
 
-        for address_el in el.findall(".//FirstAddressLine"):
+        for address_el in el.iterdescendants(L("FirstAddressLine")):
             proxy.add("address", make_address(address_el))
 
-        el.clear()
         context.emit(proxy)
 
     if idx == 0:
@@ -227,34 +218,37 @@ def parse_lei_file(context: Zavod, fh: BinaryIO) -> None:
 
 
 def parse_rr_file(context: Zavod, fh: BinaryIO):
-    tag = "{%s}RelationshipRecord" % RR
-    for idx, (_, el) in enumerate(etree.iterparse(fh, tag=tag)):
-        if idx > 0 and idx % 10000 == 0:
-            context.log.info("Parse RelationshipRecord: %d..." % idx)
-        elc = remove_namespace(el)
-        # print(elc)
-        rel = elc.find("Relationship")
-        if rel is None:
+    records = track(
+        context,
+        "Parse RelationshipRecord",
+        iter_records(fh, "RelationshipRecord", RR),
+        fh,
+    )
+    for idx, el in enumerate(records):
+        # print(el)
+        rel_el = el.find(R("Relationship"))
+        if rel_el is None:
             continue
-        rel_type = rel.findtext("RelationshipType")
+        rel = TagIndex.children(rel_el)
+        rel_type = rel.findtext(R("RelationshipType"))
         rel_data = RELATIONSHIPS.get(rel_type)
         if rel_data is None:
             context.log.warn("Unknown relationship: %s", rel_type)
             continue
         rel_schema, start_prop, end_prop = rel_data
 
-        start_node = rel.find("StartNode")
-        start_node_type = start_node.findtext("NodeIDType")
+        start_node = rel.find(R("StartNode"))
+        start_node_type = start_node.findtext(R("NodeIDType"))
         if start_node_type != "LEI":
             context.log.warn("Unknown edge type", node_id_type=start_node_type)
             continue
-        start_lei = start_node.findtext("NodeID")
-        end_node = rel.find("EndNode")
-        end_node_type = end_node.findtext("NodeIDType")
+        start_lei = start_node.findtext(R("NodeID"))
+        end_node = rel.find(R("EndNode"))
+        end_node_type = end_node.findtext(R("NodeIDType"))
         if end_node_type != "LEI":
             context.log.warn("Unknown edge type", node_id_type=end_node_type)
             continue
-        end_lei = end_node.findtext("NodeID")
+        end_lei = end_node.findtext(R("NodeID"))
 
         proxy = context.make(rel_schema)
         rel_id = slugify(rel_type, sep="-")
@@ -262,23 +256,22 @@ def parse_rr_file(context: Zavod, fh: BinaryIO):
         proxy.add(start_prop, lei_id(start_lei))
         proxy.add(end_prop, lei_id(end_lei))
         proxy.add("role", rel_type.replace("_", " "))
-        proxy.add("status", rel.findtext("RelationshipStatus"))
+        proxy.add("status", rel.findtext(R("RelationshipStatus")))
 
-        for period in rel.findall(".//RelationshipPeriod"):
-            period_type = period.findtext("PeriodType")
+        for period in rel_el.iterdescendants(R("RelationshipPeriod")):
+            period_type = period.findtext(R("PeriodType"))
             if period_type == "RELATIONSHIP_PERIOD":
-                proxy.add("startDate", parse_date(period.findtext("StartDate")))
-                proxy.add("endDate", parse_date(period.findtext("EndDate")))
+                proxy.add("startDate", parse_date(period.findtext(R("StartDate"))))
+                proxy.add("endDate", parse_date(period.findtext(R("EndDate"))))
 
-        for quant in rel.findall(".//RelationshipQuantifier"):
-            amount = quant.findtext("QuantifierAmount")
-            units = quant.findtext("QuantifierUnits")
+        for quant in rel_el.iterdescendants(R("RelationshipQuantifier")):
+            amount = quant.findtext(R("QuantifierAmount"))
+            units = quant.findtext(R("QuantifierUnits"))
             if units == "PERCENTAGE" or units is None:
                 proxy.add("percentage", amount, quiet=True)
             else:
                 context.log.warn("Unknown rel quantifier", amount=amount, units=units)
 
-        el.clear()
         context.emit(proxy)
 
     if idx == 0:
@@ -286,12 +279,33 @@ def parse_rr_file(context: Zavod, fh: BinaryIO):
 
 
 def parse(context: Zavod):
-    lei_file = fetch_lei_file(context)
-    rr_file = fetch_rr_file(context)
-    with read_zip_file(context, lei_file) as fh:
-        parse_lei_file(context, fh)
-    with read_zip_file(context, rr_file) as fh:
-        parse_rr_file(context, fh)
+    lei_url = find_cat_url(context, "/concatenated-files/lei2/get/")
+    rr_url = find_cat_url(context, "/concatenated-files/rr/get/")
+    resources = [
+        ("bic_lei.zip", BIC_URL),
+        ("oc_lei.zip", OC_URL),
+        ("isin_lei.zip", ISIN_URL),
+        ("lei.zip", lei_url),
+        ("rr.zip", rr_url),
+    ]
+    # The next files are downloaded while the mappings are loaded, and the
+    # LEI file is parsed while the RR file is downloaded:
+    bics: Dict[str, List[str]] = {}
+    ocurls: Dict[str, List[str]] = {}
+    isins: Dict[str, List[str]] = {}
+    for name, path in prefetch(context, resources):
+        if name == "bic_lei.zip":
+            bics = load_bic_mapping(context, path)
+        elif name == "oc_lei.zip":
+            ocurls = load_oc_mapping(context, path)
+        elif name == "isin_lei.zip":
+            isins = load_isin_mapping(context, path)
+        elif name == "lei.zip":
+            with read_zip_file(context, path) as fh:
+                parse_lei_file(context, fh, bics, ocurls, isins)
+        elif name == "rr.zip":
+            with read_zip_file(context, path) as fh:
+                parse_rr_file(context, fh)
 
 
 if __name__ == "__main__":
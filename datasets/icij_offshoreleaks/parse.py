@@ -4,17 +4,20 @@ import click
 from typing import Dict
 from csv import DictReader
 from functools import cache, lru_cache
-from zipfile import ZipFile
 from datetime import datetime
 from normality import stringify, slugify
-from datapatch import get_lookups
-from zavod import Zavod, init_context
+from zavod import Zavod
 from zavod.logs import get_logger
 from zavod.audit import audit_data
 from nomenklatura.entity import CompositeEntity
 
 from followthemoney import model
-from followthemoney.types import registry
+
+from common.archive import Archive
+from common.context import init_context
+from common.countries import clean_country_text
+from common.lookups import CompiledLookup, compile_lookups, report_misses
+from common.instrument import track
 
 log = get_logger("offshoreleaks")
 
@@ -32,18 +35,15 @@ NODE_URL = "https://offshoreleaks.icij.org/nodes/%s"
 
 
 @cache
-def load_lookups():
+def load_lookups() -> Dict[str, CompiledLookup]:
     with open("patches.yml", "r", encoding="utf-8") as fh:
         data = yaml.load(fh, Loader=yaml.SafeLoader)
-        return get_lookups(data)
+        return compile_lookups(data)
 
 
-@lru_cache(maxsize=10000)
 def lookup(section, value):
-    result = load_lookups()[section].match(value)
-    if result is None:
-        log.error(f"[{section}] missing value: {value}")
-    return result
+    # Misses are counted and reported at the end of the run:
+    return load_lookups()[section].match(value)
 
 
 def make_entity_id(id):
@@ -74,7 +74,7 @@ def parse_countries(text):
         return None
     if ";" in text:
         return [parse_countries(t) for t in text.split(";")]
-    code = registry.country.clean_text(text)
+    code = clean_country_text(text)
     if code is None:
         result = lookup("countries", text)
         if result is not None:
@@ -102,24 +102,19 @@ def emit_entity(proxy: CompositeEntity):
 
 def dump_nodes(context: Zavod):
     context.log.info("Dumping %d nodes to: %s", len(ENTITIES), context.sink)
-    for idx, entity in enumerate(ENTITIES.values()):
+    for entity in track(context, "Dumped nodes", ENTITIES.values()):
         assert not entity.schema.abstract, entity
         if entity.schema.name == "Address":
             continue
         context.emit(entity)
-        if idx > 0 and idx % 10000 == 0:
-            context.log.info("Dumped %d nodes..." % idx)
 
 
-def read_rows(context, zip_path, file_name):
-    with ZipFile(zip_path, "r") as zip:
-        with zip.open(file_name) as zfh:
-            fh = io.TextIOWrapper(zfh)
-            reader = DictReader(fh, delimiter=",", quotechar='"')
-            for idx, row in enumerate(reader):
-                yield {k: stringify(v) for (k, v) in row.items()}
-                if idx > 0 and idx % 10000 == 0:
-                    context.log.info("[%s] Read %d rows...", file_name, idx)
+def read_rows(context, archive: Archive, file_name):
+    with archive.open(file_name) as zfh:
+        fh = io.TextIOWrapper(zfh)
+        reader = DictReader(fh, delimiter=",", quotechar='"')
+        for row in track(context, f"[{file_name}] Read rows", reader, zfh):
+            yield {k: stringify(v) for (k, v) in row.items()}
 
 
 def make_row_entity(context: Zavod, row, schema):
@@ -293,36 +288,45 @@ def make_row_relationship(context: Zavod, row):
     audit_data(row)
 
 
-@click.command()
-@click.argument("zip_file", type=click.File(mode="rb"))
-def make_db(zip_file):
-    with init_context("metadata.yml") as context:
-        context.log.info("Loading: nodes-entities.csv...")
-        for row in read_rows(context, zip_file, "nodes-entities.csv"):
-            make_row_entity(context, row, "Company")
+def parse(context: Zavod, zip_file):
+    with Archive(zip_file) as archive:
+        load_archive(context, archive)
+    dump_nodes(context)
+    report_misses(context, load_lookups())
+
 
-        context.log.info("Loading: nodes-officers.csv...")
-        for row in read_rows(context, zip_file, "nodes-officers.csv"):
-            make_row_entity(context, row, "LegalEntity")
+def load_archive(context: Zavod, archive: Archive):
+    context.log.info("Loading: nodes-entities.csv...")
+    for row in read_rows(context, archive, "nodes-entities.csv"):
+        make_row_entity(context, row, "Company")
 
-        context.log.info("Loading: nodes-intermediaries.csv...")
-        for row in read_rows(context, zip_file, "nodes-intermediaries.csv"):
-            make_row_entity(context, row, "LegalEntity")
+    context.log.info("Loading: nodes-officers.csv...")
+    for row in read_rows(context, archive, "nodes-officers.csv"):
+        make_row_entity(context, row, "LegalEntity")
 
-        context.log.info("Loading: nodes-others.csv...")
-        for row in read_rows(context, zip_file, "nodes-others.csv"):
-            make_row_entity(context, row, "LegalEntity")
+    context.log.info("Loading: nodes-intermediaries.csv...")
+    for row in read_rows(context, archive, "nodes-intermediaries.csv"):
+        make_row_entity(context, row, "LegalEntity")
 
-        context.log.info("Loading: nodes-addresses.csv...")
-        for row in read_rows(context, zip_file, "nodes-addresses.csv"):
-            make_row_address(context, row)
+    context.log.info("Loading: nodes-others.csv...")
+    for row in read_rows(context, archive, "nodes-others.csv"):
+        make_row_entity(context, row, "LegalEntity")
 
-        context.log.info("Loading: relationships.csv...")
-        for row in read_rows(context, zip_file, "relationships.csv"):
-            make_row_relationship(context, row)
+    context.log.info("Loading: nodes-addresses.csv...")
+    for row in read_rows(context, archive, "nodes-addresses.csv"):
+        make_row_address(context, row)
 
+    context.log.info("Loading: relationships.csv...")
+    for row in read_rows(context, archive, "relationships.csv"):
+        make_row_relationship(context, row)
+
+
+@click.command()
+@click.argument("zip_file", type=click.Path(exists=True, dir_okay=False))
+def make_db(zip_file):
+    with init_context("metadata.yml") as context:
         context.export_metadata("export/index.json")
-        dump_nodes(context)
+        parse(context, zip_file)
 
 
 if __name__ == "__main__":
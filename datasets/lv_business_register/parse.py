@@ -1,7 +1,10 @@
 import csv
 from typing import Optional
 
-from zavod import Zavod, init_context
+from zavod import Zavod
+
+from common.context import init_context
+from common.instrument import track
 
 TYPES = {
     "FOREIGN_ENTITY": "LegalEntity",
@@ -174,7 +177,7 @@ def parse_joint_members(context: Zavod, row: dict):
 def parse_csv(context: Zavod, data_path: str, parser):
     with open(data_path) as f:
         reader = csv.DictReader(f, delimiter=";")
-        for row in reader:
+        for row in track(context, parser.__name__, reader, f):
             parser(context, row)
 
 
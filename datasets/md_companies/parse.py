@@ -2,9 +2,13 @@ import openpyxl
 from lxml import html
 from typing import Optional, Dict, Any, List
 from urllib.parse import urljoin
-from zavod import init_context, Zavod
+from zavod import Zavod
 from nomenklatura.entity import CE
 
+from common.context import init_context
+from common.ids import id_hasher
+from common.instrument import track
+
 
 def read_ckan(context: Zavod) -> str:
     if context.dataset.url is None:
@@ -34,6 +38,9 @@ def read_ckan(context: Zavod) -> str:
 def parse_directors(context: Zavod, company: CE, directors: Optional[str]):
     if directors is None:
         return
+    ids = id_hasher(context)
+    person_ids = ids.scope(company.id)
+    link_ids = ids.scope("Directorship", company.id)
     for director in directors.split("],"):
         # if "[" not in director:
         #     print(director, directors)
@@ -50,12 +57,12 @@ def parse_directors(context: Zavod, company: CE, directors: Optional[str]):
             continue
 
         dir = context.make("LegalEntity")
-        dir.id = context.make_id(company.id, director)
+        dir.id = person_ids.make_id(director)
         dir.add("name", director)
         context.emit(dir)
 
         dship = context.make("Directorship")
-        dship.id = context.make_id("Directorship", company.id, director, role)
+        dship.id = link_ids.make_id(director, role)
         dship.add("organization", company.id)
         dship.add("director", dir.id)
         dship.add("role", role)
@@ -68,6 +75,9 @@ def parse_founders(context: Zavod, company: CE, founders: Optional[str]):
     if isinstance(founders, int):
         context.log.warning("last line: %s", founders)
         return
+    ids = id_hasher(context)
+    person_ids = ids.scope(company.id)
+    link_ids = ids.scope("Ownership", company.id)
     for founder in founders.split("),"):
         founder = founder.replace(")", "")
         percentage = None
@@ -76,12 +86,12 @@ def parse_founders(context: Zavod, company: CE, founders: Optional[str]):
 
         founder = founder.strip()
         found = context.make("LegalEntity")
-        found.id = context.make_id(company.id, founder)
+        found.id = person_ids.make_id(founder)
         found.add("name", founder)
         context.emit(found)
 
         own = context.make("Ownership")
-        own.id = context.make_id("Ownership", company.id, founder)
+        own.id = link_ids.make_id(founder)
         own.add("asset", company.id)
         own.add("owner", found.id)
         own.add("role", percentage)
@@ -91,6 +101,9 @@ def parse_founders(context: Zavod, company: CE, founders: Optional[str]):
 def parse_owners(context: Zavod, company: CE, owners: Optional[str]):
     if owners is None:
         return
+    ids = id_hasher(context)
+    person_ids = ids.scope(company.id)
+    link_ids = ids.scope("Ownership", company.id)
     for owner in owners.split("),"):
         owner = owner.replace(")", "")
         country = None
@@ -99,7 +112,7 @@ def parse_owners(context: Zavod, company: CE, owners: Optional[str]):
 
         owner = owner.strip()
         bo = context.make("LegalEntity")
-        bo.id = context.make_id(company.id, owner)
+        bo.id = person_ids.make_id(owner)
         bo.add("name", owner)
         bo.add("country", country)
         if country is not None and not bo.has("country"):
@@ -107,7 +120,7 @@ def parse_owners(context: Zavod, company: CE, owners: Optional[str]):
         context.emit(bo)
 
         own = context.make("Ownership")
-        own.id = context.make_id("Ownership", company.id, owner)
+        own.id = link_ids.make_id(owner)
         own.add("asset", company.id)
         own.add("owner", bo.id)
         own.add("role", "beneficiarilor efectivi")
@@ -122,7 +135,7 @@ def parse_company(context: Zavod, data: Dict[str, Any]):
     if idno is not None:
         company.id = f"oc-companies-md-{idno}"
     else:
-        company.id = context.make_id(name, address)
+        company.id = id_hasher(context).make_id(name, address)
     if company.id is None:
         context.log.error(
             "Cannot generate key",
@@ -147,7 +160,7 @@ def parse_company(context: Zavod, data: Dict[str, Any]):
 
 def parse_companies(context: Zavod, book: openpyxl.Workbook):
     headers: Optional[List[str]] = None
-    for idx, row in enumerate(book["Company"].iter_rows()):
+    for row in track(context, "Companies", book["Company"].iter_rows()):
         cells = [c.value for c in row]
         if headers is None:
             if "Denumirea completă" in cells:
@@ -158,8 +171,6 @@ def parse_companies(context: Zavod, book: openpyxl.Workbook):
             continue
         data = dict(zip(headers, cells))
         parse_company(context, data)
-        if idx > 0 and idx % 10000 == 0:
-            context.log.info("Read %d companies..." % idx)
 
 
 def parse(context: Zavod):
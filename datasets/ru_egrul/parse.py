@@ -1,17 +1,79 @@
 from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
 from urllib.parse import urljoin, urlparse
-from zipfile import ZipFile
 from lxml import etree, html
-from typing import Dict, Optional, Set, IO
+from typing import Dict, Iterable, Optional, Set, IO, Tuple
 from lxml.etree import _Element as Element, tostring
-from zavod import Zavod, init_context
+from zavod import Zavod
 from followthemoney.proxy import EntityProxy
 from followthemoney.util import join_text
-from addressformatting import AddressFormatter
+
+from common.addresses import AddressTemplate
+from common.archive import Archive
+from common.context import init_context
+from common.instrument import track, timed
+from common.prefetch import prefetch
+from common.xmlstream import TagIndex
 
 INN_URL = "https://egrul.itsoft.ru/%s.xml"
 PREFIX = "https://egrul.itsoft.ru/EGRUL_406/01.01.2022_FULL/"
-aformatter = AddressFormatter()
+ADDRESS = AddressTemplate("ru")
+
+# Record extractors: (attribute, property) pairs read from an element, and
+# (child tag, attribute, property) triples read from its first child with
+# that tag (see `add_attrs` and `add_fields`).
+Attrs = Iterable[Tuple[str, str]]
+Fields = Iterable[Tuple[str, str, str]]
+COMPANY_ATTRS: Attrs = (
+    ("ОГРН", "ogrnCode"),
+    ("ИНН", "innCode"),
+    ("КПП", "kppCode"),
+    ("ПолнНаимОПФ", "legalForm"),
+    ("ДатаОГРН", "incorporationDate"),
+)
+COMPANY_FIELDS: Fields = (
+    ("СвАдрЭлПочты", "E-mail", "email"),
+    ("СвГражд", "НаимСтран", "country"),
+)
+COMPANY_NAME_ATTRS: Attrs = (("НаимЮЛПолн", "name"), ("НаимЮЛСокр", "name"))
+SOLE_TRADER_ATTRS: Attrs = (
+    ("ОГРНИП", "ogrnCode"),
+    ("ИННФЛ", "innCode"),
+    ("НаимВидИП", "legalForm"),
+)
+PERSON_ATTRS: Attrs = (
+    ("Имя", "firstName"),
+    ("Отчество", "fatherName"),
+    ("Фамилия", "lastName"),
+    ("ИННФЛ", "innCode"),
+)
+ORG_FIELDS: Fields = (
+    ("НаимИННЮЛ", "НаимЮЛПолн", "name"),
+    ("НаимИННЮЛ", "ИНН", "innCode"),
+    ("НаимИННЮЛ", "ОГРН", "ogrnCode"),
+    ("СвНаимЮЛПолнИн", "НаимПолн", "name"),
+    ("СвРегИн", "НаимСтран", "jurisdiction"),
+    ("СвРегИн", "РегНомер", "registrationNumber"),
+    ("СвРегИн", "НаимРегОрг", "publisher"),
+    ("СвРегИн", "АдрСтр", "address"),
+)
+MANAGER_ATTRS: Attrs = (
+    ("НаимЮЛПолн", "name"),
+    ("ИНН", "innCode"),
+    ("ОГРН", "ogrnCode"),
+)
+# Address part, child tag and attribute (`None` for the text of the child):
+ADDRESS_FIELDS: Iterable[Tuple[str, str, Optional[str]]] = (
+    ("city", "НаимРегион", None),
+    ("city", "Регион", "НаимРегион"),
+    ("state", "Район", "НаимРайон"),
+    ("town", "НаселПункт", "НаимНаселПункт"),
+    ("municipality", "МуниципРайон", "Наим"),
+    ("suburb", "НаселенПункт", "Наим"),
+    ("road", "ЭлУлДорСети", "Наим"),
+    ("road", "Улица", "НаимУлица"),
+    ("house", "ПомещЗдания", "Номер"),
+)
 
 
 def tag_text(el: Element) -> str:
@@ -27,9 +89,14 @@ def dput(data: Dict[str, Optional[str]], name: str, value: Optional[str]):
     data[name] = value
 
 
-def elattr(el: Optional[Element], attr: str):
-    if el is not None:
-        return el.get(attr)
+def add_attrs(entity: EntityProxy, el: Element, attrs: Attrs) -> None:
+    for attr, prop in attrs:
+        entity.add(prop, el.get(attr))
+
+
+def add_fields(entity: EntityProxy, children: TagIndex, fields: Fields) -> None:
+    for tag, attr, prop in fields:
+        entity.add(prop, children.get(tag, attr))
 
 
 def make_id(
@@ -47,23 +114,21 @@ def make_id(
     return None
 
 
-def make_person(context: Zavod, el: Element, local_id: str) -> Optional[EntityProxy]:
-    name_el = el.find(".//СвФЛ")
+def make_person(
+    context: Zavod, el: Element, children: TagIndex, local_id: str
+) -> Optional[EntityProxy]:
+    name_el = next(el.iterdescendants("СвФЛ"), None)
     entity = context.make("Person")
     if name_el is None:
         return None
     last_name = name_el.get("Фамилия")
     first_name = name_el.get("Имя")
     patronymic = name_el.get("Отчество")
-    name = join_text(first_name, patronymic, last_name)
-    entity.add("name", name)
-    entity.add("firstName", first_name)
-    entity.add("fatherName", patronymic)
-    entity.add("lastName", last_name)
-    entity.add("innCode", name_el.get("ИННФЛ"))
+    entity.add("name", join_text(first_name, patronymic, last_name))
+    add_attrs(entity, name_el, PERSON_ATTRS)
     entity.id = make_id(context, entity, local_id)
 
-    country = el.find("./СвГраждФЛ")
+    country = children.find("СвГраждФЛ")
     if country is not None:
         if country.get("КодГражд") == "1":
             entity.add("country", "ru")
@@ -74,23 +139,7 @@ def make_person(context: Zavod, el: Element, local_id: str) -> Optional[EntityPr
 
 def make_org(context: Zavod, el: Element, local_id: str) -> EntityProxy:
     entity = context.make("Organization")
-    name_el = el.find("./НаимИННЮЛ")
-    if name_el is not None:
-        entity.add("name", name_el.get("НаимЮЛПолн"))
-        entity.add("innCode", name_el.get("ИНН"))
-        entity.add("ogrnCode", name_el.get("ОГРН"))
-
-    name_latin_el = el.find("./СвНаимЮЛПолнИн")
-    if name_latin_el is not None:
-        entity.add("name", name_latin_el.get("НаимПолн"))
-
-    foreign_reg_el = el.find("./СвРегИн")
-    if foreign_reg_el is not None:
-        entity.add("jurisdiction", foreign_reg_el.get("НаимСтран"))
-        entity.add("registrationNumber", foreign_reg_el.get("РегНомер"))
-        entity.add("publisher", foreign_reg_el.get("НаимРегОрг"))
-        entity.add("address", foreign_reg_el.get("АдрСтр"))
-
+    add_fields(entity, TagIndex.children(el), ORG_FIELDS)
     entity.id = make_id(context, entity, local_id)
     return entity
 
@@ -99,7 +148,8 @@ def parse_founder(context: Zavod, company: EntityProxy, el: Element):
     owner = context.make("LegalEntity")
     ownership = context.make("Ownership")
 
-    meta = el.find("./ГРНДатаПерв")
+    children = TagIndex.children(el)
+    meta = children.find("ГРНДатаПерв")
     local_id = company.id
     if meta is not None:
         ownership.add("startDate", meta.get("ДатаЗаписи"))
@@ -107,7 +157,7 @@ def parse_founder(context: Zavod, company: EntityProxy, el: Element):
 
     ownership.add("role", el.tag)
     if el.tag == "УчрФЛ":  # Individual founder
-        owner_proxy = make_person(context, el, local_id)
+        owner_proxy = make_person(context, el, children, local_id)
         if owner_proxy is not None:
             owner = owner_proxy
     elif el.tag == "УчрЮЛИн":  # Foreign company
@@ -119,19 +169,17 @@ def parse_founder(context: Zavod, company: EntityProxy, el: Element):
         # TODO: nested ownership structure, make Security
         # owner = context.make("Security")
         # FIXME: Security cannot own.
-        fund_name_el = el.find("./СвНаимПИФ")
+        fund_name_el = children.find("СвНаимПИФ")
         if fund_name_el is not None:
             # owner.add("name", fund_name_el.get("НаимПИФ"))
             ownership.add("summary", fund_name_el.get("НаимПИФ"))
 
         manager_el = el.find("./СвУпрКомпПИФ/УпрКомпПиф")
         if manager_el is not None:
-            owner.add("name", manager_el.get("НаимЮЛПолн"))
-            owner.add("innCode", manager_el.get("ИНН"))
-            owner.add("ogrnCode", manager_el.get("ОГРН"))
+            add_attrs(owner, manager_el, MANAGER_ATTRS)
             owner.id = make_id(context, owner, local_id)
     elif el.tag == "УчрРФСубМО":  # Russian public body
-        pb_name_el = el.find("./ВидНаимУчр")
+        pb_name_el = children.find("ВидНаимУчр")
         if pb_name_el is not None:
             # Name of the owning authority
             pb_name = pb_name_el.get("НаимМО")
@@ -142,23 +190,21 @@ def parse_founder(context: Zavod, company: EntityProxy, el: Element):
             # ownership.add("role", pb_name_el.get("НаимМО"))
 
         # managing body:
-        pb_el = el.find("./СвОргОсущПр")
+        pb_el = children.find("СвОргОсущПр")
         if pb_el is not None:
             owner = make_org(context, pb_el, local_id)
     elif el.tag == "УчрДогИнвТов":  # investment partnership agreement.
         # FIXME: should the partnership be its own entity?
-        terms_el = el.find("./ИнПрДогИнвТов")
+        terms_el = children.find("ИнПрДогИнвТов")
         if terms_el is not None:
             ownership.add("summary", terms_el.get("НаимДог"))
             ownership.add("recordId", terms_el.get("НомерДог"))
             ownership.add("date", terms_el.get("Дата"))
 
         # managing vehicle
-        manager_el = el.find("./СвУпТовЮЛ")
+        manager_el = children.find("СвУпТовЮЛ")
         if manager_el is not None:
-            owner.add("name", manager_el.get("НаимЮЛПолн"))
-            owner.add("innCode", manager_el.get("ИНН"))
-            owner.add("ogrnCode", manager_el.get("ОГРН"))
+            add_attrs(owner, manager_el, MANAGER_ATTRS)
             owner.id = make_id(context, owner, local_id)
     else:
         context.log.warn("Unknown owner type", tag=el.tag)
@@ -174,14 +220,14 @@ def parse_founder(context: Zavod, company: EntityProxy, el: Element):
     ownership.add("owner", owner)
     ownership.add("asset", company)
 
-    share_el = el.find("./ДоляУстКап")
+    share_el = children.find("ДоляУстКап")
     if share_el is not None:
         ownership.add("sharesCount", share_el.get("НоминСтоим"))
         percent_el = share_el.find("./РазмерДоли/Процент")
         if percent_el is not None:
             ownership.add("percentage", percent_el.text)
 
-    reliable_el = el.find("./СвНедДанУчр")
+    reliable_el = children.find("СвНедДанУчр")
     if reliable_el is not None:
         ownership.add("summary", reliable_el.get("ТекстНедДанУчр"))
 
@@ -194,14 +240,15 @@ def parse_founder(context: Zavod, company: EntityProxy, el: Element):
 
 def parse_directorship(context: Zavod, company: EntityProxy, el: Element):
     # TODO: can we use the ГРН as a fallback ID?
-    director = make_person(context, el, company.id)
+    children = TagIndex.children(el)
+    director = make_person(context, el, children, company.id)
     if director is None:
         # context.log.warn("Directorship has no person", company=company.id)
         return
 
     context.emit(director)
 
-    role = el.find("./СвДолжн")
+    role = children.find("СвДолжн")
     if role is None:
         context.log.warn("Directorship has no role", tag=tag_text(el))
         return
@@ -213,7 +260,7 @@ def parse_directorship(context: Zavod, company: EntityProxy, el: Element):
     directorship.add("director", director)
     directorship.add("organization", company)
 
-    date = el.find("./ГРНДатаПерв")
+    date = children.find("ГРНДатаПерв")
     if date is not None:
         directorship.add("startDate", date.get("ДатаЗаписи"))
 
@@ -222,7 +269,6 @@ def parse_directorship(context: Zavod, company: EntityProxy, el: Element):
 
 def parse_address(context: Zavod, entity: EntityProxy, el: Element):
     data: Dict[str, Optional[str]] = {}
-    country = "ru"
     if el.tag == "АдресРФ":  # normal address
         # print(tag_text(el))
         pass
@@ -244,58 +290,44 @@ def parse_address(context: Zavod, entity: EntityProxy, el: Element):
         return
 
     # FIXME: this is a complete mess
+    children = TagIndex.children(el)
     dput(data, "postcode", el.get("Индекс"))
     dput(data, "postcode", el.get("ИдНом"))
     dput(data, "house", el.get("Дом"))
     dput(data, "house_number", el.get("Корпус"))
     dput(data, "neighbourhood", el.get("Кварт"))
-    dput(data, "neighbourhood", el.get("Кварт"))
-    dput(data, "city", el.findtext("./НаимРегион"))
-    dput(data, "city", elattr(el.find("./Регион"), "НаимРегион"))
-    dput(data, "state", elattr(el.find("./Район"), "НаимРайон"))
-    dput(data, "town", elattr(el.find("./НаселПункт"), "НаимНаселПункт"))
-    dput(data, "municipality", elattr(el.find("./МуниципРайон"), "Наим"))
-    dput(data, "suburb", elattr(el.find("./НаселенПункт"), "Наим"))
-    dput(data, "road", elattr(el.find("./ЭлУлДорСети"), "Наим"))
-    dput(data, "road", elattr(el.find("./Улица"), "НаимУлица"))
-    dput(data, "house", elattr(el.find("./ПомещЗдания"), "Номер"))
-    address = aformatter.one_line(data, country=country)
-    entity.add("address", address)
+    for part, tag, attr in ADDRESS_FIELDS:
+        if attr is None:
+            dput(data, part, children.findtext(tag))
+        else:
+            dput(data, part, children.get(tag, attr))
+    entity.add("address", ADDRESS.one_line(data))
 
 
 def parse_company(context: Zavod, el: Element):
     entity = context.make("Company")
     entity.id = context.make_slug("inn", el.get("ИНН"))
     entity.add("jurisdiction", "ru")
-    entity.add("ogrnCode", el.get("ОГРН"))
-    entity.add("innCode", el.get("ИНН"))
-    entity.add("kppCode", el.get("КПП"))
-    entity.add("legalForm", el.get("ПолнНаимОПФ"))
-    entity.add("incorporationDate", el.get("ДатаОГРН"))
-
-    email_el = el.find("./СвАдрЭлПочты")
-    if email_el is not None:
-        entity.add("email", email_el.get("E-mail"))
+    add_attrs(entity, el, COMPANY_ATTRS)
+    children = TagIndex.children(el)
+    add_fields(entity, children, COMPANY_FIELDS)
 
-    citizen_el = el.find("./СвГражд")
-    if citizen_el is not None:
-        entity.add("country", citizen_el.get("НаимСтран"))
+    for addresses_el in children.findall("СвАдресЮЛ"):
+        for addr_el in addresses_el.iterchildren(etree.Element):
+            parse_address(context, entity, addr_el)
 
-    for addr_el in el.findall("./СвАдресЮЛ/*"):
-        parse_address(context, entity, addr_el)
-
-    for name_el in el.findall("./СвНаимЮЛ"):
-        entity.add("name", name_el.get("НаимЮЛПолн"))
-        entity.add("name", name_el.get("НаимЮЛСокр"))
+    for name_el in children.findall("СвНаимЮЛ"):
+        add_attrs(entity, name_el, COMPANY_NAME_ATTRS)
 
     entity.id = make_id(context, entity)
 
     # prokura or directors etc.
-    for director in el.findall("./СведДолжнФЛ"):
+    for director in children.findall("СведДолжнФЛ"):
         parse_directorship(context, entity, director)
 
-    for founder in el.findall("./СвУчредит/*"):
-        parse_founder(context, entity, founder)
+    for founders_el in children.findall("СвУчредит"):
+        for founder in founders_el.iterchildren(etree.Element):
+            parse_founder(context, entity, founder)
 
     # pprint(entity.to_dict())
     context.emit(entity)
@@ -304,19 +336,18 @@ def parse_company(context: Zavod, el: Element):
 def parse_sole_trader(context: Zavod, el: Element):
     entity = context.make("LegalEntity")
     entity.add("country", "ru")
-    entity.add("ogrnCode", el.get("ОГРНИП"))
-    entity.add("innCode", el.get("ИННФЛ"))
-    entity.add("legalForm", el.get("НаимВидИП"))
+    add_attrs(entity, el, SOLE_TRADER_ATTRS)
 
     entity.id = make_id(context, entity)
     context.emit(entity)
 
 
 def parse_xml(context: Zavod, handle: IO[bytes]):
-    doc = etree.parse(handle)
-    for el in doc.findall(".//СвЮЛ"):
+    with timed("Parse XML"):
+        doc = etree.parse(handle)
+    for el in doc.iter("СвЮЛ"):
         parse_company(context, el)
-    for el in doc.findall(".//СвИП"):
+    for el in doc.iter("СвИП"):
         parse_sole_trader(context, el)
 
 
@@ -342,26 +373,33 @@ def crawl_index(context: Zavod, url: str) -> Set[str]:
     return archives
 
 
+def parse_archive(context: Zavod, path: Path):
+    with Archive(path) as archive:
+        for name in archive.namelist():
+            if not name.lower().endswith(".xml"):
+                continue
+            with archive.open(name) as fh, timed("Parse XML member"):
+                parse_xml(context, fh)
+
+
 def crawl_archive(context: Zavod, url: str):
     url_path = urlparse(url).path.lstrip("/")
     path = context.fetch_resource(url_path, url)
     try:
         context.log.info("Parsing: %s" % url_path)
-        with ZipFile(path, "r") as zip:
-            for name in zip.namelist():
-                if not name.lower().endswith(".xml"):
-                    continue
-                with zip.open(name, "r") as fh:
-                    parse_xml(context, fh)
-
+        parse_archive(context, path)
     finally:
         path.unlink(missing_ok=True)
 
 
 def crawl(context: Zavod):
-    # TODO: thread pool execution
-    for archive_url in sorted(crawl_index(context, PREFIX)):
-        crawl_archive(context, archive_url)
+    archives = sorted(crawl_index(context, PREFIX))
+    resources = [(urlparse(url).path.lstrip("/"), url) for url in archives]
+    # Download the next archives while the current one is parsed:
+    fetched = prefetch(context, resources, delete=True)
+    for url_path, path in track(context, "Archives", fetched, every=1):
+        context.log.info("Parsing: %s" % url_path)
+        parse_archive(context, path)
 
 
 def crawl_parallel(context: Zavod):
@@ -373,6 +411,6 @@ def crawl_parallel(context: Zavod):
 if __name__ == "__main__":
     with init_context("metadata.yml") as context:
         context.export_metadata("export/index.json")
-        crawl_parallel(context)
-        # crawl(context)
+        crawl(context)
+        # crawl_parallel(context)
         # parse_examples(context)
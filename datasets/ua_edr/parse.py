@@ -1,10 +1,20 @@
+import re
+import shutil
+from functools import lru_cache
 from zipfile import ZipFile
-from lxml import etree
-from typing import IO
+from typing import IO, Callable, Dict, Optional, Tuple
 from lxml.etree import _Element as Element, tostring
-from zavod import Zavod, init_context
+from zavod import Zavod
 from followthemoney.util import make_entity_id
 
+from common import settings
+from common.context import init_context
+from common.ids import IdHasher, id_hasher
+from common.instrument import track
+from common.parallel import parse_parallel
+from common.xmlstream import RecordFile, iter_records
+
+URL = "https://data.opensanctions.org/contrib/ua_edr/23022022.zip"
 REMOVE = set(
     [
         "КІНЦЕВИЙ БЕНЕФІЦІАР ВЛАСНИК(КОНТРОЛЕР)",
@@ -18,32 +28,33 @@ REMOVE = set(
 )
 
 
+# Longest first, so that a phrase is removed whole and not just a part of it:
+REMOVE_RE = re.compile(
+    "|".join(re.escape(r) for r in sorted(REMOVE, key=lambda r: (-len(r), r)))
+)
+SHARES = ", розмір частки -"
+
+
 def tag_text(el: Element) -> str:
     return tostring(el, encoding="utf-8").decode("utf-8")
 
 
-def parse_owner(context: Zavod, company_id: str, unique_id: str, el: Element):
-    if el.text is None:
-        return
-    if "причина відсутності:" in el.text:
-        return
-    if el.text.startswith("релігійна громада в кількості"):
-        return
-    owner = context.make("LegalEntity")
-    owner.id = context.make_id(unique_id, el.text)
-    ownership = context.make("Ownership")
-    ownership.id = context.make_id(unique_id, el.tag, el.text)
-    ownership.add("owner", owner)
-    ownership.add("asset", company_id)
-    ownership.add("role", el.tag)
-    text = el.text
-    for rem in REMOVE:
-        text = text.replace(rem, "")
+@lru_cache(maxsize=10_000)
+def parse_owner_text(text: str) -> Optional[Tuple[str, Optional[str]]]:
+    """The owner name and share size in a founder or beneficiary text, or
+    `None` if there is no owner. Many texts (state bodies, common
+    shareholders) recur across companies, so the results are cached."""
+    if "причина відсутності:" in text:
+        return None
+    if text.startswith("релігійна громада в кількості"):
+        return None
+    text = REMOVE_RE.sub("", text)
     text = text.strip().strip("-")
-    parts = text.rsplit(", розмір частки -", 1)
+    shares: Optional[str] = None
+    parts = text.rsplit(SHARES, 1)
     text = parts[0]
     if len(parts) > 1:
-        ownership.add("sharesValue", parts[1])
+        shares = parts[1]
 
     parts = text.split(",", 1)
     name = text
@@ -52,7 +63,26 @@ def parse_owner(context: Zavod, company_id: str, unique_id: str, el: Element):
 
     name = name.strip()
     if not len(name):
+        return None
+    return name, shares
+
+
+def parse_owner(context: Zavod, company_id: str, ids: IdHasher, el: Element):
+    if el.text is None:
         return
+    parsed = parse_owner_text(el.text)
+    if parsed is None:
+        return
+    name, shares = parsed
+    owner = context.make("LegalEntity")
+    owner.id = ids.make_id(el.text)
+    ownership = context.make("Ownership")
+    ownership.id = ids.make_id(el.tag, el.text)
+    ownership.add("owner", owner)
+    ownership.add("asset", company_id)
+    ownership.add("role", el.tag)
+    if shares is not None:
+        ownership.add("sharesValue", shares)
 
     owner.add("name", name)
     if name != el.text:
@@ -63,79 +93,123 @@ def parse_owner(context: Zavod, company_id: str, unique_id: str, el: Element):
     context.emit(ownership)
 
 
-def parse_uo(context: Zavod, fh: IO[bytes]):
-    for idx, (_, el) in enumerate(etree.iterparse(fh, tag="RECORD")):
-        if idx > 0 and idx % 10000 == 0:
-            context.log.info("Parse UO records: %d..." % idx)
-        # print(tag_text(el))
-
-        company = context.make("Company")
-        long_name = el.findtext("./NAME")
-        short_name = el.findtext("./SHORT_NAME")
-        edrpou = el.findtext("./EDRPOU")
-        if short_name and len(short_name.strip()):
-            company.add("name", short_name)
-            company.add("alias", long_name)
-        else:
-            company.add("name", long_name)
-
-        unique_id = make_entity_id(edrpou, short_name, long_name)
-        company.id = context.make_slug(edrpou, unique_id, strict=False)
-        if company.id is None:
-            context.log.warn("Could not generate company ID", xml=tag_text(el))
+def parse_uo(context: Zavod, el: Element):
+    # print(tag_text(el))
+
+    company = context.make("Company")
+    long_name = el.findtext("./NAME")
+    short_name = el.findtext("./SHORT_NAME")
+    edrpou = el.findtext("./EDRPOU")
+    if short_name and len(short_name.strip()):
+        company.add("name", short_name)
+        company.add("alias", long_name)
+    else:
+        company.add("name", long_name)
+
+    unique_id = make_entity_id(edrpou, short_name, long_name)
+    ids = id_hasher(context)
+    company.id = ids.make_slug(edrpou, unique_id, strict=False)
+    if company.id is None:
+        context.log.warn("Could not generate company ID", xml=tag_text(el))
+        return
+    company.add("registrationNumber", edrpou)
+    company.add("jurisdiction", "ua")
+    company.add("address", el.findtext("./ADDRESS"))
+    company.add("classification", el.findtext("./KVED"))
+    company.add("status", el.findtext("./STAN"))
+    context.emit(company)
+    # IDs of the people and links of the record start with its unique ID:
+    record_ids = ids.scope(unique_id)
+
+    for boss in el.findall(".//BOSS"):
+        name = boss.text
+        if name is None:
             continue
-        company.add("registrationNumber", edrpou)
-        company.add("jurisdiction", "ua")
-        company.add("address", el.findtext("./ADDRESS"))
-        company.add("classification", el.findtext("./KVED"))
-        company.add("status", el.findtext("./STAN"))
-        context.emit(company)
-
-        for boss in el.findall(".//BOSS"):
-            name = boss.text
-            if name is None:
-                continue
-            director = context.make("Person")
-            director.id = context.make_id(unique_id, name)
-            director.add("name", name)
-            context.emit(director)
-
-            directorship = context.make("Directorship")
-            directorship.id = context.make_id(unique_id, "BOSS", name)
-            directorship.add("organization", company)
-            directorship.add("director", director)
-            context.emit(director)
-
-        for founder in el.findall("./FOUNDERS/FOUNDER"):
-            parse_owner(context, company.id, unique_id, founder)
-            # founder_name = founder.text
-            # capital = None
-            # if founder_name is None:
-            #     continue
-            # if ", розмір частки -" not in founder.text:
-            #     print("FOUNDER", founder.text)
-
-        for bene in el.findall("./BENEFICIARIES/BENEFICIARY"):
-            parse_owner(context, company.id, unique_id, bene)
-            # if bene.text is None:
-            #     continue
-            # if "причина відсутності:" in bene.text:
-            #     continue
-            # parts = bene.text.split(";", 2)
-            # if len(parts) != 3:
-            #     print("BENE", parts)
-
-        # TODO: beneficiary
-        # TODO: founder
-        el.clear()
-
-
-# def parse_fop(context: Zavod, fh: BinaryIO):
-#     for idx, (_, el) in enumerate(etree.iterparse(fh, tag="RECORD")):
-#         if idx > 0 and idx % 10000 == 0:
-#             context.log.info("Parse FOP records: %d..." % idx)
-#         print(tag_text(el))
-#         el.clear()
+        director = context.make("Person")
+        director.id = record_ids.make_id(name)
+        director.add("name", name)
+        context.emit(director)
+
+        directorship = context.make("Directorship")
+        directorship.id = record_ids.make_id("BOSS", name)
+        directorship.add("organization", company)
+        directorship.add("director", director)
+        context.emit(director)
+
+    for founder in el.findall("./FOUNDERS/FOUNDER"):
+        parse_owner(context, company.id, record_ids, founder)
+        # founder_name = founder.text
+        # capital = None
+        # if founder_name is None:
+        #     continue
+        # if ", розмір частки -" not in founder.text:
+        #     print("FOUNDER", founder.text)
+
+    for bene in el.findall("./BENEFICIARIES/BENEFICIARY"):
+        parse_owner(context, company.id, record_ids, bene)
+        # if bene.text is None:
+        #     continue
+        # if "причина відсутності:" in bene.text:
+        #     continue
+        # parts = bene.text.split(";", 2)
+        # if len(parts) != 3:
+        #     print("BENE", parts)
+
+    # TODO: beneficiary
+    # TODO: founder
+
+
+def parse_fop(context: Zavod, el: Element):
+    # Individual entrepreneurs are published without their tax numbers:
+    name = el.findtext("./FIO")
+    if name is None or not len(name.strip()):
+        return
+    address = el.findtext("./ADDRESS")
+    entrepreneur = context.make("Person")
+    entrepreneur.id = id_hasher(context).make_id("FOP", name, address)
+    entrepreneur.add("name", name)
+    entrepreneur.add("address", address)
+    entrepreneur.add("classification", el.findtext("./KVED"))
+    entrepreneur.add("status", el.findtext("./STAN"))
+    entrepreneur.add("country", "ua")
+    context.emit(entrepreneur)
+
+
+# Record parsers and progress labels by the part of the file name:
+PARSERS: Dict[str, Tuple[Callable[[Zavod, Element], None], str]] = {
+    "EDR_UO": (parse_uo, "Parse UO records"),
+    "EDR_FOP": (parse_fop, "Parse FOP records"),
+}
+
+
+def parse_file(context: Zavod, kind: str, fh: IO[bytes]):
+    parse_record, label = PARSERS[kind]
+    records = iter_records(fh, "RECORD")
+    for el in track(context, label, records, fh):
+        parse_record(context, el)
+
+
+def parse_chunk(context: Zavod, kind: str, records: RecordFile, start: int, end: int):
+    parse_record, label = PARSERS[kind]
+    for el in track(context, label, records.records(start, end)):
+        parse_record(context, el)
+
+
+def parse_file_parallel(context: Zavod, kind: str, zip: ZipFile, name: str):
+    # Workers need to seek in the XML, so it is extracted first:
+    path = context.get_resource_path(name)
+    with zip.open(name, "r") as fh, open(path, "wb") as out:
+        shutil.copyfileobj(fh, out, 1024 * 1024)
+    try:
+        records = RecordFile(path, "RECORD")
+        chunks = records.chunks(settings.PARSE_CHUNK_SIZE)
+        context.log.info("Parsing %d chunks: %s" % (len(chunks), name))
+        tasks = [(kind, records, start, end) for start, end in chunks]
+        workers = settings.PARSE_WORKERS
+        label = f"Parse {kind} chunks"
+        parse_parallel(context, parse_chunk, tasks, workers=workers, label=label)
+    finally:
+        path.unlink()
 
 
 def crawl(context: Zavod, url: str):
@@ -145,14 +219,20 @@ def crawl(context: Zavod, url: str):
         for name in zip.namelist():
             if not name.lower().endswith(".xml"):
                 continue
-            with zip.open(name, "r") as fh:
-                if "EDR_UO" in name:
-                    parse_uo(context, fh)
-                # if "EDR_FOP" in name:
-                #     parse_fop(context, fh)
+            for kind in PARSERS:
+                if kind not in name:
+                    continue
+                if kind == "EDR_FOP" and not settings.EDR_FOP:
+                    context.log.info("Skipping FOP file: %s" % name)
+                    continue
+                if settings.PARSE_WORKERS > 1:
+                    parse_file_parallel(context, kind, zip, name)
+                else:
+                    with zip.open(name, "r") as fh:
+                        parse_file(context, kind, fh)
 
 
 if __name__ == "__main__":
     with init_context("metadata.yml") as context:
         context.export_metadata("export/index.json")
-        crawl(context, "https://data.opensanctions.org/contrib/ua_edr/23022022.zip")
+        crawl(context, URL)
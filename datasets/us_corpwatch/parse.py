@@ -4,9 +4,12 @@ from normality import slugify
 from typing import Callable, Optional, Union
 
 from nomenklatura.entity import CE
-from zavod import Zavod, init_context
+from zavod import Zavod
 from zavod.parse import format_address
 
+from common.context import init_context
+from common.instrument import track
+
 
 def clean(value: Optional[str] = None) -> Optional[str]:
     if value is None:
@@ -115,14 +118,11 @@ def parse_relationships(context: Zavod, row: dict):
 
 def parse_csv(context: Zavod, data_path: Path, handler: Callable):
     context.log.info(f"Parsing `{data_path}` ...")
-    ix = 0
     with open(data_path) as f:
         reader = csv.DictReader(f, delimiter="\t")
-        for ix, row in enumerate(reader):
+        records = track(context, data_path.name, reader, f, every=100_000)
+        for row in records:
             handler(context, row)
-            if ix and ix % 100_000 == 0:
-                context.log.info(f"Parse record {ix}...")
-    context.log.info(f"Parsed {ix} rows", fp=data_path.name)
 
 
 def parse(context: Zavod):
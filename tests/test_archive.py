@@ -0,0 +1,118 @@
+import io
+import struct
+import tarfile
+import zipfile
+from pathlib import Path
+
+import pytest
+
+from common.archive import Archive
+
+STORED = b"stored member\n" * 1000
+DEFLATED = b"deflated member\n" * 1000
+
+
+class Unseekable(io.RawIOBase):
+    """Makes `ZipFile` write data descriptors after the members."""
+
+    def __init__(self, fh) -> None:
+        self.fh = fh
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        return self.fh.write(data)
+
+    def flush(self) -> None:
+        self.fh.flush()
+
+
+def add(zip: zipfile.ZipFile, name: str, data: bytes, compress: int) -> None:
+    info = zipfile.ZipInfo(name)
+    info.compress_type = compress
+    # An extra field moves the data behind the local header:
+    info.extra = struct.pack("<HH", 0xCAFE, 8) + b"metadata"
+    zip.writestr(info, data)
+
+
+def make_zip(path: Path, streamed: bool = False) -> None:
+    with open(path, "wb") as fh:
+        target = Unseekable(fh) if streamed else fh
+        with zipfile.ZipFile(target, "w") as zip:
+            add(zip, "data/stored.txt", STORED, zipfile.ZIP_STORED)
+            add(zip, "data/deflated.txt", DEFLATED, zipfile.ZIP_DEFLATED)
+            add(zip, "empty.txt", b"", zipfile.ZIP_STORED)
+
+
+@pytest.mark.parametrize("streamed", [False, True])
+def test_zip_members(tmp_path: Path, streamed: bool):
+    path = tmp_path / "test.zip"
+    make_zip(path, streamed=streamed)
+    with Archive(path) as archive:
+        names = ["data/stored.txt", "data/deflated.txt", "empty.txt"]
+        assert archive.namelist() == names
+        assert archive.get("data/stored.txt").stored
+        assert not archive.get("data/deflated.txt").stored
+        assert bytes(archive.view("data/stored.txt")) == STORED
+        assert bytes(archive.view("empty.txt")) == b""
+        with pytest.raises(ValueError):
+            archive.view("data/deflated.txt")
+        with pytest.raises(KeyError):
+            archive.get("missing.txt")
+        for name, data in (
+            ("data/stored.txt", STORED),
+            ("data/deflated.txt", DEFLATED),
+        ):
+            with archive.open(name) as fh:
+                assert fh.read() == data
+
+
+def test_zip_concurrent_readers(tmp_path: Path):
+    path = tmp_path / "test.zip"
+    make_zip(path)
+    with Archive(path) as archive:
+        for name, data in (
+            ("data/stored.txt", STORED),
+            ("data/deflated.txt", DEFLATED),
+        ):
+            first, second = archive.open(name), archive.open(name)
+            chunks = [first.read(100), second.read(300), first.read(200)]
+            assert chunks == [data[:100], data[:300], data[100:300]]
+            assert first.read() == data[300:]
+            assert second.read() == data[300:]
+            first.close()
+            second.close()
+
+
+def test_zip_reader_outlives_archive(tmp_path: Path):
+    path = tmp_path / "test.zip"
+    make_zip(path)
+    with Archive(path) as archive:
+        fh = archive.open("data/deflated.txt")
+    with fh:
+        assert fh.read() == DEFLATED
+
+
+def test_zip_bad_local_header(tmp_path: Path):
+    path = tmp_path / "test.zip"
+    make_zip(path)
+    data = bytearray(path.read_bytes())
+    data[0:4] = b"XXXX"
+    path.write_bytes(bytes(data))
+    with pytest.raises(zipfile.BadZipFile):
+        Archive(path)
+
+
+def test_tar_members(tmp_path: Path):
+    path = tmp_path / "test.tar"
+    with tarfile.open(path, "w") as tar:
+        for name, data in (("stored.txt", STORED), ("empty.txt", b"")):
+            info = tarfile.TarInfo(name)
+            info.size = len(data)
+            tar.addfile(info, io.BytesIO(data))
+    with Archive(path) as archive:
+        assert archive.namelist() == ["stored.txt", "empty.txt"]
+        with archive.open("stored.txt") as fh:
+            assert fh.read() == STORED
+        assert bytes(archive.view("empty.txt")) == b""
@@ -0,0 +1,29 @@
+from pathlib import Path
+
+from followthemoney import model
+from nomenklatura.entity import CompositeEntity
+from zavod import ZavodDataset
+
+from common.builder import FragmentType
+
+ROOT = Path(__file__).resolve().parent.parent
+DATASET = ZavodDataset.from_path(ROOT / "datasets/md_companies/metadata.yml")
+VALUES = ["Foo\x00 Bar\x07", "  ", "Cafe\u0301", "Lone \ud800", None, 42]
+
+
+def test_fragment_values_match_proxy():
+    """Strings, lists and constants are sanitised and cleaned as by
+    `EntityProxy.add`."""
+    type_ = FragmentType("Company", DATASET, alias=VALUES)
+    fragment = type_.make("company-1")
+    entity = CompositeEntity(
+        model, {"schema": "Company", "id": "company-1"}, default_dataset=DATASET
+    )
+    for value in VALUES:
+        fragment.add("name", value)
+        entity.add("name", value)
+    fragment.add("previousName", VALUES)
+    entity.add("previousName", VALUES)
+    entity.add("alias", VALUES)
+    for prop in ("name", "previousName", "alias"):
+        assert sorted(fragment.get(prop)) == sorted(entity.get(prop)), prop
@@ -0,0 +1,84 @@
+import random
+from datetime import date
+from pathlib import Path
+from typing import Any, List
+
+import pytest
+from nomenklatura.entity import CompositeEntity
+from zavod import Zavod, ZavodDataset
+
+from common.ids import IdHasher, id_hasher
+
+ROOT = Path(__file__).resolve().parent.parent
+CHARS = "abcXYZ019 -_.,'\"()/ÄöçŞßЖжЇїΩ\t"
+NAMES = ["John Smith", "Mary Novak", "Olga Petrov", "ШЕВЧЕНКО АГРО", "МЕЛЬНИК БУД"]
+# The datasets whose entity IDs are made with `common.ids`:
+DATASETS = ["md_companies", "cy_companies", "ua_edr"]
+
+
+def make_context(name: str) -> Zavod:
+    dataset = ZavodDataset.from_path(ROOT / "datasets" / name / "metadata.yml")
+    return Zavod(dataset, CompositeEntity)
+
+
+def random_part(rnd: random.Random) -> Any:
+    kind = rnd.randrange(8)
+    if kind == 0:
+        return None
+    if kind == 1:
+        return rnd.randint(-5, 10**9)
+    if kind == 2:
+        return date(rnd.randint(1900, 2030), rnd.randint(1, 12), rnd.randint(1, 28))
+    if kind == 3:
+        return rnd.choice(["", " ", "-", "--", " - ", "a-", "-a", "a--b"])
+    if kind == 4:
+        return "%040x" % rnd.getrandbits(160)
+    if kind == 5:
+        return rnd.choice(NAMES)
+    if kind == 6:
+        return rnd.random() * 1000
+    return "".join(rnd.choice(CHARS) for _ in range(rnd.randint(1, 12)))
+
+
+@pytest.mark.parametrize("name", DATASETS)
+def test_ids_match_context(name: str):
+    """IDs and slugs are the same as those of `context.make_id` and
+    `context.make_slug`, so that entities keep their IDs."""
+    context = make_context(name)
+    ids = id_hasher(context)
+    rnd = random.Random(23)
+    for _ in range(20_000):
+        parts: List[Any] = [random_part(rnd) for _ in range(rnd.randint(0, 5))]
+        prefix = rnd.choice([None, None, "", "oc-companies", "Ab Cd", "-x-"])
+        strict = rnd.random() < 0.5
+        expected = context.make_id(*parts, prefix=prefix)
+        assert ids.make_id(*parts, prefix=prefix) == expected, parts
+        split = rnd.randint(0, len(parts))
+        scoped = ids.scope(*parts[:split]).make_id(*parts[split:], prefix=prefix)
+        assert scoped == expected, (parts, split)
+        expected = context.make_slug(*parts, strict=strict, prefix=prefix)
+        assert ids.make_slug(*parts, strict=strict, prefix=prefix) == expected, parts
+
+
+def test_long_slugs_are_cut():
+    context = make_context("md_companies")
+    parts = ["x" * 200, "y" * 200]
+    assert id_hasher(context).make_slug(*parts) == context.make_slug(*parts)
+
+
+def test_empty_ids():
+    context = make_context("md_companies")
+    ids = id_hasher(context)
+    assert ids.make_id() is None
+    assert ids.make_id("") is None
+    assert ids.scope("").make_id() is None
+    assert ids.make_slug(None) is None
+    assert ids.make_slug(None, "a", strict=False) == context.make_slug(
+        None, "a", strict=False
+    )
+
+
+def test_hasher_is_shared():
+    context = make_context("ua_edr")
+    assert id_hasher(context) is id_hasher(make_context("ua_edr"))
+    assert isinstance(id_hasher(context), IdHasher)